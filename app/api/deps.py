@@ -11,6 +11,7 @@ from app.core.config import settings
 from app.database import SessionLocal, AsyncSessLocal
 from app.models.user import User as UserModel
 from app.schemas.token import TokenPayload
+from app.services.retrievers import RetrieverRegistry, retriever_registry
 from app.services.user import get_user_by_id
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login/access-token")
@@ -46,3 +47,8 @@ async def get_current_user(db: AsyncSession = Depends(get_db_async),
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
+
+
+def get_retriever_registry() -> RetrieverRegistry:
+    """Shared retriever registry, tests override it with one built on fake embeddings."""
+    return retriever_registry
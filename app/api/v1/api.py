@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
-from app.api.v1.routers import auth, users
+from app.api.v1.routers import auth, metrics, search, users
 
 api_router = APIRouter()
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
@@ -0,0 +1,27 @@
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.database import pool_metrics
+from app.services.retrievers import retriever_registry
+
+router = APIRouter()
+
+
+@router.get("/pools")
+async def get_pool_metrics() -> Any:
+    """Connection pool checkout wait times (seconds) of the application and vectorstore engines."""
+    return {"database": pool_metrics(), "vectors": retriever_registry.pool_metrics()}
+
+
+@router.get("/result-cache")
+async def get_result_cache_metrics() -> Any:
+    """Hit rate of the retriever result cache, None when it is disabled."""
+    cache = retriever_registry.result_cache
+    return cache.metrics() if cache is not None else None
+
+
+@router.get("/embedding-cache")
+async def get_embedding_cache_metrics() -> Any:
+    """Hit rate of the embedding cache, None when it is disabled or no embedding was requested yet."""
+    return retriever_registry.embedding_cache_metrics()
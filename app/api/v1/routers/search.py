@@ -0,0 +1,136 @@
+import json
+from contextvars import copy_context
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from langchain.schema import Document
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api import deps
+from app.core.timing import record_stages, server_timing, stage
+from app.data_access_layer.collections_list_DAL import CollectionsListDaL
+from app.data_access_layer.exceptions import CollectionNotFoundException
+from app.schemas.search import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    HighlightRequest,
+    HighlightResponse,
+    SearchRequest,
+    SearchResponse,
+)
+from app.services.retrievers import CustomParentDocumentRetriever, RetrieverRegistry
+
+router = APIRouter()
+
+
+def _hit(doc: Document) -> Dict[str, Any]:
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+async def _retriever(db: AsyncSession, registry: RetrieverRegistry, collection_name: str, k: int, score: float,
+                     hybrid: bool = False, collapse_parents: bool = False) -> CustomParentDocumentRetriever:
+    try:
+        await CollectionsListDaL.aget_collection(db, collection_name)
+    except CollectionNotFoundException:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' does not exist")
+    # Building a retriever reads the collection index parameters over the sync engine
+    return await run_in_threadpool(registry.get, collection_name, k=k, score=score, hybrid=hybrid,
+                                  collapse_parents=collapse_parents)
+
+
+def _highlight_hit(doc: Document, include_parent: bool) -> Dict[str, Any]:
+    metadata = dict(doc.metadata)
+    highlights = metadata.pop("highlights")
+    return {"metadata": metadata, "highlights": highlights,
+            "page_content": doc.page_content if include_parent else None}
+
+
+def _timed_response(content: Any, timings: Dict[str, float]) -> JSONResponse:
+    with stage("serialize"):
+        response = JSONResponse(jsonable_encoder(content))
+    response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+
+@router.post("/", response_model=SearchResponse)
+async def search(*, db: AsyncSession = Depends(deps.get_db_async),
+                 registry: RetrieverRegistry = Depends(deps.get_retriever_registry),
+                 search_in: SearchRequest) -> Any:
+    """Search a collection for parent documents relevant to a query."""
+    retriever = await _retriever(db, registry, search_in.collection_name, search_in.k, search_in.score,
+                                 search_in.hybrid, search_in.collapse_parents)
+    with record_stages() as timings:
+        docs = await retriever.ainvoke(
+            search_in.query, ef_search=search_in.ef_search, probes=search_in.probes,
+            metadata_filter=search_in.metadata_filter,
+        )
+        return _timed_response({"hits": [_hit(doc) for doc in docs]}, timings)
+
+
+@router.post("/batch", response_model=BatchSearchResponse)
+async def search_batch(*, db: AsyncSession = Depends(deps.get_db_async),
+                       registry: RetrieverRegistry = Depends(deps.get_retriever_registry),
+                       search_in: BatchSearchRequest) -> Any:
+    """Search a collection for several queries at once, results are in the order of the queries."""
+    retriever = await _retriever(db, registry, search_in.collection_name, search_in.k, search_in.score,
+                                 search_in.hybrid, search_in.collapse_parents)
+    with record_stages() as timings:
+        # The copied context carries the timings into the worker thread
+        results = await run_in_threadpool(
+            copy_context().run, retriever.batch_search, search_in.queries,
+            ef_search=search_in.ef_search, probes=search_in.probes, metadata_filter=search_in.metadata_filter,
+        )
+        return _timed_response({"results": [[_hit(doc) for doc in docs] for docs in results]}, timings)
+
+
+@router.post("/highlights", response_model=HighlightResponse)
+async def search_highlights(*, db: AsyncSession = Depends(deps.get_db_async),
+                            registry: RetrieverRegistry = Depends(deps.get_retriever_registry),
+                            search_in: HighlightRequest) -> Any:
+    """Search a collection for matched child spans, full parents are returned only on request."""
+    retriever = await _retriever(db, registry, search_in.collection_name, search_in.k, search_in.score)
+    with record_stages() as timings:
+        docs = await retriever.ahighlights(
+            search_in.query, spans_per_parent=search_in.spans_per_parent, window_chars=search_in.window_chars,
+            include_parent=search_in.include_parent, ef_search=search_in.ef_search, probes=search_in.probes,
+            metadata_filter=search_in.metadata_filter,
+        )
+        return _timed_response({"hits": [_highlight_hit(doc, search_in.include_parent) for doc in docs]}, timings)
+
+
+@router.post("/stream")
+async def search_stream(*, db: AsyncSession = Depends(deps.get_db_async),
+                        registry: RetrieverRegistry = Depends(deps.get_retriever_registry),
+                        search_in: SearchRequest) -> StreamingResponse:
+    """Search a collection, sending parents as NDJSON lines as soon as each is read from the docstore.
+
+    `Server-Timing` covers the stages finished before the first parent is sent (embed, vector query,
+    the first docstore read). The last line, `{"done": true, ...}`, has the count and the timings
+    of the whole search in milliseconds.
+    """
+    retriever = await _retriever(db, registry, search_in.collection_name, search_in.k, search_in.score,
+                                 search_in.hybrid, search_in.collapse_parents)
+    with record_stages() as timings:
+        parents = retriever.astream_parents(
+            search_in.query, ef_search=search_in.ef_search, probes=search_in.probes,
+            metadata_filter=search_in.metadata_filter,
+        )
+        first = await anext(parents, None)
+    headers = {"Server-Timing": server_timing(timings)}
+
+    async def lines():
+        doc, count = first, 0
+        while doc is not None:
+            with record_stages(timings), stage("serialize"):
+                line = json.dumps(jsonable_encoder(_hit(doc)), ensure_ascii=False) + "\n"
+            yield line
+            count += 1
+            with record_stages(timings):
+                doc = await anext(parents, None)
+        timing = {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+        yield json.dumps({"done": True, "count": count, "timing": timing}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
@@ -1,6 +1,6 @@
 import os
 import secrets
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
 from pydantic import AnyHttpUrl, HttpUrl, PostgresDsn, field_validator, ValidationInfo
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -64,6 +64,57 @@ class Settings(BaseSettings):
             path=f"{values.data.get('POSTGRES_DB') or ''}",
         )
 
+    # Connection pools of the sync and async engines in app/database.py
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    # Seconds after which a pooled connection is reopened, -1 disables recycling
+    DB_POOL_RECYCLE: int = 1800
+    # Server-side statement_timeout of every connection in milliseconds, None keeps the server default
+    DB_STATEMENT_TIMEOUT_MS: Optional[int] = None
+
+    # Retries of transactions failed on deadlock / lock timeout / NOWAIT conflict (jittered exponential backoff)
+    DB_RETRY_ATTEMPTS: int = 3
+    DB_RETRY_BASE_DELAY: float = 0.05
+    DB_RETRY_MAX_DELAY: float = 2.0
+
+    OPENAI_API_KEY: Optional[str] = None
+
+    PG_VECTOR_URI: Optional[str] = None
+    PG_VECTOR_POOL_SIZE: int = 5
+    PG_VECTOR_MAX_OVERFLOW: int = 10
+
+    REDIS_URL: str = "redis://redis:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+    # Seconds a command waits for a free pooled connection before raising, instead of failing at once
+    REDIS_POOL_TIMEOUT: float = 5.0
+
+    # How many (collection_name, k, score) retrievers are kept alive per process
+    RETRIEVER_REGISTRY_SIZE: int = 32
+
+    # Parent docstore entries: "json" (langchain default) or "compact" (msgpack + zstd, app/services/docstore.py).
+    # Compact docstores read JSON entries as well, so switching needs no migration
+    DOCSTORE_FORMAT: Literal["json", "compact"] = "json"
+    DOCSTORE_COMPRESSION_LEVEL: int = 3
+
+    # Embedding cache of the retriever registry (app/services/embeddings.py): an in-process LRU of this many
+    # vectors (0 disables it), backed by Redis entries living EMBEDDING_CACHE_TTL seconds when EMBEDDING_CACHE_REDIS
+    EMBEDDING_CACHE_SIZE: int = 10_000
+    EMBEDDING_CACHE_REDIS: bool = False
+    EMBEDDING_CACHE_TTL: Optional[int] = 7 * 24 * 3600
+
+    # Retriever result cache (app/services/result_cache.py), size 0 disables it
+    RESULT_CACHE_SIZE: int = 10_000
+    RESULT_CACHE_TTL: float = 300
+    # Seconds a process reuses a collection version read from Redis, writes of other processes show up that late
+    RESULT_CACHE_VERSION_TTL: float = 1.0
+    # Cosine similarity above which a cached query's results are reused, None disables the semantic tier
+    RESULT_CACHE_SEMANTIC_THRESHOLD: Optional[float] = None
+    RESULT_CACHE_SEMANTIC_CANDIDATES: int = 128
+
+    # Text search configuration of the hybrid retriever ("polish" needs a Polish dictionary installed in postgres)
+    TEXT_SEARCH_CONFIG: str = "simple"
+
     model_config = SettingsConfigDict(case_sensitive=True)
 
 
@@ -0,0 +1,69 @@
+"""Checkout wait times of SQLAlchemy connection pools.
+
+`timed_pool_class` wraps a pool class so that every checkout is measured: the time a caller waited
+for a pooled connection, including opening a new one when the pool grows. Long waits mean the
+pool is smaller than the number of concurrent workers using it.
+"""
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Type
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+
+class PoolCheckoutStats:
+    """Counters of one pool, percentiles are taken over the last `window` checkouts."""
+
+    def __init__(self, window: int = 2048):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self._recent.append(seconds)
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, timeouts, total_wait, max_wait = self.checkouts, self.timeouts, self.total_wait, self.max_wait
+        observed = checkouts + timeouts
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "mean_wait": total_wait / observed if observed else 0.0,
+            "max_wait": max_wait,
+            "p50_wait": statistics.median(recent) if recent else 0.0,
+            "p99_wait": recent[min(len(recent) - 1, int(len(recent) * 0.99))] if recent else 0.0,
+        }
+
+
+def timed_pool_class(base: Type[Pool], stats: PoolCheckoutStats) -> Type[Pool]:
+    """Subclass of `base` reporting checkout waits to `stats`, pass it to create_engine as `poolclass`.
+    A subclass rather than pool events: events fire after the checkout, the wait is not visible to them."""
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                stats.observe(time.perf_counter() - started, timed_out=True)
+                raise
+            stats.observe(time.perf_counter() - started)
+            return connection
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
@@ -0,0 +1,52 @@
+"""Per-request stage timings (embed, vector query, docstore fetch, ...) for `Server-Timing` headers.
+
+`record_stages` starts collecting for the current context, code on the request path marks its
+stages with `stage`. Outside `record_stages` stages cost one ContextVar lookup. Durations of a stage
+entered several times are added up. Tasks and executors started with a copy of the context
+(asyncio, langchain's `run_in_executor`, `contextvars.copy_context().run`) write to the same timings.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def record_stages(timings: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """Collect stage durations (seconds) of the code run inside the block.
+
+    Passing the timings of an earlier block continues them, e.g. in a streaming response body.
+    """
+    timings = {} if timings is None else timings
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+async def timed(awaitable: Awaitable[T], name: str) -> T:
+    with stage(name):
+        return await awaitable
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """`Server-Timing` header value, durations in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -1,18 +1,42 @@
-import asyncio
-import logging
-import time
+import warnings
+from dataclasses import replace
+from typing import Dict, Iterable, List, Literal, Optional, Set, Union
 
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import Session, select
-from sqlalchemy.exc import IntegrityError, OperationalError
-from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import BigInteger, and_, any_, cast, delete, func, literal
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import IntegrityError
 
-from app.models.database_models import CollectionsList
+from app.models.database_models import CollectionMember, CollectionsList
 from app.schemas.collection_list import CollectionsListCreate
-from app.data_access_layer.exceptions import CollectionExistsException, CollectionNotFoundException
+from app.data_access_layer.exceptions import (
+    CollectionBusyException,
+    CollectionExistsException,
+    CollectionNotFoundException,
+)
+from app.data_access_layer.retry import RetryPolicy, default_retry_policy
+from app.services.result_cache import abump_collection_version, bump_collection_version
+
+# Как ждать строку коллекции, занятую другой транзакцией, см. CollectionsListDaL._lock_collection
+LockMode = Literal["wait", "nowait", "skip_locked"]
+
+
+def _legacy_retry_policy(retry_policy: Union[RetryPolicy, int, None], retries: Optional[int]) -> Optional[RetryPolicy]:
+    """Политика повторов по устаревшему аргументу 'retries' (число попыток, в том числе позиционно
+    на месте 'retry_policy'). Будет удалено в следующем релизе."""
+    if isinstance(retry_policy, int):
+        retry_policy, retries = None, retry_policy
+    if retries is None:
+        return retry_policy
+    warnings.warn("'retries' is deprecated, pass retry_policy=RetryPolicy(retries=...)", DeprecationWarning,
+                  stacklevel=3)
+    return replace(retry_policy or default_retry_policy, retries=max(retries - 1, 0))
 
 
 class CollectionsListDaL:
+    """Изменения состава и индекса коллекции увеличивают её версию, кэш результатов поиска
+    (app/services/result_cache.py) после этого считает сохранённые результаты устаревшими."""
 
     @staticmethod
     def get_collections_list(database: Session):
@@ -30,6 +54,91 @@ class CollectionsListDaL:
             result = await session.exec(statement)
             return result.all() or []
 
+    @staticmethod
+    def get_collection(database: Session, collection_name: str) -> CollectionsList:
+        """Получить коллекцию по имени."""
+        with database as session:
+            found = session.get(CollectionsList, collection_name)
+            if not found:
+                raise CollectionNotFoundException(collection_name)
+            return found
+
+    @staticmethod
+    async def aget_collection(database: AsyncSession, collection_name: str) -> CollectionsList:
+        """Асинхронно получить коллекцию по имени."""
+        async with database as session:
+            found = await session.get(CollectionsList, collection_name)
+            if not found:
+                raise CollectionNotFoundException(collection_name)
+            return found
+
+    @staticmethod
+    def _lock_statement(collection_name: str, lock: LockMode, key_share: bool):
+        if lock not in ("wait", "nowait", "skip_locked"):
+            raise ValueError(f"Unknown lock mode: {lock}")
+        return select(CollectionsList).where(CollectionsList.name == collection_name).with_for_update(
+            key_share=key_share, nowait=lock == "nowait", skip_locked=lock == "skip_locked")
+
+    @staticmethod
+    def _lock_collection(session: Session, collection_name: str, lock: LockMode,
+                         key_share: bool = False) -> CollectionsList:
+        """Заблокировать строку коллекции. 'nowait' - конфликт сразу завершается ошибкой (её повторяет
+        RetryPolicy), 'skip_locked' - занятая строка даёт CollectionBusyException вместо ожидания."""
+        found = session.exec(CollectionsListDaL._lock_statement(collection_name, lock, key_share)).first()
+        if found:
+            return found
+        if lock == "skip_locked" and session.get(CollectionsList, collection_name) is not None:
+            raise CollectionBusyException(collection_name)
+        raise CollectionNotFoundException(collection_name)
+
+    @staticmethod
+    async def _alock_collection(session: AsyncSession, collection_name: str, lock: LockMode,
+                                key_share: bool = False) -> CollectionsList:
+        """Асинхронный вариант '_lock_collection'."""
+        found = (await session.exec(CollectionsListDaL._lock_statement(collection_name, lock, key_share))).first()
+        if found:
+            return found
+        if lock == "skip_locked" and await session.get(CollectionsList, collection_name) is not None:
+            raise CollectionBusyException(collection_name)
+        raise CollectionNotFoundException(collection_name)
+
+    @staticmethod
+    def set_vector_index(database: Session, collection_name: str, vector_index: Optional[Dict],
+                         lock: LockMode = "wait", retry_policy: Optional[RetryPolicy] = None):
+        """Сохранить параметры ANN-индекса коллекции. None - индекс удалён."""
+
+        def operation():
+            with database as session:
+                with session.begin():
+                    # FOR NO KEY UPDATE: не мешает параллельной вставке документов коллекции (FOR KEY SHARE)
+                    found = CollectionsListDaL._lock_collection(session, collection_name, lock, key_share=True)
+                    found.vector_index = vector_index
+                    session.add(found)
+                session.refresh(found)
+                return found
+
+        found = (retry_policy or default_retry_policy).run(operation)
+        bump_collection_version(collection_name)
+        return found
+
+    @staticmethod
+    async def aset_vector_index(database: AsyncSession, collection_name: str, vector_index: Optional[Dict],
+                                lock: LockMode = "wait", retry_policy: Optional[RetryPolicy] = None):
+        """Асинхронно сохранить параметры ANN-индекса коллекции. None - индекс удалён."""
+
+        async def operation():
+            async with database as session:
+                async with session.begin():
+                    found = await CollectionsListDaL._alock_collection(session, collection_name, lock, key_share=True)
+                    found.vector_index = vector_index
+                    session.add(found)
+                await session.refresh(found)
+                return found
+
+        found = await (retry_policy or default_retry_policy).arun(operation)
+        await abump_collection_version(collection_name)
+        return found
+
     @staticmethod
     def create_collection(database: Session, collection: CollectionsListCreate):
         """Создать новую коллекцию."""
@@ -61,120 +170,213 @@ class CollectionsListDaL:
                     return collection
 
     @staticmethod
-    def add_to_collection(database: Session, collection_name: str, id_to_add: int, retries: int = 3):
-        """Добавить ID в поле 'contains_ids' с обработкой deadlock и lock timeout."""
-
-        retry_count = 0
-        while retry_count < retries:
-            try:
-                with database as session:
-                    select_statement = select(CollectionsList).where(
-                        CollectionsList.name == collection_name).with_for_update()
-                    result = session.exec(select_statement)
-                    found: CollectionsList = result.first()
-
-                    if not found:
-                        raise CollectionNotFoundException(collection_name)
+    def _ids_array(ids: List[int]):
+        # Один параметр-массив вместо параметра на каждый документ: один запрос на любое число id
+        return cast(ids, ARRAY(BigInteger))
 
-                    found.contains_ids.append(id_to_add)
-                    session.add(found)
-                    session.commit()
+    @staticmethod
+    def _members_insert(collection_name: str, ids: List[int]):
+        return insert(CollectionMember).from_select(
+            ["collection_name", "document_id"],
+            select(literal(collection_name), func.unnest(CollectionsListDaL._ids_array(ids))),
+        ).on_conflict_do_nothing()
 
-                # Успешное завершение транзакции, выходим из цикла
-                return found
+    @staticmethod
+    def _members_in(collection_name: str, ids: List[int]):
+        return and_(CollectionMember.collection_name == collection_name,
+                    CollectionMember.document_id == any_(CollectionsListDaL._ids_array(ids)))
 
-            except OperationalError as e:
-                # Проверяем, не связан ли OperationalError с deadlock или lock timeout
-                if "deadlock detected" in str(e.orig) or "lock timeout" in str(e.orig):
-                    retry_count += 1
-                    session.rollback()  # Откат транзакции перед повтором
-                    logging.info(f"Deadlock/Lock timeout detected. Retrying... Attempt {retry_count}/{retries}")
-                    time.sleep(1)  # Пауза перед повторной попыткой
-                else:
-                    # Если ошибка не связана с блокировками, пробрасываем её дальше
-                    session.rollback()
-                    raise
+    @staticmethod
+    def _members_page(collection_name: str, after: Optional[int], limit: int):
+        statement = select(CollectionMember.document_id).where(CollectionMember.collection_name == collection_name)
+        if after is not None:
+            statement = statement.where(CollectionMember.document_id > after)
+        return statement.order_by(CollectionMember.document_id).limit(limit)
 
-            except StaleDataError:
-                # Обработка ошибок устаревших данных, если актуальные данные были изменены другим процессом
-                session.rollback()
-                logging.info("Stale data detected, retrying...")
-                retry_count += 1
-                time.sleep(1)
+    @staticmethod
+    def add_many_to_collection(database: Session, collection_name: str, ids_to_add: Iterable[int],
+                               retry_policy: Optional[RetryPolicy] = None) -> int:
+        """Добавить документы в коллекцию. Уже добавленные пропускаются (ON CONFLICT DO NOTHING).
+        Строка коллекции не блокируется, поэтому параллельные индексаторы не ждут друг друга.
+        Возвращает число добавленных документов."""
+        # Одинаковый порядок вставки у всех воркеров исключает взаимные блокировки по первичному ключу
+        ids = sorted(set(ids_to_add))
+        if not ids:
+            return 0
 
-        # Если все попытки исчерпаны, выбрасываем исключение
-        raise Exception(
-            f"Failed to add ID to collection '{collection_name}' after {retries} attempts due to deadlock/lock timeout.")
+        def operation() -> int:
+            try:
+                with database as session:
+                    with session.begin():
+                        return session.execute(CollectionsListDaL._members_insert(collection_name, ids)).rowcount
+            except IntegrityError:
+                # Конфликты ключа игнорируются, остаётся только нарушение внешнего ключа
+                raise CollectionNotFoundException(collection_name)
 
+        added = (retry_policy or default_retry_policy).run(operation)
+        if added:
+            bump_collection_version(collection_name)
+        return added
 
     @staticmethod
-    async def aadd_to_collection(database: AsyncSession, collection_name: str, id_to_add: int, retries: int = 3):
-        """Асинхронный метод для добавления ID в поле 'contains_ids' с обработкой deadlock и lock timeout."""
+    async def aadd_many_to_collection(database: AsyncSession, collection_name: str, ids_to_add: Iterable[int],
+                                      retry_policy: Optional[RetryPolicy] = None) -> int:
+        """Асинхронно добавить документы в коллекцию, см. 'add_many_to_collection'."""
+        ids = sorted(set(ids_to_add))
+        if not ids:
+            return 0
 
-        retry_count = 0
-        while retry_count < retries:
+        async def operation() -> int:
             try:
                 async with database as session:
                     async with session.begin():
-                        select_statement = select(CollectionsList).where(
-                            CollectionsList.name == collection_name).with_for_update()
-                        result = await session.exec(select_statement)
-                        found: CollectionsList = result.first()
+                        result = await session.execute(CollectionsListDaL._members_insert(collection_name, ids))
+                        return result.rowcount
+            except IntegrityError:
+                raise CollectionNotFoundException(collection_name)
 
-                        if not found:
-                            raise CollectionNotFoundException(collection_name)
+        added = await (retry_policy or default_retry_policy).arun(operation)
+        if added:
+            await abump_collection_version(collection_name)
+        return added
 
-                        # Добавляем ID в список contains_ids
-                        found.contains_ids.append(id_to_add)
-                        session.add(found)
-                        await session.commit()  # Асинхронная фиксация транзакции
+    @staticmethod
+    def add_to_collection(database: Session, collection_name: str, id_to_add: int,
+                          retry_policy: Optional[RetryPolicy] = None, retries: Optional[int] = None) -> bool:
+        """Добавить документ в коллекцию. False - документ уже был в коллекции.
+        Раньше возвращала строку коллекции; 'retries' устарел, вместо него 'retry_policy'."""
+        retry_policy = _legacy_retry_policy(retry_policy, retries)
+        return CollectionsListDaL.add_many_to_collection(database, collection_name, [id_to_add], retry_policy) > 0
 
-                # Успешное завершение транзакции, выходим из цикла
-                return found
+    @staticmethod
+    async def aadd_to_collection(database: AsyncSession, collection_name: str, id_to_add: int,
+                                 retry_policy: Optional[RetryPolicy] = None, retries: Optional[int] = None) -> bool:
+        """Асинхронно добавить документ в коллекцию, см. 'add_to_collection'."""
+        retry_policy = _legacy_retry_policy(retry_policy, retries)
+        return await CollectionsListDaL.aadd_many_to_collection(database, collection_name, [id_to_add],
+                                                                retry_policy) > 0
 
-            except OperationalError as e:
-                # Проверяем, связан ли OperationalError с deadlock или lock timeout
-                if "deadlock detected" in str(e.orig) or "lock timeout" in str(e.orig):
-                    retry_count += 1
-                    await session.rollback()  # Откат транзакции перед повтором
-                    logging.info(f"Deadlock/Lock timeout detected. Retrying... Attempt {retry_count}/{retries}")
-                    await asyncio.sleep(1)  # Асинхронная пауза перед повторной попыткой
-                else:
-                    # Если ошибка не связана с deadlock/lock timeout, пробрасываем её дальше
-                    await session.rollback()
-                    raise
+    @staticmethod
+    def is_in_collection(database: Session, collection_name: str, document_id: int) -> bool:
+        """Проверить, проиндексирован ли документ в коллекцию (поиск по первичному ключу)."""
+        with database as session:
+            return session.get(CollectionMember, (collection_name, document_id)) is not None
 
-            except StaleDataError:
-                # Обработка ошибок устаревших данных
-                await session.rollback()
-                logging.info("Stale data detected, retrying...")
-                retry_count += 1
-                await asyncio.sleep(1)
+    @staticmethod
+    async def ais_in_collection(database: AsyncSession, collection_name: str, document_id: int) -> bool:
+        """Асинхронно проверить, проиндексирован ли документ в коллекцию."""
+        async with database as session:
+            return await session.get(CollectionMember, (collection_name, document_id)) is not None
 
-        # Если все попытки исчерпаны, выбрасываем исключение
-        raise Exception(
-            f"Failed to add ID to collection '{collection_name}' after {retries} attempts due to deadlock/lock timeout.")
+    @staticmethod
+    def contains_many(database: Session, collection_name: str, ids: Iterable[int]) -> Set[int]:
+        """Какие из документов уже проиндексированы в коллекцию. Один запрос по первичному ключу
+        на весь список, например чтобы пропустить при загрузке уже проиндексированные документы."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        with database as session:
+            statement = select(CollectionMember.document_id).where(CollectionsListDaL._members_in(collection_name, ids))
+            return set(session.exec(statement).all())
 
     @staticmethod
-    def delete_collection(database: Session, collection_name: str):
+    async def acontains_many(database: AsyncSession, collection_name: str, ids: Iterable[int]) -> Set[int]:
+        """Асинхронно проверить, какие из документов уже проиндексированы в коллекцию."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        async with database as session:
+            statement = select(CollectionMember.document_id).where(CollectionsListDaL._members_in(collection_name, ids))
+            return set((await session.exec(statement)).all())
+
+    @staticmethod
+    def remove_many_from_collection(database: Session, collection_name: str, ids_to_remove: Iterable[int]) -> int:
+        """Удалить документы из коллекции одним запросом. Возвращает число удалённых."""
+        ids = list(ids_to_remove)
+        if not ids:
+            return 0
         with database as session:
             with session.begin():
-                try:
-                    select_statement = select(CollectionsList).where(
-                        CollectionsList.name == collection_name).with_for_update()
-                    result = session.exec(select_statement)
-                    found: CollectionsList = result.first()
+                statement = delete(CollectionMember).where(CollectionsListDaL._members_in(collection_name, ids))
+                removed = session.execute(statement).rowcount
+        if removed:
+            bump_collection_version(collection_name)
+        return removed
 
-                    if not found:
-                        raise CollectionNotFoundException(collection_name)
+    @staticmethod
+    async def aremove_many_from_collection(database: AsyncSession, collection_name: str,
+                                           ids_to_remove: Iterable[int]) -> int:
+        """Асинхронно удалить документы из коллекции. Возвращает число удалённых."""
+        ids = list(ids_to_remove)
+        if not ids:
+            return 0
+        async with database as session:
+            async with session.begin():
+                statement = delete(CollectionMember).where(CollectionsListDaL._members_in(collection_name, ids))
+                removed = (await session.execute(statement)).rowcount
+        if removed:
+            await abump_collection_version(collection_name)
+        return removed
+
+    @staticmethod
+    def list_collection_members(database: Session, collection_name: str, after: Optional[int] = None,
+                                limit: int = 1000) -> List[int]:
+        """Страница id документов коллекции по возрастанию. Следующая страница - 'after' = последний id
+        текущей: keyset-пагинация по первичному ключу не замедляется на дальних страницах."""
+        with database as session:
+            return list(session.exec(CollectionsListDaL._members_page(collection_name, after, limit)).all())
+
+    @staticmethod
+    async def alist_collection_members(database: AsyncSession, collection_name: str, after: Optional[int] = None,
+                                       limit: int = 1000) -> List[int]:
+        """Асинхронно получить страницу id документов коллекции, см. 'list_collection_members'."""
+        async with database as session:
+            return list((await session.exec(CollectionsListDaL._members_page(collection_name, after, limit))).all())
+
+    @staticmethod
+    def count_collection(database: Session, collection_name: str) -> int:
+        """Число документов коллекции (index-only scan по первичному ключу)."""
+        with database as session:
+            statement = select(func.count()).select_from(CollectionMember).where(
+                CollectionMember.collection_name == collection_name)
+            return session.exec(statement).one()
+
+    @staticmethod
+    async def acount_collection(database: AsyncSession, collection_name: str) -> int:
+        """Асинхронно посчитать документы коллекции."""
+        async with database as session:
+            statement = select(func.count()).select_from(CollectionMember).where(
+                CollectionMember.collection_name == collection_name)
+            return (await session.exec(statement)).one()
+
+    @staticmethod
+    def delete_collection(database: Session, collection_name: str, lock: LockMode = "wait",
+                          retry_policy: Optional[RetryPolicy] = None):
+        """Удалить коллекцию, её документы удаляются каскадно."""
+
+        def operation():
+            with database as session:
+                with session.begin():
+                    found = CollectionsListDaL._lock_collection(session, collection_name, lock)
                     session.delete(found)
-                    session.commit()
+                return found
 
-                except IntegrityError:
-                    session.rollback()
-                    ...
-                else:
-                    return found
+        found = (retry_policy or default_retry_policy).run(operation)
+        bump_collection_version(collection_name)
+        return found
 
+    @staticmethod
+    async def adelete_collection(database: AsyncSession, collection_name: str, lock: LockMode = "wait",
+                                 retry_policy: Optional[RetryPolicy] = None):
+        """Асинхронно удалить коллекцию, её документы удаляются каскадно."""
 
+        async def operation():
+            async with database as session:
+                async with session.begin():
+                    found = await CollectionsListDaL._alock_collection(session, collection_name, lock)
+                    await session.delete(found)
+                return found
 
+        found = await (retry_policy or default_retry_policy).arun(operation)
+        await abump_collection_version(collection_name)
+        return found
@@ -13,3 +13,10 @@ class CollectionNotFoundException(Exception):
         self.message = f"Collection does not exists: '{collection_name}'"
         super().__init__(self.message)
 
+
+
+class CollectionBusyException(Exception):
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self.message = f"Collection is locked by another transaction: '{collection_name}'"
+        super().__init__(self.message)
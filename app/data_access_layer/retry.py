@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# deadlock_detected, serialization_failure, lock_not_available (NOWAIT, lock_timeout)
+RETRYABLE_SQLSTATES = {"40P01", "40001", "55P03"}
+
+
+def is_retryable(error: DBAPIError) -> bool:
+    """Транзакцию можно повторить целиком: она откатилась из-за конкуренции за блокировки."""
+    if getattr(error.orig, "pgcode", None) in RETRYABLE_SQLSTATES:
+        return True
+    return "deadlock detected" in str(error.orig) or "lock timeout" in str(error.orig)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+
+    """Повтор транзакций с экспоненциальной паузой и полным джиттером: пауза перед попыткой n
+    случайна в [0, min(max_delay, base_delay * 2 ** n)], чтобы конкурирующие воркеры не повторяли
+    запросы одновременно. Операция повторяется целиком, поэтому должна сама открывать сессию."""
+    retries: int = 3
+    base_delay: float = 0.05
+    max_delay: float = 2.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def run(self, operation: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except DBAPIError as e:
+                if not is_retryable(e) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = self.delay(attempt)
+                logging.info(f"Lock conflict ({e.orig}). Retrying in {delay:.3f}s... Attempt {attempt}/{self.retries}")
+                time.sleep(delay)
+
+    async def arun(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Как 'run', но пауза не блокирует цикл событий."""
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except DBAPIError as e:
+                if not is_retryable(e) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                delay = self.delay(attempt)
+                logging.info(f"Lock conflict ({e.orig}). Retrying in {delay:.3f}s... Attempt {attempt}/{self.retries}")
+                await asyncio.sleep(delay)
+
+
+default_retry_policy = RetryPolicy(
+    retries=settings.DB_RETRY_ATTEMPTS,
+    base_delay=settings.DB_RETRY_BASE_DELAY,
+    max_delay=settings.DB_RETRY_MAX_DELAY,
+)
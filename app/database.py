@@ -1,16 +1,48 @@
+from typing import Dict
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from sqlmodel.ext.asyncio.session import AsyncSession as AS
 
 from app.core.config import settings
+from app.core.pool_metrics import PoolCheckoutStats, timed_pool_class
+
+
+pool_stats = {"sync": PoolCheckoutStats(), "async": PoolCheckoutStats()}
+
+_pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 
+_async_connect_args, _sync_connect_args = {}, {}
+if settings.DB_STATEMENT_TIMEOUT_MS is not None:
+    _async_connect_args = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    _sync_connect_args = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
 
-as_engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI_ASYNC.unicode_string())
+as_engine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI_ASYNC.unicode_string(),
+    poolclass=timed_pool_class(AsyncAdaptedQueuePool, pool_stats["async"]),
+    connect_args=_async_connect_args,
+    **_pool_options,
+)
 AsyncSessLocal = async_sessionmaker(bind=as_engine, autoflush=False, expire_on_commit=False, class_=AS)
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI.unicode_string(), pool_pre_ping=True)
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI.unicode_string(),
+    poolclass=timed_pool_class(QueuePool, pool_stats["sync"]),
+    connect_args=_sync_connect_args,
+    **_pool_options,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def pool_metrics() -> Dict[str, Dict[str, float]]:
+    """Checkout wait times of both engines, for sizing pools against the number of workers."""
+    return {name: stats.metrics() for name, stats in pool_stats.items()}
@@ -4,6 +4,7 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router as api_router_v1
 from app.core.config import settings
+from app.services.retrievers import retriever_registry
 
 
 app = FastAPI(title=settings.PROJECT_NAME,
@@ -23,5 +24,11 @@ if settings.BACKEND_CORS_ORIGINS:
 
 app.include_router(api_router_v1, prefix=settings.API_V1_STR)
 
+
+@app.on_event("shutdown")
+async def close_retrievers():
+    await retriever_registry.aclose()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", reload=True, port=8787)
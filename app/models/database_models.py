@@ -1,8 +1,7 @@
-from typing import Optional, List
+from typing import Dict, Optional
 
-from pydantic import BaseModel
-import sqlmodel
 from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, Column, ForeignKey, String
 from sqlalchemy.dialects.postgresql.json import JSON
 
 
@@ -10,10 +9,22 @@ from sqlalchemy.dialects.postgresql.json import JSON
 class CollectionsList(SQLModel, table=True):
 
     """Таблица используется для идентификации и предоставления списка существующих векторных коллекций.
-    Поле 'contains_ids' содержит в себе список всех проиндексированных в данную коллекцию документов."""
+    Проиндексированные в коллекцию документы хранятся в таблице 'collection_members'."""
     name: str = Field(primary_key=True, nullable=False)
     description: Optional[str] = Field(default=None, nullable=True)
 
-    contains_ids: Optional[List[int]] = Field(default_factory=list, nullable=False, sa_column_kwargs={"type_": JSON})
+    # Параметры ANN-индекса коллекции (VectorIndexConfig), None - индекса нет
+    vector_index: Optional[Dict] = Field(default=None, sa_column=Column(JSON, nullable=True))
 
 
+class CollectionMember(SQLModel, table=True):
+
+    """Документ, проиндексированный в коллекцию: по строке на пару (коллекция, документ).
+    Составной первичный ключ обслуживает проверку принадлежности и подсчёт документов коллекции,
+    строки удаляются вместе с коллекцией."""
+    __tablename__ = "collection_members"
+
+    collection_name: str = Field(sa_column=Column(
+        String, ForeignKey("collectionslist.name", ondelete="CASCADE"), primary_key=True
+    ))
+    document_id: int = Field(sa_column=Column(BigInteger, primary_key=True))
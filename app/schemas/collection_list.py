@@ -1,11 +1,28 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 
 
 class CollectionsListCreate(BaseModel):
 
-    """Модель используется для создания идентификации коллекции. Поле 'contains_ids' отсутствует так как оно будет
-    изменяться только в процессе обновления коллекции. Это позволит создавать коллекции без наполнения"""
+    """Модель используется для создания идентификации коллекции. Документы коллекции ('collection_members')
+    добавляются только в процессе обновления коллекции. Это позволит создавать коллекции без наполнения"""
     name: str
     descritption: Optional[str] = Field(default=None)
+
+
+class VectorIndexConfig(BaseModel):
+
+    """Параметры ANN-индекса коллекции. Хранятся в поле 'vector_index' таблицы коллекций.
+    'm' и 'ef_construction' используются для HNSW, 'lists' - для IVFFlat. 'ef_search' и 'probes' -
+    значения по умолчанию для поиска, их можно переопределить в каждом запросе. 'iterative_scan' (HNSW,
+    pgvector >= 0.8) включается для поиска с фильтром по метаданным."""
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    # Индекс строится по выражению embedding::vector(dimensions), pgvector индексирует не более 2000 измерений
+    dimensions: int = Field(default=1536, gt=0, le=2000)
+    m: int = Field(default=16, ge=2, le=100)
+    ef_construction: int = Field(default=64, ge=4, le=1000)
+    lists: int = Field(default=100, ge=1, le=32768)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=32768)
+    iterative_scan: Optional[Literal["strict_order", "relaxed_order"]] = None
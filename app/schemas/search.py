@@ -0,0 +1,104 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class MetadataFilter(BaseModel):
+
+    """Фильтр поиска по метаданным интерпретаций, извлечённым CustomInterpretationParser.
+    Заданные условия объединяются через AND, ключевые слова должны присутствовать все. Даты включительно."""
+    release_date_from: Optional[date] = None
+    release_date_to: Optional[date] = None
+    author: Optional[str] = None
+    keywords: List[str] = Field(default_factory=list)
+    signature: Optional[str] = None
+
+
+class QueryRequest(BaseModel):
+
+    """Запрос по коллекции. 'k' и 'score' выбирают ретривер из реестра, 'ef_search' и 'probes'
+    переопределяют параметры индекса коллекции только для этого запроса. 'score' - минимальная
+    релевантность дочернего фрагмента, отсекается в SQL-запросе."""
+    collection_name: str
+    query: str = Field(min_length=1)
+    k: int = Field(default=6, ge=1, le=100)
+    score: float = Field(default=0.8, ge=0, le=1)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=32768)
+    metadata_filter: Optional[MetadataFilter] = None
+
+
+class SearchRequest(QueryRequest):
+
+    """Поиск документов по коллекции. В метаданных найденных документов возвращаются максимальная
+    ('score') и средняя ('mean_score') релевантность их фрагментов. 'collapse_parents' группирует
+    фрагменты по родителям в Postgres среди ближайших кандидатов, для гибридного поиска не используется."""
+    hybrid: bool = False
+    collapse_parents: bool = False
+
+
+class BatchSearchRequest(BaseModel):
+
+    """Пакетный поиск: все запросы векторизуются одним обращением к модели и ищутся одним SQL-запросом.
+    Результаты те же, что у отдельных запросов с теми же параметрами, и кэшируются так же."""
+    collection_name: str
+    queries: List[str] = Field(min_length=1, max_length=100)
+    k: int = Field(default=6, ge=1, le=100)
+    score: float = Field(default=0.8, ge=0, le=1)
+    hybrid: bool = False
+    collapse_parents: bool = False
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=32768)
+    metadata_filter: Optional[MetadataFilter] = None
+
+
+class SearchHit(BaseModel):
+
+    """Найденный родительский документ."""
+    page_content: str
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class SearchResponse(BaseModel):
+    hits: List[SearchHit]
+
+
+class BatchSearchResponse(BaseModel):
+
+    """Результаты в порядке запросов 'queries'."""
+    results: List[List[SearchHit]]
+
+
+class HighlightRequest(QueryRequest):
+
+    """Поиск фрагментов: для каждого найденного документа возвращаются совпавшие дочерние фрагменты
+    со смещениями, оценками и окном текста не длиннее 'window_chars'. Полный текст документа читается
+    из хранилища только при 'include_parent'. Фрагменты ищутся только векторным поиском без группировки
+    в Postgres, поэтому неизвестные поля (в том числе 'hybrid' и 'collapse_parents') отклоняются."""
+    model_config = ConfigDict(extra="forbid")
+
+    spans_per_parent: int = Field(default=3, ge=1, le=20)
+    window_chars: int = Field(default=600, ge=50, le=10_000)
+    include_parent: bool = False
+
+
+class HighlightSpan(BaseModel):
+
+    """Смещения 'start', 'end' и 'window_start' отсчитываются в тексте родительского документа,
+    None - фрагмент проиндексирован без 'start_index'."""
+    start: Optional[int] = None
+    end: Optional[int] = None
+    score: float
+    window_start: Optional[int] = None
+    text: str
+
+
+class HighlightHit(BaseModel):
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    highlights: List[HighlightSpan]
+    page_content: Optional[str] = None
+
+
+class HighlightResponse(BaseModel):
+    hits: List[HighlightHit]
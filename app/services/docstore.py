@@ -0,0 +1,184 @@
+"""Compact encoding of parent documents in the docstore.
+
+`create_kv_docstore` stores every parent as langchain JSON. The compact format is msgpack of
+`[page_content, metadata]` compressed with zstd, optionally with a dictionary trained on parents of
+the collection: interpretations share long boilerplate, which a dictionary turns into back references
+even in the first bytes of every entry.
+
+Entry layout: `\\x00`, format version, dictionary id (uint32, 0 - no dictionary), zstd frame.
+JSON entries start with `{`, so entries written before the switch are still read transparently.
+Dictionaries are kept in Redis per collection and looked up by id on read, so entries written with
+an older dictionary stay readable after retraining.
+"""
+import struct
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Optional
+
+import msgpack
+import redis
+import zstandard
+from langchain.schema import Document
+from langchain.storage.encoder_backed import EncoderBackedStore
+from langchain_core.load import loads
+from langchain_core.stores import ByteStore
+
+
+_MAGIC = b"\x00"
+_VERSION = 1
+_HEADER = struct.Struct(">cBI")
+
+_DATETIME_EXT = 1
+_DATE_EXT = 2
+
+
+def _load_json(data: bytes) -> Document:
+    """Entry written by `create_kv_docstore`."""
+    doc = loads(data.decode("utf-8"))
+    if not isinstance(doc, Document):
+        raise TypeError(f"Expected a Document instance. Got {type(doc)}")
+    return doc
+
+
+def _encode_extra(obj):
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_DATETIME_EXT, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(_DATE_EXT, obj.isoformat().encode())
+    raise TypeError(f"Cannot serialize {type(obj)} into the docstore")
+
+
+def _decode_extra(code: int, data: bytes):
+    if code == _DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    if code == _DATE_EXT:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def pack_document(doc: Document) -> bytes:
+    """Uncompressed msgpack of a document (also the training sample format of dictionaries)."""
+    return msgpack.packb([doc.page_content, doc.metadata], default=_encode_extra, use_bin_type=True)
+
+
+class CompactDocumentSerializer:
+    """`value_serializer` / `value_deserializer` pair for EncoderBackedStore.
+
+    `dictionary` is used to write new entries; `load_dictionary` returns the dictionary of an entry
+    written with another one by its id. An id it does not know is not looked up again for
+    `missing_ttl` seconds. Compression contexts are not thread safe and are kept per thread.
+    """
+
+    def __init__(self, level: int = 3, dictionary: Optional[zstandard.ZstdCompressionDict] = None,
+                 load_dictionary: Optional[Callable[[int], Optional[zstandard.ZstdCompressionDict]]] = None,
+                 missing_ttl: float = 60.0):
+        self.level = level
+        self.dictionary = dictionary
+        self.load_dictionary = load_dictionary
+        self.missing_ttl = missing_ttl
+        self._dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+        if dictionary is not None:
+            self._dictionaries[dictionary.dict_id()] = dictionary
+        # dict_id -> monotonic time until which it is known to be missing
+        self._missing: Dict[int, float] = {}
+        self._dictionaries_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def dict_id(self) -> int:
+        return self.dictionary.dict_id() if self.dictionary is not None else 0
+
+    def _dictionary(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        with self._dictionaries_lock:
+            dictionary = self._dictionaries.get(dict_id)
+            if dictionary is None:
+                now = time.monotonic()
+                if self.load_dictionary is not None and self._missing.get(dict_id, 0.0) <= now:
+                    dictionary = self.load_dictionary(dict_id)
+                    if dictionary is None:
+                        self._missing[dict_id] = now + self.missing_ttl
+                if dictionary is None:
+                    raise ValueError(f"Docstore entry needs the unknown compression dictionary {dict_id}")
+                self._dictionaries[dict_id] = dictionary
+                self._missing.pop(dict_id, None)
+        return dictionary
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            dictionary = self._dictionary(dict_id) if dict_id else None
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor
+
+    def dumps(self, doc: Document) -> bytes:
+        if not isinstance(doc, Document):
+            raise TypeError("Expected a Document instance")
+        return _HEADER.pack(_MAGIC, _VERSION, self.dict_id) + self._compressor().compress(pack_document(doc))
+
+    def loads(self, data: bytes) -> Document:
+        if data[:1] != _MAGIC:
+            return _load_json(data)
+        _, version, dict_id = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unknown docstore entry format version {version}")
+        packed = self._decompressor(dict_id).decompress(data[_HEADER.size:])
+        page_content, metadata = msgpack.unpackb(packed, ext_hook=_decode_extra, raw=False)
+        return Document(page_content=page_content, metadata=metadata)
+
+
+def train_dictionary(documents: Iterable[Document], size: int = 112_640) -> zstandard.ZstdCompressionDict:
+    """Train a zstd dictionary on sample parents, a few hundred are usually enough."""
+    return zstandard.train_dictionary(size, [pack_document(doc) for doc in documents])
+
+
+class DocstoreDictionaries:
+    """Trained dictionaries of collections in Redis: every trained dictionary by id plus the id
+    of the one new entries are written with."""
+
+    def __init__(self, client: redis.Redis, prefix: str = "docstore_dictionary"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, collection_name: str, dict_id: int) -> Optional[zstandard.ZstdCompressionDict]:
+        data = self.client.get(f"{self.prefix}:{collection_name}:{dict_id}")
+        return zstandard.ZstdCompressionDict(data) if data is not None else None
+
+    def current(self, collection_name: str) -> Optional[zstandard.ZstdCompressionDict]:
+        dict_id = self.client.get(f"{self.prefix}:{collection_name}:current")
+        return self.get(collection_name, int(dict_id)) if dict_id is not None else None
+
+    def save(self, collection_name: str, dictionary: zstandard.ZstdCompressionDict, current: bool = True) -> int:
+        dict_id = dictionary.dict_id()
+        pipe = self.client.pipeline()
+        # Dictionaries are never deleted, entries written with them would become unreadable
+        pipe.set(f"{self.prefix}:{collection_name}:{dict_id}", dictionary.as_bytes())
+        if current:
+            pipe.set(f"{self.prefix}:{collection_name}:current", dict_id)
+        pipe.execute()
+        return dict_id
+
+    def serializer(self, collection_name: str, level: int = 3) -> CompactDocumentSerializer:
+        """Serializer writing with the current dictionary of the collection and reading with any of them."""
+        return CompactDocumentSerializer(
+            level=level,
+            dictionary=self.current(collection_name),
+            load_dictionary=lambda dict_id: self.get(collection_name, dict_id),
+        )
+
+
+def create_compact_docstore(store: ByteStore, serializer: Optional[CompactDocumentSerializer] = None,
+                            key_encoder: Optional[Callable[[str], str]] = None) -> EncoderBackedStore:
+    """Drop-in replacement of `create_kv_docstore` writing compact entries."""
+    serializer = serializer or CompactDocumentSerializer()
+    return EncoderBackedStore(store, key_encoder or (lambda key: key), serializer.dumps, serializer.loads)
@@ -0,0 +1,251 @@
+import abc
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import redis
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+
+
+Vector = List[float]
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    # pgvector stores float4, so float32 in the cache loses nothing compared to the index
+    return array("f", vector).tobytes()
+
+
+def _unpack(data: bytes) -> Vector:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCacheBackend(abc.ABC):
+    """Storage of cached embeddings with batched reads and writes by key.
+
+    The async methods run the sync ones in the default executor unless a backend overrides them.
+    """
+
+    @abc.abstractmethod
+    def mget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        """Cached vectors in the order of `keys`, None for misses."""
+
+    @abc.abstractmethod
+    def mset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        """Store (key, vector) pairs."""
+
+    async def amget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        return await run_in_executor(None, self.mget, keys)
+
+    async def amset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        await run_in_executor(None, self.mset, items)
+
+
+class LRUEmbeddingCache(EmbeddingCacheBackend):
+    """In-process LRU embedding cache, vectors are kept as float32 arrays (6 KiB per 1536 dimensions)."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        result = []
+        with self._lock:
+            for key in keys:
+                vector = self._data.get(key)
+                if vector is not None:
+                    self._data.move_to_end(key)
+                    vector = vector.tolist()
+                result.append(vector)
+        return result
+
+    def mset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        with self._lock:
+            for key, vector in items:
+                self._data[key] = array("f", vector)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    # No I/O, so the async path does not need an executor
+    async def amget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        return self.mget(keys)
+
+    async def amset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        self.mset(items)
+
+
+class RedisEmbeddingCache(EmbeddingCacheBackend):
+    """Redis embedding cache, vectors are stored as float32 bytes."""
+
+    def __init__(self, client: Optional[redis.Redis] = None, redis_url: Optional[str] = None,
+                 prefix: str = "embedding", ttl: Optional[int] = None):
+        if client is None:
+            if redis_url is None:
+                raise ValueError("Either `client` or `redis_url` must be provided")
+            client = redis.Redis.from_url(redis_url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        if not keys:
+            return []
+        values = self.client.mget([f"{self.prefix}:{key}" for key in keys])
+        return [_unpack(value) if value is not None else None for value in values]
+
+    def mset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, vector in items:
+            pipe.set(f"{self.prefix}:{key}", _pack(vector), ex=self.ttl)
+        pipe.execute()
+
+
+class SQLiteEmbeddingCache(EmbeddingCacheBackend):
+    """Embedding cache in a local SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Vector]]:
+        found: Dict[str, Vector] = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                found.update((key, _unpack(vector)) for key, vector in rows)
+        return [found.get(key) for key in keys]
+
+    def mset(self, items: Sequence[Tuple[str, Vector]]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, _pack(vector)) for key, vector in items],
+            )
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches vectors by model name and text hash.
+
+    Backends are looked up in order (e.g. LRU, then Redis) and hits from a slower backend are
+    copied into the faster ones. Only misses are sent to the provider, deduplicated, in one request.
+    `aembed_documents` / `aembed_query` do the same with the async backend and provider methods.
+    """
+
+    def __init__(self, embeddings: Embeddings,
+                 backends: Union[EmbeddingCacheBackend, Sequence[EmbeddingCacheBackend]],
+                 namespace: Optional[str] = None):
+        self.embeddings = embeddings
+        self.backends = [backends] if isinstance(backends, EmbeddingCacheBackend) else list(backends)
+        self.namespace = namespace or getattr(embeddings, "model", type(embeddings).__name__)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode()).hexdigest()
+
+    @staticmethod
+    def _take_hits(keys: List[str], missing: List[int], found: List[Optional[Vector]],
+                   vectors: List[Optional[Vector]]) -> Tuple[List[int], List[Tuple[str, Vector]]]:
+        """Fill `vectors` with the hits of one backend. Returns the still missing indexes and
+        the hits to promote into the faster backends."""
+        still_missing, promoted = [], []
+        for i, vector in zip(missing, found):
+            if vector is None:
+                still_missing.append(i)
+            else:
+                vectors[i] = vector
+                promoted.append((keys[i], vector))
+        return still_missing, promoted
+
+    def _count(self, total: int, missed: int):
+        with self._lock:
+            self.hits += total - missed
+            self.misses += missed
+
+    @staticmethod
+    def _unique(keys: List[str], texts: List[str], missing: List[int]) -> Dict[str, str]:
+        unique: Dict[str, str] = {}
+        for i in missing:
+            unique.setdefault(keys[i], texts[i])
+        return unique
+
+    def embed_documents(self, texts: List[str]) -> List[Vector]:
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[Vector]] = [None] * len(texts)
+
+        missing = list(range(len(texts)))
+        for level, backend in enumerate(self.backends):
+            if not missing:
+                break
+            missing, promoted = self._take_hits(keys, missing, backend.mget([keys[i] for i in missing]), vectors)
+            # Promote hits into the faster backends
+            for faster in self.backends[:level]:
+                if promoted:
+                    faster.mset(promoted)
+        self._count(len(texts), len(missing))
+
+        if missing:
+            unique = self._unique(keys, texts, missing)
+            computed = dict(zip(unique, self.embeddings.embed_documents(list(unique.values()))))
+            for backend in self.backends:
+                backend.mset(list(computed.items()))
+            for i in missing:
+                vectors[i] = computed[keys[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> Vector:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[Vector]:
+        """Async `embed_documents`: backends are read with `amget` and misses are sent to the
+        provider's `aembed_documents`, so the event loop is never blocked."""
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[Vector]] = [None] * len(texts)
+
+        missing = list(range(len(texts)))
+        for level, backend in enumerate(self.backends):
+            if not missing:
+                break
+            found = await backend.amget([keys[i] for i in missing])
+            missing, promoted = self._take_hits(keys, missing, found, vectors)
+            for faster in self.backends[:level]:
+                if promoted:
+                    await faster.amset(promoted)
+        self._count(len(texts), len(missing))
+
+        if missing:
+            unique = self._unique(keys, texts, missing)
+            computed = dict(zip(unique, await self.embeddings.aembed_documents(list(unique.values()))))
+            for backend in self.backends:
+                await backend.amset(list(computed.items()))
+            for i in missing:
+                vectors[i] = computed[keys[i]]
+        return vectors
+
+    async def aembed_query(self, text: str) -> Vector:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,304 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import TextSplitter
+
+from global_utils import tokens_from_string
+
+
+@dataclass
+class StageStats:
+    """Counters of a single ingestion pipeline stage."""
+    name: str
+    docs: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.docs / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.docs} docs, {self.tokens} tokens in {self.seconds:.2f}s "
+                f"({self.docs_per_second:.1f} docs/s, {self.tokens_per_second:.1f} tokens/s)")
+
+
+@dataclass
+class IngestionReport:
+    """Result of a streaming ingestion run: per-stage counters and wall time."""
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    parents: int = 0
+    children: int = 0
+    seconds: float = 0.0
+
+    def stage(self, name: str) -> StageStats:
+        if name not in self.stages:
+            self.stages[name] = StageStats(name=name)
+        return self.stages[name]
+
+    def __str__(self):
+        lines = [f"Ingested {self.parents} parents / {self.children} children in {self.seconds:.2f}s"]
+        lines.extend(f"  {stats}" for stats in self.stages.values())
+        return "\n".join(lines)
+
+
+@dataclass
+class SyncSummary:
+    """Diff of an incremental re-index, by parent id."""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    report: Optional[IngestionReport] = None
+
+    def __str__(self):
+        return (f"added: {len(self.added)}, updated: {len(self.updated)}, "
+                f"unchanged: {len(self.unchanged)}, removed: {len(self.removed)}")
+
+
+def content_hash(document: Document, hash_key: str = "content_hash") -> str:
+    """Stable hash of a parent's text and metadata, ignoring the stored hash itself."""
+    metadata = {key: value for key, value in document.metadata.items() if key != hash_key}
+    digest = hashlib.sha256(document.page_content.encode())
+    digest.update(json.dumps(metadata, sort_keys=True, default=str, ensure_ascii=False).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class _EmbeddingBatch:
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    # Parents whose last child chunk belongs to this batch
+    parents: List[Tuple[str, Document]] = field(default_factory=list)
+
+
+_worker_splitter: Optional[TextSplitter] = None
+_worker_length_function: Optional[Callable[[str], int]] = None
+
+
+def _init_split_worker(splitter: TextSplitter, length_function: Callable[[str], int]):
+    global _worker_splitter, _worker_length_function
+    _worker_splitter = splitter
+    _worker_length_function = length_function
+
+
+def _split_parent(parent_id: str, document: Document) -> Tuple[str, Document, List[Document], List[int], float]:
+    """Runs in a pool process: splits a parent and counts tokens of its children."""
+    started = time.perf_counter()
+    children = _worker_splitter.split_documents([document])
+    tokens = [_worker_length_function(child.page_content) for child in children]
+    return parent_id, document, children, tokens, time.perf_counter() - started
+
+
+class StreamingIngestor:
+    """Streaming ingestion of parent documents.
+
+    Parents are split into child chunks in a process pool, children are grouped into
+    embedding batches by a token budget, embedding requests run with bounded concurrency
+    and vectors and parents are written in batches as soon as they are ready.
+    """
+
+    def __init__(
+            self,
+            child_splitter: TextSplitter,
+            vectorstore: Any,
+            docstore: Any,
+            id_key: str = "doc_id",
+            *,
+            split_workers: Optional[int] = None,
+            split_window: int = 64,
+            embed_batch_tokens: int = 8000,
+            embed_batch_size: int = 512,
+            embed_concurrency: int = 4,
+            embed_retries: int = 2,
+            docstore_batch_size: int = 256,
+            length_function: Callable[[str], int] = tokens_from_string,
+    ):
+        """
+        Args:
+            child_splitter: Splitter used to create child documents.
+            vectorstore: Vector store exposing `embeddings` and `add_embeddings`.
+            docstore: Parent store exposing `mset`.
+            id_key: Child metadata key that holds the parent id.
+            split_workers: Size of the splitting process pool. 0 splits in the current process.
+            split_window: Parents in flight per splitting worker.
+            embed_batch_tokens: Token budget of a single embedding request.
+            embed_batch_size: Max number of chunks in a single embedding request.
+            embed_concurrency: Number of embedding requests running at once.
+            embed_retries: How many times a failed embedding request is retried.
+            docstore_batch_size: Number of parents per docstore write.
+            length_function: Function that counts tokens of a chunk.
+        """
+        self.child_splitter = child_splitter
+        self.vectorstore = vectorstore
+        self.docstore = docstore
+        self.id_key = id_key
+        self.split_workers = (os.cpu_count() or 1) if split_workers is None else split_workers
+        self.split_window = max(split_window, 1)
+        self.embed_batch_tokens = embed_batch_tokens
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = max(embed_concurrency, 1)
+        self.embed_retries = embed_retries
+        self.docstore_batch_size = docstore_batch_size
+        self.length_function = length_function
+
+    @staticmethod
+    def _pair_ids(documents: Iterable[Document], ids: Optional[Iterable[str]],
+                  add_to_docstore: bool) -> Iterator[Tuple[str, Document]]:
+        if ids is None:
+            if not add_to_docstore:
+                raise ValueError("If ids are not passed in, `add_to_docstore` MUST be True")
+            for document in documents:
+                yield str(uuid.uuid4()), document
+            return
+        sentinel = object()
+        for _id, document in itertools.zip_longest(ids, documents, fillvalue=sentinel):
+            if _id is sentinel or document is sentinel:
+                raise ValueError(
+                    "Got uneven list of documents and ids. "
+                    "If `ids` is provided, should be same length as `documents`."
+                )
+            yield _id, document
+
+    def _split_local(self, pairs: Iterator[Tuple[str, Document]]):
+        _init_split_worker(self.child_splitter, self.length_function)
+        for parent_id, document in pairs:
+            yield _split_parent(parent_id, document)
+
+    def _split_in_pool(self, pairs: Iterator[Tuple[str, Document]]):
+        window = self.split_window * self.split_workers
+        with ProcessPoolExecutor(
+                max_workers=self.split_workers,
+                initializer=_init_split_worker,
+                initargs=(self.child_splitter, self.length_function),
+        ) as pool:
+            pending: Deque[Future] = deque()
+            for parent_id, document in pairs:
+                pending.append(pool.submit(_split_parent, parent_id, document))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _embed(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                vectors = self.vectorstore.embeddings.embed_documents(texts)
+                return vectors, time.perf_counter() - started
+            except Exception as e:
+                attempt += 1
+                if attempt > self.embed_retries:
+                    raise
+                logging.info(f"Embedding batch of {len(texts)} chunks failed ({e}). "
+                             f"Retrying... Attempt {attempt}/{self.embed_retries}")
+                time.sleep(2 ** attempt)
+
+    def run(
+            self,
+            documents: Iterable[Document],
+            ids: Optional[Iterable[str]] = None,
+            add_to_docstore: bool = True,
+    ) -> IngestionReport:
+        """Ingest a stream of parent documents.
+
+        Args:
+            documents: Parent documents, may be a generator.
+            ids: Optional parent ids in the same order. Random UUIDs are used if omitted.
+            add_to_docstore: Whether to write parents to the docstore.
+        Returns:
+            IngestionReport with per-stage throughput.
+        """
+        report = IngestionReport()
+        split_stats, embed_stats = report.stage("split"), report.stage("embed")
+        vector_stats, docstore_stats = report.stage("vector_write"), report.stage("docstore_write")
+        started = time.perf_counter()
+
+        pairs = self._pair_ids(documents, ids, add_to_docstore)
+        split_results = self._split_in_pool(pairs) if self.split_workers > 0 else self._split_local(pairs)
+
+        in_flight: Deque[Tuple[_EmbeddingBatch, Future]] = deque()
+        parents_buffer: List[Tuple[str, Document]] = []
+
+        def flush_parents(force: bool = False):
+            if not add_to_docstore or not parents_buffer:
+                return
+            if not force and len(parents_buffer) < self.docstore_batch_size:
+                return
+            write_started = time.perf_counter()
+            self.docstore.mset(parents_buffer)
+            docstore_stats.seconds += time.perf_counter() - write_started
+            docstore_stats.docs += len(parents_buffer)
+            parents_buffer.clear()
+
+        def complete_oldest():
+            batch, future = in_flight.popleft()
+            vectors, elapsed = future.result()
+            embed_stats.seconds += elapsed
+            embed_stats.docs += len(batch.texts)
+            embed_stats.tokens += batch.tokens
+
+            write_started = time.perf_counter()
+            self.vectorstore.add_embeddings(texts=batch.texts, embeddings=vectors, metadatas=batch.metadatas)
+            vector_stats.seconds += time.perf_counter() - write_started
+            vector_stats.docs += len(batch.texts)
+            vector_stats.tokens += batch.tokens
+
+            parents_buffer.extend(batch.parents)
+            flush_parents()
+
+        with ThreadPoolExecutor(max_workers=self.embed_concurrency) as embed_pool:
+
+            def submit(batch: _EmbeddingBatch):
+                if not batch.texts:
+                    # Parents without children still have to reach the docstore
+                    parents_buffer.extend(batch.parents)
+                    flush_parents()
+                    return
+                while len(in_flight) >= self.embed_concurrency:
+                    complete_oldest()
+                in_flight.append((batch, embed_pool.submit(self._embed, batch.texts)))
+
+            batch = _EmbeddingBatch()
+            for parent_id, parent, children, tokens, elapsed in split_results:
+                split_stats.seconds += elapsed
+                split_stats.docs += 1
+                split_stats.tokens += sum(tokens)
+                report.parents += 1
+                report.children += len(children)
+
+                for child, child_tokens in zip(children, tokens):
+                    if batch.texts and (batch.tokens + child_tokens > self.embed_batch_tokens
+                                        or len(batch.texts) >= self.embed_batch_size):
+                        submit(batch)
+                        batch = _EmbeddingBatch()
+                    child.metadata[self.id_key] = parent_id
+                    batch.texts.append(child.page_content)
+                    batch.metadatas.append(child.metadata)
+                    batch.tokens += child_tokens
+                batch.parents.append((parent_id, parent))
+
+            submit(batch)
+            while in_flight:
+                complete_oldest()
+            flush_parents(force=True)
+
+        report.seconds = time.perf_counter() - started
+        logging.info(f"Streaming ingestion finished:\n{report}")
+        return report
@@ -1,23 +1,85 @@
 import asyncio
 import copy
+import fnmatch
+import glob
 import logging
 import os
 import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Union
-from pydantic import BaseModel
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from striprtf.striprtf import rtf_to_text
 
 
-class MatchPattern(BaseModel):
-    key: str
-    start: int
-    finish: int
+class InterpretationParseError(Exception):
+    def __init__(self, path: str, error: str):
+        self.path = path
+        self.error = error
+        self.message = f"Failed to parse interpretation file '{path}': {error}"
+        super().__init__(self.message)
+
+
+class BulkParseReport:
+    """Счётчики пакетного парсинга. Файлы, которые не удалось разобрать, собираются в 'failed'."""
+
+    def __init__(self):
+        self.parsed = 0
+        self.failed: List[Tuple[str, str]] = []
+        self.started = time.perf_counter()
+
+    @property
+    def processed(self) -> int:
+        return self.parsed + len(self.failed)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def docs_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed else 0.0
+
+
+# Парсеры процесса пула по `worker_spec`, создаются один раз на процесс
+_worker_parsers: Dict[Tuple, "CustomInterpretationParser"] = {}
+
+
+def _parse_files_chunk(spec: Tuple[Callable, tuple], paths: List[str], keys: Optional[Union[List[str], str]]
+                       ) -> Tuple[List[Tuple[str, Optional[Dict], Optional[str]]], Optional[Dict]]:
+    """Выполняется в процессе пула: разбирает пачку файлов парсером, собранным по `spec`.
+    Возвращает результаты и `worker_stats` парсера за эту пачку."""
+    parser = _worker_parsers.get(spec)
+    if parser is None:
+        factory, args = spec
+        parser = _worker_parsers[spec] = factory(*args)
+    return _parse_files(parser, paths, keys), parser.worker_stats()
+
+
+def _parse_files(parser: "CustomInterpretationParser", paths: List[str],
+                 keys: Optional[Union[List[str], str]]) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Разбирает пачку файлов, ошибки возвращаются вместо исключений."""
+    results = []
+    for path in paths:
+        try:
+            if keys is None:
+                metadata = parser.create_from_file_for_postgres(path)
+            else:
+                metadata = parser.create_from_file_with_keys(path, keys)
+        except Exception as e:
+            results.append((path, None, f"{type(e).__name__}: {e}"))
+        else:
+            results.append((path, metadata, None))
+    return results
 
 
 class CustomInterpretationParser:
     """Даты возвращает объектами а не строками"""
 
+    # Менять при любом изменении результата парсинга: входит в ключ кэша разобранных файлов
+    version = "3"
+
     def __init__(self):
         self._separator_keys = {
             "ID informacji:": "id",
@@ -38,6 +100,21 @@ class CustomInterpretationParser:
             "Treść:": "content",
             "Treść interpelacji/zapytania:": "content"
         }
+        # Все заголовки одним регулярным выражением: номер группы совпадения -> ключ поля
+        self._header_pattern = re.compile("|".join(f"({separator})" for separator in self._separator_keys))
+        self._header_keys = list(self._separator_keys.values())
+
+    def worker_spec(self) -> Tuple[Callable, tuple]:
+        """Фабрика и аргументы для такого же парсера в процессе пула `parse_bulk`: в воркеры
+        передаются они, а не сам парсер со всем его состоянием."""
+        return type(self), ()
+
+    def worker_stats(self) -> Optional[Dict]:
+        """Счётчики воркера за последнюю пачку, которые нужно вернуть в родительский процесс."""
+        return None
+
+    def merge_worker_stats(self, stats: Optional[Dict]):
+        """Учитывает `worker_stats`, полученные из процесса пула."""
 
     def get_separtor_keys(self):
         return list(set(self._separator_keys.values()))
@@ -62,52 +139,120 @@ class CustomInterpretationParser:
         text = self.read_file(file_path)
         return self.withdraw_postgres_metadata(text)
 
+    @staticmethod
+    def find_files(source: str, pattern: str = "*.rtf") -> Iterator[str]:
+        """Файлы для пакетного парсинга: рекурсивный обход директории по шаблону или glob-выражение."""
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                for name in sorted(files):
+                    if fnmatch.fnmatch(name, pattern):
+                        yield os.path.join(root, name)
+        else:
+            yield from glob.iglob(source, recursive=True)
+
+    def parse_bulk(
+            self,
+            source: Union[str, Iterable[str]],
+            keys: Optional[Union[List[str], str]] = None,
+            workers: Optional[int] = None,
+            chunksize: int = 64,
+            on_error: str = "collect",
+            progress_callback: Optional[Callable[[BulkParseReport], None]] = None,
+            report: Optional[BulkParseReport] = None,
+    ) -> Iterator[Dict]:
+        """Пакетный парсинг файлов интерпретаций в пуле процессов.
+
+        Результаты отдаются генератором в порядке готовности пачек, а не в порядке файлов.
+
+        Args:
+            source: Директория, glob-выражение или готовый список путей.
+            keys: Ключи для `create_from_file_with_keys`. Если не заданы - используется
+                `create_from_file_for_postgres`.
+            workers: Размер пула процессов. 0 - парсить в текущем процессе.
+            chunksize: Сколько файлов отдаётся процессу за одну задачу.
+            on_error: "collect" - собирать битые файлы в report.failed и продолжать,
+                "raise" - прервать парсинг с InterpretationParseError.
+            progress_callback: Вызывается с BulkParseReport после каждой пачки.
+            report: BulkParseReport, в который пишутся счётчики; удобно передать свой, чтобы
+                посмотреть ошибки после прохода генератора.
+        """
+        if on_error not in ("collect", "raise"):
+            raise ValueError(f"Unknown failure policy: {on_error}")
+        report = report or BulkParseReport()
+        paths = self.find_files(source) if isinstance(source, str) else iter(source)
+        workers = (os.cpu_count() or 1) if workers is None else workers
+
+        def chunks() -> Iterator[List[str]]:
+            chunk = []
+            for path in paths:
+                chunk.append(path)
+                if len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        def handle(results: List[Tuple[str, Optional[Dict], Optional[str]]]) -> Iterator[Dict]:
+            for path, metadata, error in results:
+                if error is None:
+                    report.parsed += 1
+                    yield metadata
+                elif on_error == "raise":
+                    raise InterpretationParseError(path, error)
+                else:
+                    logging.warning(f"Skipping interpretation file {path}: {error}")
+                    report.failed.append((path, error))
+            if progress_callback is not None:
+                progress_callback(report)
+
+        if workers == 0:
+            for chunk in chunks():
+                yield from handle(_parse_files(self, chunk, keys))
+            return
+
+        def collect(future) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+            results, stats = future.result()
+            self.merge_worker_stats(stats)
+            return results
+
+        spec = self.worker_spec()
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            pending = set()
+            for chunk in chunks():
+                pending.add(pool.submit(_parse_files_chunk, spec, chunk, keys))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from handle(collect(future))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from handle(collect(future))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
     def create_metadata_v2(self, text):
+        """Находит заголовки полей за один проход по тексту. Учитывается первое вхождение каждого заголовка,
+        значение поля - текст от конца заголовка до начала следующего."""
+        first_matches = {}
+        for match in self._header_pattern.finditer(text):
+            if match.lastindex not in first_matches:
+                first_matches[match.lastindex] = (match.start(), match.end(), self._header_keys[match.lastindex - 1])
+                if len(first_matches) == len(self._header_keys):
+                    break
 
-        matches_list = []
-        for separator_pol, separator_eng in self._separator_keys.items():
-            match = re.search(separator_pol, text)
-            try:
-                span = match.span()
-            except AttributeError:
-                pass
-            else:
-                matches_list.append(
-                    MatchPattern(
-                        key=separator_eng,
-                        start=span[0],
-                        finish=span[1]
-                    )
-                )
-
-        starts_hash_pointer, finishes_hash_pointer = {}, {}
-        starts, finishes = [], []
-
-        for match_obj in matches_list:
-            starts.append(match_obj.start)
-            starts_hash_pointer[match_obj.start] = match_obj
-            finishes.append(match_obj.finish)
-            finishes_hash_pointer[match_obj.finish] = match_obj
-
-        starts, finishes = sorted(starts), sorted(finishes)
+        headers = sorted(first_matches.values())
         metadata = {}
 
-        for index, start_1 in enumerate(starts):
+        for index, (start, finish, key) in enumerate(headers):
             try:
-                start_2 = starts[index + 1]
+                next_start = headers[index + 1][0]
             except IndexError:
-                start_2 = len(text) + 1
-
-            finish_1 = None
-            for finish in finishes:
-                if start_1 < finish < start_2:
-                    finish_1 = finish
-                    break
-            start_1_hash_point: MatchPattern = starts_hash_pointer[start_1]
-            finish_1_hash_point: MatchPattern = finishes_hash_pointer[finish_1]
-            if start_1_hash_point is finish_1_hash_point:
-                part_text = text[finish_1:start_2]
-                metadata[start_1_hash_point.key] = part_text
+                next_start = len(text) + 1
+            # Заголовок, за которым сразу идёт следующий, значения не имеет
+            if finish < next_start:
+                metadata[key] = text[finish:next_start]
 
         return self._split_metadata(metadata)
 
@@ -145,7 +290,7 @@ class CustomInterpretationParser:
             new_value = re.sub(r"\n+", "", value).split('    • ')
             if isinstance(new_value, List):
                 if key == 'author':
-                    value = "\n".join(value)
+                    value = "\n".join(item for item in new_value if item != '')
                 else:
                     value = [item for item in new_value if item != '']
             if len(value) == 1 and key != 'directives':
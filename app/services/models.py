@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Any, Union, Type
+from typing import Any, Optional, Sequence, Union, Type
 
 from langchain.chat_models import ChatOpenAI
 from langchain.embeddings import OpenAIEmbeddings
@@ -9,6 +9,7 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.chains.openai_functions import create_structured_output_chain
 
 from app.core.config import settings
+from app.services.embeddings import CachedEmbeddings, EmbeddingCacheBackend
 
 
 class ModelName(str, Enum):
@@ -28,9 +29,13 @@ class ModelSelector:
     def __init__(self, api_key: str):
         self._api_key = api_key
 
-    def __call__(self, model: ModelName, temperature: Union[int, float] = 0, **kwargs):
+    def __call__(self, model: ModelName, temperature: Union[int, float] = 0,
+                 cache: Optional[Union[EmbeddingCacheBackend, Sequence[EmbeddingCacheBackend]]] = None, **kwargs):
         if model == ModelName.embed:
-            return OpenAIEmbeddings(openai_api_key=self._api_key, **kwargs)
+            embeddings = OpenAIEmbeddings(openai_api_key=self._api_key, **kwargs)
+            if cache:
+                return CachedEmbeddings(embeddings, cache)
+            return embeddings
         elif model == ModelName.g3i:
             return OpenAI(openai_api_key=self._api_key, temperature=temperature, **kwargs)
         else:
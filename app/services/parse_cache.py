@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import msgpack
+
+from app.services.interpretation_parser import CustomInterpretationParser
+
+
+_DATETIME_EXT = 1
+
+
+def _encode_extra(obj):
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_DATETIME_EXT, obj.isoformat().encode())
+    raise TypeError(f"Cannot serialize {type(obj)} into the parse cache")
+
+
+def _decode_extra(code: int, data: bytes):
+    if code == _DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+class ParseCache:
+    """Дисковый кэш разобранных файлов интерпретаций.
+
+    Ключ - хэш содержимого файла, версии парсера и набора запрошенных ключей, значение - метаданные
+    в msgpack (даты хранятся отдельным типом и возвращаются объектами datetime). Размер кэша
+    ограничен 'max_bytes', при переполнении удаляются давно не использованные записи.
+    Повреждённые файлы кэша считаются промахом и перезаписываются.
+
+    В процессах пула `parse_bulk` создаётся свой кэш над тем же каталогом без индекса и без
+    ограничения размера ('max_bytes=None'): счётчики и затронутые записи воркер возвращает
+    через `pop_delta`, а родительский кэш учитывает их в `merge` и сам удаляет лишнее.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = 2 * 1024 ** 3, load_index: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._size = 0
+        # Записи, прочитанные или записанные после последнего `pop_delta`
+        self._touched: Dict[str, Tuple[int, float]] = {}
+        os.makedirs(directory, exist_ok=True)
+        if load_index:
+            self._load_index()
+
+    def _load_index(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".msgpack"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                self._entries[name[:-len(".msgpack")]] = (stat.st_size, stat.st_mtime)
+                self._size += stat.st_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.msgpack")
+
+    @staticmethod
+    def make_key(content: bytes, parser_version: str, variant: str = "") -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{parser_version}\0{variant}\0".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _account(self, key: str, size: int, used: float):
+        previous = self._entries.get(key)
+        if previous is not None:
+            self._size -= previous[0]
+        self._entries[key] = (size, used)
+        self._size += size
+
+    def _touch(self, key: str, size: int, used: float):
+        self._account(key, size, used)
+        self._touched[key] = (size, used)
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            metadata = msgpack.unpackb(data, ext_hook=_decode_extra, raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            # Недописанный или испорченный файл: разбираем заново, `set` его перезапишет
+            logging.warning(f"Corrupt parse cache entry {path}: {type(e).__name__}: {e}")
+            self.misses += 1
+            return None
+        if not isinstance(metadata, dict):
+            logging.warning(f"Corrupt parse cache entry {path}: {type(metadata).__name__} instead of metadata")
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        os.utime(path, (now, now))
+        self._touch(key, len(data), now)
+        return metadata
+
+    def set(self, key: str, metadata: Dict):
+        data = msgpack.packb(metadata, default=_encode_extra, use_bin_type=True)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл, чтобы параллельные воркеры не прочитали недописанную запись
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as file:
+            file.write(data)
+        os.replace(file.name, path)
+
+        self._touch(key, len(data), time.time())
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self._evict()
+
+    def pop_delta(self) -> Dict:
+        """Счётчики и затронутые записи с прошлого вызова, обнуляет их. Передаётся из воркера в `merge`."""
+        delta = {"hits": self.hits, "misses": self.misses, "entries": self._touched}
+        self.hits = self.misses = 0
+        self._touched = {}
+        return delta
+
+    def merge(self, delta: Dict):
+        """Учитывает работу кэша другого процесса над тем же каталогом."""
+        self.hits += delta["hits"]
+        self.misses += delta["misses"]
+        for key, (size, used) in delta["entries"].items():
+            self._account(key, size, used)
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Удаляет самые старые по времени использования записи, пока кэш не займёт 90% лимита."""
+        target = self.max_bytes * 0.9
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._size <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+            self._size -= size
+        logging.info(f"Parse cache evicted down to {self._size} bytes")
+
+    def clear(self):
+        for key in list(self._entries):
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        self._entries.clear()
+        self._touched.clear()
+        self._size = 0
+
+
+class CachedInterpretationParser(CustomInterpretationParser):
+    """CustomInterpretationParser с кэшем результатов по содержимому файла.
+
+    Файл всё равно читается для подсчёта хэша, но rtf_to_text и разбор полей выполняются
+    только для новых или изменённых файлов. Работает и в `parse_bulk`: в процессы пула передаётся
+    только каталог кэша, счётчики воркеров суммируются в `cache` этого парсера.
+    """
+
+    def __init__(self, cache: ParseCache):
+        super().__init__()
+        self.cache = cache
+
+    def worker_spec(self) -> Tuple[Callable, tuple]:
+        return _worker_parser, (self.cache.directory,)
+
+    def worker_stats(self) -> Optional[Dict]:
+        return self.cache.pop_delta()
+
+    def merge_worker_stats(self, stats: Optional[Dict]):
+        if stats is not None:
+            self.cache.merge(stats)
+
+    @staticmethod
+    def _read_bytes(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    def create_from_file_with_keys(self, file_path: str, keys: Union[List[str], str]):
+        variant = "keys:" + ",".join(keys if isinstance(keys, list) else [keys])
+        key = self.cache.make_key(self._read_bytes(file_path), self.version, variant)
+        metadata = self.cache.get(key)
+        if metadata is None:
+            metadata = super().create_from_file_with_keys(file_path, keys)
+            self.cache.set(key, metadata)
+        return metadata
+
+    def create_from_file_for_postgres(self, file_path: str):
+        key = self.cache.make_key(self._read_bytes(file_path), self.version, "postgres")
+        metadata = self.cache.get(key)
+        if metadata is None:
+            metadata = super().create_from_file_for_postgres(file_path)
+            self.cache.set(key, metadata)
+        return metadata
+
+
+def _worker_parser(directory: str) -> CachedInterpretationParser:
+    """Парсер процесса пула над каталогом кэша родительского процесса."""
+    return CachedInterpretationParser(ParseCache(directory, max_bytes=None, load_index=False))
@@ -0,0 +1,289 @@
+"""Cache of retriever results in front of the embedding, vector search and docstore reads.
+
+Two in-process tiers:
+* exact - keyed on the normalized query and the search scope (collection, retriever options,
+  k, score threshold and per-call search params);
+* semantic (optional) - a query whose embedding is within `semantic_threshold` cosine similarity
+  of a cached query of the same scope gets its results. It still costs an embedding (usually
+  a CachedEmbeddings hit), but no vector search and no docstore read.
+
+Entries carry the version of their collection, a Redis counter bumped on every change of the
+collection (`add_documents`, CollectionsListDaL). Entries of an older version are misses, so results
+cached by every worker go stale as soon as any process writes to the collection. Versions read from
+Redis are kept locally for `version_ttl` seconds: other processes see a write that much later, the
+writing process at once.
+"""
+import hashlib
+import logging
+import math
+import operator
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import redis
+import redis.asyncio
+from langchain.schema import Document
+from langchain_core.runnables.config import run_in_executor
+
+from app.core.config import settings
+
+
+class CollectionVersions:
+    """Per-collection version counters in Redis, shared by all processes.
+
+    Reads are served from a local copy for `version_ttl` seconds (0 reads Redis every time).
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "collection_version", version_ttl: float = 1.0):
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.version_ttl = version_ttl
+        self._client: Optional[redis.Redis] = None
+        self._async_client: Optional[redis.asyncio.Redis] = None
+        # collection_name -> (version, monotonic time it expires)
+        self._local: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> redis.Redis:
+        with self._lock:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self.redis_url)
+            return self._client
+
+    @property
+    def async_client(self) -> redis.asyncio.Redis:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = redis.asyncio.Redis.from_url(self.redis_url)
+            return self._async_client
+
+    def _key(self, collection_name: str) -> str:
+        return f"{self.prefix}:{collection_name}"
+
+    def _cached(self, collection_name: str) -> Optional[int]:
+        local = self._local.get(collection_name)
+        if local is not None and local[1] > time.monotonic():
+            return local[0]
+        return None
+
+    def _remember(self, collection_name: str, version: int) -> int:
+        if self.version_ttl > 0:
+            self._local[collection_name] = (version, time.monotonic() + self.version_ttl)
+        return version
+
+    def get(self, collection_name: str) -> int:
+        version = self._cached(collection_name)
+        if version is None:
+            version = self._remember(collection_name, int(self.client.get(self._key(collection_name)) or 0))
+        return version
+
+    async def aget(self, collection_name: str) -> int:
+        version = self._cached(collection_name)
+        if version is None:
+            version = self._remember(
+                collection_name, int(await self.async_client.get(self._key(collection_name)) or 0)
+            )
+        return version
+
+    def bump(self, collection_name: str) -> int:
+        return self._remember(collection_name, self.client.incr(self._key(collection_name)))
+
+    async def abump(self, collection_name: str) -> int:
+        return self._remember(collection_name, await self.async_client.incr(self._key(collection_name)))
+
+
+collection_versions = CollectionVersions(settings.REDIS_URL, version_ttl=settings.RESULT_CACHE_VERSION_TTL)
+
+
+def bump_collection_version(collection_name: str):
+    """Invalidate cached results of a collection in all processes.
+
+    A failed bump is only logged: the change itself is already written, stale entries expire with their TTL.
+    """
+    try:
+        collection_versions.bump(collection_name)
+    except redis.RedisError as e:
+        logging.warning(f"Could not bump the version of collection '{collection_name}': {e}")
+
+
+async def abump_collection_version(collection_name: str):
+    try:
+        await collection_versions.abump(collection_name)
+    except redis.RedisError as e:
+        logging.warning(f"Could not bump the version of collection '{collection_name}': {e}")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def _unit(vector: Sequence[float]) -> array:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+def _copy(docs: Sequence[Document]) -> List[Document]:
+    # Callers add scores etc. to metadata, cached documents must not change with them
+    return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in docs]
+
+
+@dataclass(frozen=True)
+class CacheSlot:
+    """Cache key of one query, its scope and the collection version read before the search."""
+    key: str
+    scope: str
+    version: int
+
+
+@dataclass
+class _Entry:
+    scope: str
+    version: int
+    expires: float
+    docs: List[Document]
+    embedding: Optional[array] = None
+
+
+class ResultCache:
+    """Bounded LRU cache of retriever results with a TTL, see the module docstring.
+
+    `semantic_threshold` enables the semantic tier (cosine similarity, e.g. 0.97); only the
+    `semantic_candidates` most recent queries of a scope are compared against.
+    """
+
+    def __init__(self, versions: Optional[CollectionVersions] = None, maxsize: int = 10_000, ttl: float = 300.0,
+                 semantic_threshold: Optional[float] = None, semantic_candidates: int = 128):
+        self.versions = versions or collection_versions
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.semantic_candidates = semantic_candidates
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Keys of entries with an embedding per scope, most recent last
+        self._scopes: Dict[str, "OrderedDict[str, None]"] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold is not None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / total if total else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        return {"exact_hits": self.exact_hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "hit_rate": self.hit_rate, "entries": len(self._entries)}
+
+    @staticmethod
+    def _slot(scope: str, query: str, version: int) -> CacheSlot:
+        scope = hashlib.sha256(scope.encode()).hexdigest()
+        key = hashlib.sha256(f"{scope}\0{normalize_query(query)}".encode()).hexdigest()
+        return CacheSlot(key=key, scope=scope, version=version)
+
+    def slot(self, collection_name: str, scope: str, query: str) -> Optional[CacheSlot]:
+        """None if the collection version cannot be read, the search then runs uncached."""
+        try:
+            version = self.versions.get(collection_name)
+        except redis.RedisError as e:
+            logging.warning(f"Result cache bypassed, collection version unavailable: {e}")
+            return None
+        return self._slot(scope, query, version)
+
+    def slots(self, collection_name: str, scope: str, queries: List[str]) -> List[Optional[CacheSlot]]:
+        """Slots of several queries of one scope, the collection version is read once."""
+        try:
+            version = self.versions.get(collection_name)
+        except redis.RedisError as e:
+            logging.warning(f"Result cache bypassed, collection version unavailable: {e}")
+            return [None] * len(queries)
+        return [self._slot(scope, query, version) for query in queries]
+
+    async def aslot(self, collection_name: str, scope: str, query: str) -> Optional[CacheSlot]:
+        try:
+            version = await self.versions.aget(collection_name)
+        except redis.RedisError as e:
+            logging.warning(f"Result cache bypassed, collection version unavailable: {e}")
+            return None
+        return self._slot(scope, query, version)
+
+    def _live(self, entry: Optional[_Entry], version: int) -> bool:
+        return entry is not None and entry.version == version and entry.expires > time.monotonic()
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.scope in self._scopes:
+            keys = self._scopes[entry.scope]
+            keys.pop(key, None)
+            if not keys:
+                del self._scopes[entry.scope]
+
+    def get(self, slot: CacheSlot) -> Optional[List[Document]]:
+        """Exact tier lookup. With the semantic tier enabled a miss is counted by `get_similar`."""
+        with self._lock:
+            entry = self._entries.get(slot.key)
+            if self._live(entry, slot.version):
+                self._entries.move_to_end(slot.key)
+                self.exact_hits += 1
+                return _copy(entry.docs)
+            if entry is not None:
+                self._forget(slot.key)
+            if not self.semantic:
+                self.misses += 1
+        return None
+
+    def get_similar(self, slot: CacheSlot, embedding: Sequence[float]) -> Optional[List[Document]]:
+        """Semantic tier lookup: results of the most similar cached query of the same scope."""
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in
+                ((key, self._entries.get(key)) for key in reversed(self._scopes.get(slot.scope, ())))
+                if self._live(entry, slot.version)
+            ]
+        # Similarities are computed outside the lock, both vectors are unit length
+        query = _unit(embedding)
+        best: Optional[Tuple[float, _Entry]] = None
+        for key, entry in candidates:
+            similarity = sum(map(operator.mul, query, entry.embedding))
+            if similarity >= self.semantic_threshold and (best is None or similarity > best[0]):
+                best = (similarity, entry)
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+            self.semantic_hits += 1
+        return _copy(best[1].docs)
+
+    async def aget_similar(self, slot: CacheSlot, embedding: Sequence[float]) -> Optional[List[Document]]:
+        """`get_similar` in the default executor, the similarity scan is pure Python and CPU bound."""
+        return await run_in_executor(None, self.get_similar, slot, embedding)
+
+    def put(self, slot: CacheSlot, docs: Sequence[Document], embedding: Optional[Sequence[float]] = None):
+        entry = _Entry(
+            scope=slot.scope, version=slot.version, expires=time.monotonic() + self.ttl, docs=_copy(docs),
+            embedding=_unit(embedding) if self.semantic and embedding is not None else None,
+        )
+        with self._lock:
+            self._forget(slot.key)
+            self._entries[slot.key] = entry
+            if entry.embedding is not None:
+                keys = self._scopes.setdefault(slot.scope, OrderedDict())
+                keys[slot.key] = None
+                while len(keys) > self.semantic_candidates:
+                    keys.popitem(last=False)
+            while len(self._entries) > self.maxsize:
+                self._forget(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
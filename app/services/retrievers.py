@@ -1,55 +1,634 @@
+import asyncio
+import contextvars
 import uuid
-from typing import List, Optional, Dict
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, AsyncIterator, Iterable, List, Optional, Dict, Tuple
 import logging
 import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import redis
+import redis.asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from langchain.retrievers import MultiVectorRetriever, ParentDocumentRetriever
 
 from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.retrievers.parent_document_retriever import ParentDocumentRetriever
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.runnables.configurable import ConfigurableField
 from langchain.storage import RedisStore, create_kv_docstore
-from langchain.schema.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.storage.encoder_backed import EncoderBackedStore
+from langchain.schema.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
 from langchain.schema import Document
 from langchain.text_splitter import TextSplitter
 
 from langchain.vectorstores import PGVector
 
 from global_utils import tokens_from_string
+from app.services.ingestion import IngestionReport, StreamingIngestor, SyncSummary, content_hash
+from app.services.vector_queries import (
+    VectorSearchParams,
+    abest_parents,
+    alexical_children,
+    asignature_parents,
+    asimilar_children,
+    best_parents,
+    collection_uuid,
+    delete_children,
+    lexical_children,
+    list_parent_ids,
+    max_distance,
+    signature_parents,
+    similar_children,
+    similar_children_batch,
+)
+from app.services.embeddings import CachedEmbeddings, EmbeddingCacheBackend, LRUEmbeddingCache, \
+    RedisEmbeddingCache
+from app.services.docstore import CompactDocumentSerializer, DocstoreDictionaries, create_compact_docstore, \
+    train_dictionary
+from app.services.result_cache import CacheSlot, ResultCache, bump_collection_version
 from app.services.splitter import CustomSplitterV2
 from app.services.models import model_selector, ModelName
 from app.core.config import settings
+from app.core.pool_metrics import PoolCheckoutStats, timed_pool_class
+from app.core.timing import stage, timed
+from app.database import SessionLocal
+from app.data_access_layer.collections_list_DAL import CollectionsListDaL
+from app.data_access_layer.exceptions import CollectionNotFoundException
+from app.schemas.collection_list import VectorIndexConfig
+from app.schemas.search import MetadataFilter
 
 
 class CustomMultiVectorRetriever(MultiVectorRetriever):
 
+    async_engine: Optional[Any] = None
+    """AsyncEngine (asyncpg) over the vectorstore database, enables the native async search path."""
+    async_redis: Optional[Any] = None
+    """Async Redis client over the same instance as the docstore."""
+
+    unique_parents: bool = False
+    """Fetch more child hits until there are `k` distinct parents, so `k` means "k documents"."""
+    fetch_k_multiplier: int = 3
+    """With `unique_parents`, the first request fetches `k * fetch_k_multiplier` children."""
+    max_fetch_k: int = 200
+    """With `unique_parents`, never fetch more than this many children for one query."""
+    collapse_parents: bool = False
+    """Collapse child hits into parents inside Postgres and return top-k distinct parents,
+    each with the relevance of its best child in `metadata[score_key]`."""
+    collapse_candidates: Optional[int] = None
+    """With `collapse_parents`, collapse only this many nearest children (index friendly, may
+    return fewer than k parents). None collapses `min(4 * k * fetch_k_multiplier, max_fetch_k)`."""
+    collapse_exact: bool = False
+    """With `collapse_parents`, collapse every child of the collection instead of the nearest
+    candidates. Exact, but computes the distance to every child without the vector index."""
+    stream_concurrency: int = 8
+    """`astream_parents` keeps at most this many docstore reads in flight, each holds a pooled connection."""
+    score_key: str = "score"
+    """Parent metadata key for the relevance of the best matched child."""
+    mean_score_key: str = "mean_score"
+    """Parent metadata key for the mean relevance of the matched children."""
+    enforce_score_threshold: bool = True
+    """Drop children below `search_kwargs["score_threshold"]` inside the SQL search, so parents
+    without a child above it are never read from the docstore."""
+    search_params: Optional[VectorSearchParams] = None
+    """ANN index of the collection (expression dimensions, default ef_search / probes).
+    `ef_search`, `probes` and `metadata_filter` can also be passed per call:
+    `retriever.invoke(query, ef_search=100, metadata_filter={"keywords": ["VAT"]})`."""
+    log_preview_chars: int = 200
+    """How much of every parent's text is written to the INFO log."""
+    result_cache: Optional[ResultCache] = None
+    """Cache of search results (exact and optionally semantic), invalidated by collection version."""
+
     @staticmethod
-    def format_docs_to_log(docs: List[Document]):
+    def format_docs_to_log(docs: List[Document], max_chars: Optional[int] = None):
         text = ""
         for idx, doc in enumerate(docs):
-            text += f"  {idx + 1} ID: {doc.metadata.get('id')} - {doc.page_content}\n"
+            content = doc.page_content
+            if max_chars is not None and len(content) > max_chars:
+                content = content[:max_chars] + "..."
+            text += f"  {idx + 1} ID: {doc.metadata.get('id')} - {content}\n"
         return text
 
+    def _log_parents(self, query: str, docs: List[Document]):
+        # Building the preview is not free for large parents, skip it when INFO is off
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info("Child docs were extracted for query **%s**: \n %s\n",
+                         query, self.format_docs_to_log(docs, self.log_preview_chars))
+
+    def _parent_ids(self, sub_docs: Iterable[Document], limit: Optional[int] = None) -> List[str]:
+        # dict keeps insertion order, so ids stay in the order of the child hits
+        ids = {}
+        for d in sub_docs:
+            ids.setdefault(d.metadata[self.id_key])
+            if limit is not None and len(ids) >= limit:
+                break
+        return list(ids)
+
+    def _next_fetch_k(self, fetch_k: int, fetched: int, found: int, k: int) -> Optional[int]:
+        """Size of the next child request, None when the current parents are final."""
+        if found >= k or fetched < fetch_k or fetch_k >= self.max_fetch_k:
+            return None
+        return min(fetch_k * 2, self.max_fetch_k)
+
+    def _score_threshold(self) -> Optional[float]:
+        return self.search_kwargs.get("score_threshold") if self.enforce_score_threshold else None
+
+    def _params(self, ef_search: Optional[int], probes: Optional[int],
+                metadata_filter: Optional[MetadataFilter | dict] = None,
+                score_threshold: Optional[float] = None) -> Optional[VectorSearchParams]:
+        """Search params of a call. `score_threshold` overrides the one of `search_kwargs`."""
+        params = self.search_params
+        if ef_search is not None or probes is not None or metadata_filter is not None:
+            if isinstance(metadata_filter, dict):
+                metadata_filter = MetadataFilter.model_validate(metadata_filter)
+            params = (params or VectorSearchParams()).override(ef_search, probes, metadata_filter)
+        threshold = self._score_threshold() if score_threshold is None else score_threshold
+        if threshold is not None:
+            # Without a distance bound the threshold is still applied to the returned children
+            bound = max_distance(self.vectorstore, threshold)
+            if bound is not None:
+                params = replace(params or VectorSearchParams(), max_distance=bound)
+        return params
+
+    def _scored_parent_ids(self, hits: Iterable[Tuple[Document, float]], limit: Optional[int] = None,
+                           score_threshold: Optional[float] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """Parent ids in the order of their best child hit with the max and mean relevance of their
+        children above the score threshold."""
+        relevance = self.vectorstore._select_relevance_score_fn()
+        threshold = self._score_threshold() if score_threshold is None else score_threshold
+        scores: Dict[str, List[float]] = {}
+        for d, distance in hits:
+            score = relevance(distance)
+            if threshold is not None and score < threshold:
+                continue
+            _id = d.metadata[self.id_key]
+            if _id not in scores:
+                if limit is not None and len(scores) >= limit:
+                    continue
+                scores[_id] = []
+            scores[_id].append(score)
+        return [(_id, {self.score_key: max(values), self.mean_score_key: sum(values) / len(values)})
+                for _id, values in scores.items()]
+
+    def _search_parent_ids(self, embedding: List[float],
+                           params: Optional[VectorSearchParams]) -> List[Tuple[str, Dict[str, float]]]:
+        k = self.search_kwargs.get("k", 4)
+        if not self.unique_parents:
+            return self._scored_parent_ids(similar_children(self.vectorstore, embedding, k=k, params=params))
+
+        fetch_k = min(k * self.fetch_k_multiplier, self.max_fetch_k)
+        while True:
+            hits = similar_children(self.vectorstore, embedding, k=fetch_k, params=params)
+            ranked = self._scored_parent_ids(hits, limit=k)
+            fetch_k = self._next_fetch_k(fetch_k, len(hits), len(ranked), k)
+            if fetch_k is None:
+                return ranked
+
+    @staticmethod
+    def _ranked_parents(ranked: List[Tuple[str, Dict[str, float]]],
+                        parents: List[Optional[Document]]) -> List[Document]:
+        """Parents found in the docstore in rank order, with their scores added to the metadata."""
+        return [
+            Document(page_content=parent.page_content, metadata={**parent.metadata, **scores}) if scores else parent
+            for (_, scores), parent in zip(ranked, parents) if parent is not None
+        ]
+
+    def _collapse_candidates(self, k: int) -> Optional[int]:
+        """Nearest children collapsed into parents, None for an exact collapse."""
+        if self.collapse_exact:
+            return None
+        if self.collapse_candidates is not None:
+            return self.collapse_candidates
+        return min(4 * k * self.fetch_k_multiplier, self.max_fetch_k)
+
+    def _collapsed_scores(self, collapsed: List[Tuple[str, float, float]],
+                          score_threshold: Optional[float] = None) -> List[Tuple[str, Dict[str, float]]]:
+        relevance = self.vectorstore._select_relevance_score_fn()
+        threshold = self._score_threshold() if score_threshold is None else score_threshold
+        return [(_id, {self.score_key: relevance(best), self.mean_score_key: relevance(mean)})
+                for _id, best, mean in collapsed if threshold is None or relevance(best) >= threshold]
+
+    def _search(self, query: str, params: Optional[VectorSearchParams],
+                embedding: Optional[List[float]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """Ranked parent ids of a query with the scores to add to parent metadata.
+        An already computed query `embedding` is used as is."""
+        if embedding is None:
+            with stage("embed"):
+                embedding = self.vectorstore.embeddings.embed_query(query)
+        with stage("vector_query"):
+            if self.collapse_parents:
+                k = self.search_kwargs.get("k", 4)
+                return self._collapsed_scores(best_parents(
+                    self.vectorstore, embedding, k=k, id_key=self.id_key,
+                    candidates=self._collapse_candidates(k), params=params,
+                ))
+            return self._search_parent_ids(embedding, params)
+
     def _get_relevant_documents(
-            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+            ef_search: Optional[int] = None, probes: Optional[int] = None,
+            metadata_filter: Optional[MetadataFilter | dict] = None,
     ) -> List[Document]:
         """Get documents relevant to a query.
         Args:
             query: String to find relevant documents for
             run_manager: The callbacks handler to use
+            ef_search: HNSW search width for this call, overrides `search_params`
+            probes: IVFFlat lists to scan for this call, overrides `search_params`
+            metadata_filter: MetadataFilter (or its dict) applied inside the SQL search
         Returns:
             List of relevant documents
         """
-        sub_docs = self.vectorstore.similarity_search(query, **self.search_kwargs)
-        # logger.info(f"Child docs were extracted for query **{query}**: \n {self.format_docs_to_log(sub_docs)}\n")
-        # We do this to maintain the order of the ids that are returned
-        ids = []
-        for d in sub_docs:
-            if d.metadata[self.id_key] not in ids:
-                ids.append(d.metadata[self.id_key])
-        docs = self.docstore.mget(ids)
-        logging.info(f"Child docs were extracted for query **{query}**: \n {self.format_docs_to_log(docs)}\n")
-        return [d for d in docs if d is not None]
+        params = self._params(ef_search, probes, metadata_filter)
+        cache = self.result_cache
+        slot = cache.slot(self.vectorstore.collection_name, self._cache_scope(params), query) if cache else None
+        if slot is None:
+            docs = self._search_documents(query, params)
+        else:
+            with stage("cache"):
+                docs = cache.get(slot)
+            if docs is None:
+                embedding = None
+                if cache.semantic:
+                    with stage("embed"):
+                        embedding = self.vectorstore.embeddings.embed_query(query)
+                    with stage("cache"):
+                        docs = cache.get_similar(slot, embedding)
+                if docs is None:
+                    docs = self._search_documents(query, params, embedding)
+                    cache.put(slot, docs, embedding)
+        self._log_parents(query, docs)
+        return docs
+
+    def _cache_scope(self, params: Optional[VectorSearchParams], k: Optional[int] = None,
+                     score: Optional[float] = None) -> str:
+        """Everything besides the query that changes the results of a search. `k` and `score`
+        are the overrides of `batch_search`; without them batch and single searches share entries."""
+        search_kwargs = dict(self.search_kwargs)
+        if k is not None:
+            search_kwargs["k"] = k
+        if score is not None:
+            search_kwargs["score_threshold"] = score
+        options = (self.unique_parents, self.collapse_parents, self.collapse_candidates, self.collapse_exact,
+                   self.score_key)
+        return (f"{type(self).__name__}\0{self.vectorstore.collection_name}\0{sorted(search_kwargs.items())}"
+                f"\0{options}\0{params!r}")
+
+    def _search_documents(self, query: str, params: Optional[VectorSearchParams],
+                          embedding: Optional[List[float]] = None) -> List[Document]:
+        ranked = self._search(query, params, embedding)
+        with stage("docstore"):
+            parents = self.docstore.mget([_id for _id, _ in ranked])
+        return self._ranked_parents(ranked, parents)
+
+    def batch_search(self, queries: List[str], k: Optional[int] = None, score: Optional[float] = None,
+                     ef_search: Optional[int] = None, probes: Optional[int] = None,
+                     metadata_filter: Optional[MetadataFilter | dict] = None) -> List[List[Document]]:
+        """Search several queries at once.
+
+        Queries missing from `result_cache` are embedded in one request, their children are found
+        with one SQL statement (widened for the queries that need more children with
+        `unique_parents`) and parents of all queries are read with one `docstore.mget`.
+        Results are the same as of single-query search with the same options.
+
+        Args:
+            queries: Query strings.
+            k: Overrides `search_kwargs["k"]`, with the same meaning as in single-query search.
+            score: Minimal relevance score of a child hit, defaults to `search_kwargs["score_threshold"]`.
+            ef_search: HNSW search width, overrides `search_params`.
+            probes: IVFFlat lists to scan, overrides `search_params`.
+            metadata_filter: MetadataFilter (or its dict) shared by all queries.
+        Returns:
+            Parent documents for every query, in the order of `queries`.
+        """
+        if not queries:
+            return []
+        k = k if k is not None else self.search_kwargs.get("k", 4)
+        params = self._params(ef_search, probes, metadata_filter, score)
+
+        cache = self.result_cache
+        slots: List[Optional[CacheSlot]] = [None] * len(queries)
+        results: List[Optional[List[Document]]] = [None] * len(queries)
+        if cache is not None:
+            slots = cache.slots(self.vectorstore.collection_name, self._cache_scope(params, k, score), queries)
+            with stage("cache"):
+                results = [cache.get(slot) if slot is not None else None for slot in slots]
+
+        missing = [i for i, docs in enumerate(results) if docs is None]
+        if not missing:
+            return results
+        with stage("embed"):
+            embeddings = self.vectorstore.embeddings.embed_documents([queries[i] for i in missing])
+        if cache is not None and cache.semantic:
+            with stage("cache"):
+                for i, embedding in zip(missing, embeddings):
+                    if slots[i] is not None:
+                        results[i] = cache.get_similar(slots[i], embedding)
+        searched = [(i, embedding) for i, embedding in zip(missing, embeddings) if results[i] is None]
+        if not searched:
+            return results
+
+        ranked_per_query = self._batch_ranked(
+            [queries[i] for i, _ in searched], [embedding for _, embedding in searched], k, params, score
+        )
+        unique_ids = list(dict.fromkeys(_id for ranked in ranked_per_query for _id, _ in ranked))
+        with stage("docstore"):
+            parents = dict(zip(unique_ids, self.docstore.mget(unique_ids)))
+        for (i, embedding), ranked in zip(searched, ranked_per_query):
+            results[i] = self._ranked_parents(ranked, [parents[_id] for _id, _ in ranked])
+            if slots[i] is not None:
+                cache.put(slots[i], results[i], embedding)
+        return results
+
+    def _batch_ranked(self, queries: List[str], embeddings: List[List[float]], k: int,
+                      params: Optional[VectorSearchParams],
+                      score: Optional[float]) -> List[List[Tuple[str, Dict[str, float]]]]:
+        """Ranked parent ids with scores of every query, see `_search`."""
+        if self.collapse_parents:
+            with stage("vector_query"):
+                return [self._collapsed_scores(best_parents(
+                    self.vectorstore, embedding, k=k, id_key=self.id_key,
+                    candidates=self._collapse_candidates(k), params=params,
+                ), score) for embedding in embeddings]
+
+        if not self.unique_parents:
+            with stage("vector_query"):
+                hits_per_query = similar_children_batch(self.vectorstore, embeddings, k, params)
+            return [self._scored_parent_ids(hits, score_threshold=score) for hits in hits_per_query]
+
+        ranked_per_query: List[List[Tuple[str, Dict[str, float]]]] = [[] for _ in embeddings]
+        pending = list(range(len(embeddings)))
+        fetch_k = min(k * self.fetch_k_multiplier, self.max_fetch_k)
+        while pending:
+            with stage("vector_query"):
+                hits_per_query = similar_children_batch(
+                    self.vectorstore, [embeddings[i] for i in pending], fetch_k, params
+                )
+            widened = []
+            for i, hits in zip(pending, hits_per_query):
+                ranked_per_query[i] = self._scored_parent_ids(hits, limit=k, score_threshold=score)
+                if self._next_fetch_k(fetch_k, len(hits), len(ranked_per_query[i]), k) is not None:
+                    widened.append(i)
+            # Only the queries still short of k distinct parents are searched again
+            pending, fetch_k = widened, min(fetch_k * 2, self.max_fetch_k)
+        return ranked_per_query
+
+    async def _amget_parents(self, ids: List[str]) -> List[Optional[Document]]:
+        docstore = self.docstore
+        if isinstance(docstore, EncoderBackedStore) and isinstance(docstore.store, RedisStore):
+            keys = [docstore.store._get_prefixed_key(docstore.key_encoder(_id)) for _id in ids]
+            values = await self.async_redis.mget(keys) if keys else []
+            return [docstore.value_deserializer(value) if value is not None else None for value in values]
+        return await docstore.amget(ids)
+
+    async def _asearch_parent_ids(self, connection, embedding: List[float],
+                                  params: Optional[VectorSearchParams]) -> List[Tuple[str, Dict[str, float]]]:
+        k = self.search_kwargs.get("k", 4)
+        if not self.unique_parents:
+            hits = await asimilar_children(connection, self.vectorstore, embedding, k=k, params=params)
+            return self._scored_parent_ids(hits)
+
+        fetch_k = min(k * self.fetch_k_multiplier, self.max_fetch_k)
+        while True:
+            hits = await asimilar_children(connection, self.vectorstore, embedding, k=fetch_k, params=params)
+            ranked = self._scored_parent_ids(hits, limit=k)
+            fetch_k = self._next_fetch_k(fetch_k, len(hits), len(ranked), k)
+            if fetch_k is None:
+                return ranked
+
+    async def _aembed(self, query: str, embedding: Optional[List[float]]) -> List[float]:
+        if embedding is not None:
+            return embedding
+        return await timed(self.vectorstore.embeddings.aembed_query(query), "embed")
+
+    async def _asearch(self, query: str, params: Optional[VectorSearchParams],
+                       embedding: Optional[List[float]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """Async `_search`: the query is embedded while a connection is checked out of the asyncpg pool."""
+        embedding, connection = await asyncio.gather(
+            self._aembed(query, embedding),
+            self.async_engine.connect(),
+            return_exceptions=True,
+        )
+        if isinstance(connection, BaseException):
+            raise connection
+        try:
+            if isinstance(embedding, BaseException):
+                raise embedding
+            with stage("vector_query"):
+                if self.collapse_parents:
+                    k = self.search_kwargs.get("k", 4)
+                    return self._collapsed_scores(await abest_parents(
+                        connection, self.vectorstore, embedding, k=k,
+                        id_key=self.id_key, candidates=self._collapse_candidates(k), params=params,
+                    ))
+                return await self._asearch_parent_ids(connection, embedding, params)
+        finally:
+            await connection.close()
+
+    def _has_async_path(self) -> bool:
+        return self.async_engine is not None and self.async_redis is not None
+
+    async def _aget_relevant_documents(
+            self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+            ef_search: Optional[int] = None, probes: Optional[int] = None,
+            metadata_filter: Optional[MetadataFilter | dict] = None,
+    ) -> List[Document]:
+        """Async version of `_get_relevant_documents` that does not block the event loop.
+
+        Children are searched over asyncpg and parents are read with one async Redis MGET.
+        Without an async engine the sync implementation runs in the default executor.
+        """
+        if not self._has_async_path():
+            return await run_in_executor(
+                None, self._get_relevant_documents, query, run_manager=run_manager.get_sync(),
+                ef_search=ef_search, probes=probes, metadata_filter=metadata_filter,
+            )
+
+        params = self._params(ef_search, probes, metadata_filter)
+        cache = self.result_cache
+        slot = await cache.aslot(self.vectorstore.collection_name, self._cache_scope(params), query) if cache else None
+        if slot is None:
+            docs = await self._asearch_documents(query, params)
+        else:
+            with stage("cache"):
+                docs = cache.get(slot)
+            if docs is None:
+                embedding = None
+                if cache.semantic:
+                    embedding = await timed(self.vectorstore.embeddings.aembed_query(query), "embed")
+                    with stage("cache"):
+                        docs = await cache.aget_similar(slot, embedding)
+                if docs is None:
+                    docs = await self._asearch_documents(query, params, embedding)
+                    cache.put(slot, docs, embedding)
+        self._log_parents(query, docs)
+        return docs
+
+    async def _asearch_documents(self, query: str, params: Optional[VectorSearchParams],
+                                 embedding: Optional[List[float]] = None) -> List[Document]:
+        ranked = await self._asearch(query, params, embedding)
+        with stage("docstore"):
+            parents = await self._amget_parents([_id for _id, _ in ranked])
+        return self._ranked_parents(ranked, parents)
+
+    async def astream_parents(
+            self, query: str, *, ef_search: Optional[int] = None, probes: Optional[int] = None,
+            metadata_filter: Optional[MetadataFilter | dict] = None,
+    ) -> AsyncIterator[Document]:
+        """Yield parents in rank order, each as soon as it is read from the docstore.
+
+        Up to `stream_concurrency` parents are requested at once, in rank order, so the first one
+        is out after a single docstore round trip instead of after the slowest one. Without
+        an async engine the search and the reads run in the default executor.
+        """
+        params = self._params(ef_search, probes, metadata_filter)
+        if self._has_async_path():
+            ranked = await self._asearch(query, params)
+            mget = self._amget_parents
+        else:
+            ranked = await run_in_executor(None, self._search, query, params)
+
+            def mget(ids):
+                return run_in_executor(None, self.docstore.mget, ids)
+
+        limit = asyncio.Semaphore(self.stream_concurrency)
+
+        async def fetch(_id):
+            async with limit:
+                return await mget([_id])
+
+        fetches = [asyncio.ensure_future(fetch(_id)) for _id, _ in ranked]
+        try:
+            for item, fetch in zip(ranked, fetches):
+                with stage("docstore"):
+                    parents = await fetch
+                for doc in self._ranked_parents([item], parents):
+                    yield doc
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+
+    def _highlight_fetch_k(self, spans_per_parent: int) -> int:
+        k = self.search_kwargs.get("k", 4)
+        return min(max(k * self.fetch_k_multiplier, k * spans_per_parent), self.max_fetch_k)
+
+    def _highlighted_parents(self, query: str, hits: List[Tuple[Document, float]], spans_per_parent: int,
+                             window_chars: int) -> List[Document]:
+        """Group child hits (nearest first) into at most k parents built from child metadata."""
+        relevance = self.vectorstore._select_relevance_score_fn()
+        threshold = self._score_threshold()
+        k = self.search_kwargs.get("k", 4)
+        parents: Dict[str, Document] = {}
+        for child, distance in hits:
+            score = relevance(distance)
+            _id = child.metadata.get(self.id_key)
+            if _id is None or (threshold is not None and score < threshold):
+                continue
+            parent = parents.get(_id)
+            if parent is None:
+                if len(parents) == k:
+                    continue
+                # Children carry the parent metadata, so the parent is not read from the docstore
+                metadata = {key: value for key, value in child.metadata.items() if key != "start_index"}
+                parent = parents[_id] = Document(
+                    page_content="", metadata={**metadata, self.score_key: score, "highlights": []}
+                )
+            spans = parent.metadata["highlights"]
+            if len(spans) < spans_per_parent:
+                spans.append(highlight_span(child, score, query, window_chars))
+        return list(parents.values())
+
+    def highlights(self, query: str, *, spans_per_parent: int = 3, window_chars: int = 600,
+                   include_parent: bool = False, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                   metadata_filter: Optional[MetadataFilter | dict] = None) -> List[Document]:
+        """Matched child spans of the top-k parents instead of the parents themselves.
+
+        Every returned document has the parent metadata (as stored on its children), the best
+        child relevance in `metadata[score_key]` and up to `spans_per_parent` spans in
+        `metadata["highlights"]`, best first: `start` / `end` offsets of the child in the parent,
+        its `score` and a `text` window of at most `window_chars` around the first query term
+        found in it, starting at `window_start`. Offsets are None for children indexed without
+        `start_index`. `page_content` is empty unless `include_parent`, only then the parents
+        are read from the docstore. The score threshold of `search_kwargs` applies to every child.
+        """
+        params = self._params(ef_search, probes, metadata_filter)
+        with stage("embed"):
+            embedding = self.vectorstore.embeddings.embed_query(query)
+        with stage("vector_query"):
+            hits = similar_children(self.vectorstore, embedding, k=self._highlight_fetch_k(spans_per_parent),
+                                    params=params)
+        docs = self._highlighted_parents(query, hits, spans_per_parent, window_chars)
+        if include_parent:
+            with stage("docstore"):
+                parents = self.docstore.mget([doc.metadata[self.id_key] for doc in docs])
+            for doc, parent in zip(docs, parents):
+                doc.page_content = parent.page_content if parent is not None else ""
+        return docs
+
+    async def ahighlights(self, query: str, *, spans_per_parent: int = 3, window_chars: int = 600,
+                          include_parent: bool = False, ef_search: Optional[int] = None,
+                          probes: Optional[int] = None,
+                          metadata_filter: Optional[MetadataFilter | dict] = None) -> List[Document]:
+        """Async `highlights`, falls back to the default executor without an async engine."""
+        if not self._has_async_path():
+            return await run_in_executor(
+                None, self.highlights, query, spans_per_parent=spans_per_parent, window_chars=window_chars,
+                include_parent=include_parent, ef_search=ef_search, probes=probes, metadata_filter=metadata_filter,
+            )
+
+        params = self._params(ef_search, probes, metadata_filter)
+        embedding, connection = await asyncio.gather(
+            self._aembed(query, None),
+            self.async_engine.connect(),
+            return_exceptions=True,
+        )
+        if isinstance(connection, BaseException):
+            raise connection
+        try:
+            if isinstance(embedding, BaseException):
+                raise embedding
+            with stage("vector_query"):
+                hits = await asimilar_children(connection, self.vectorstore, embedding,
+                                               k=self._highlight_fetch_k(spans_per_parent), params=params)
+        finally:
+            await connection.close()
+        docs = self._highlighted_parents(query, hits, spans_per_parent, window_chars)
+        if include_parent:
+            with stage("docstore"):
+                parents = await self._amget_parents([doc.metadata[self.id_key] for doc in docs])
+            for doc, parent in zip(docs, parents):
+                doc.page_content = parent.page_content if parent is not None else ""
+        return docs
+
+
+def highlight_span(child: Document, score: float, query: str, window_chars: int) -> Dict[str, Any]:
+    """Offsets, score and a bounded text window of a matched child, see `CustomMultiVectorRetriever.highlights`."""
+    text = child.page_content
+    window_start = 0
+    if len(text) > window_chars:
+        lowered = text.lower()
+        found = [position for position in (lowered.find(term) for term in query.lower().split() if len(term) > 2)
+                 if position >= 0]
+        centre = min(found) if found else 0
+        window_start = max(0, min(centre - window_chars // 2, len(text) - window_chars))
+    start = child.metadata.get("start_index")
+    return {
+        "start": start,
+        "end": start + len(text) if start is not None else None,
+        "score": score,
+        "window_start": start + window_start if start is not None else None,
+        "text": text[window_start:window_start + window_chars],
+    }
 
 
 class CustomParentDocumentRetriever(CustomMultiVectorRetriever):
@@ -111,29 +690,552 @@ class CustomParentDocumentRetriever(CustomMultiVectorRetriever):
         self.vectorstore.add_documents(docs)
         if add_to_docstore:
             self.docstore.mset(full_docs)
-            
-            
-def get_parent_retriever(collection_name: str, k: int = 6, score: float | int = 0.8):
+        bump_collection_version(self.vectorstore.collection_name)
+
+    def add_documents_streaming(
+        self,
+        documents: Iterable[Document],
+        ids: Optional[Iterable[str]] = None,
+        add_to_docstore: bool = True,
+        **pipeline_kwargs,
+    ) -> IngestionReport:
+        """Streaming variant of `add_documents` for bulk loads.
+
+        Splitting runs in a process pool, children are embedded in token-bounded batches
+        with bounded concurrency and written to the vectorstore and docstore as batches complete.
+
+        Args:
+            documents: Parent documents, may be a generator.
+            ids: Optional parent ids in the same order as `documents`.
+            add_to_docstore: Boolean of whether to add documents to docstore.
+            **pipeline_kwargs: Tuning options of `StreamingIngestor`
+                (split_workers, embed_batch_tokens, embed_concurrency, docstore_batch_size, ...).
+        Returns:
+            IngestionReport with per-stage throughput (docs/s, tokens/s).
+        """
+        if self.parent_splitter is not None:
+            documents = self.parent_splitter.split_documents(list(documents))
+        ingestor = StreamingIngestor(
+            child_splitter=self.child_splitter,
+            vectorstore=self.vectorstore,
+            docstore=self.docstore,
+            id_key=self.id_key,
+            **pipeline_kwargs,
+        )
+        report = ingestor.run(documents, ids=ids, add_to_docstore=add_to_docstore)
+        bump_collection_version(self.vectorstore.collection_name)
+        return report
+
+    def sync_documents(
+        self,
+        documents: List[Document],
+        parent_id_key: str = "id",
+        hash_key: str = "content_hash",
+        delete_missing: bool = False,
+        mget_batch_size: int = 1000,
+        **pipeline_kwargs,
+    ) -> SyncSummary:
+        """Incremental, idempotent re-index keyed on the interpretation id.
+
+        Every parent is stored under its own `parent_id_key` metadata value together with a hash
+        of its content. Unchanged parents are skipped, changed parents get their children
+        deleted and re-embedded, new parents are added.
+
+        Args:
+            documents: Parent documents, e.g. from `CustomSplitterV2.create_single_document_with_metadata`.
+            parent_id_key: Parent metadata key with a stable id (interpretation `id`).
+            hash_key: Parent metadata key the content hash is stored under in the docstore.
+            delete_missing: Also remove indexed parents that are absent from `documents`.
+                Only makes sense when `documents` is the full corpus of the collection.
+            mget_batch_size: Number of parents fetched from the docstore per request.
+            **pipeline_kwargs: Tuning options of `StreamingIngestor`.
+        Returns:
+            SyncSummary with added, updated, unchanged and removed parent ids.
+        """
+        if self.parent_splitter is not None:
+            raise ValueError("Incremental sync needs parents to be stored as passed in, without `parent_splitter`")
+
+        summary = SyncSummary()
+        changed_docs, changed_ids = [], []
+        seen = set()
+        for i in range(0, len(documents), mget_batch_size):
+            batch = documents[i:i + mget_batch_size]
+            batch_ids = []
+            for doc in batch:
+                if doc.metadata.get(parent_id_key) is None:
+                    raise ValueError(f"Parent document has no `{parent_id_key}` in metadata")
+                batch_ids.append(str(doc.metadata[parent_id_key]))
+            for _id, doc, stored in zip(batch_ids, batch, self.docstore.mget(batch_ids)):
+                seen.add(_id)
+                new_hash = content_hash(doc, hash_key)
+                if stored is None:
+                    summary.added.append(_id)
+                elif stored.metadata.get(hash_key) == new_hash:
+                    summary.unchanged.append(_id)
+                    continue
+                else:
+                    summary.updated.append(_id)
+                changed_ids.append(_id)
+                changed_docs.append(Document(page_content=doc.page_content,
+                                             metadata={**doc.metadata, hash_key: new_hash}))
+
+        if summary.updated:
+            delete_children(self.vectorstore, summary.updated, id_key=self.id_key)
+        if changed_docs:
+            summary.report = self.add_documents_streaming(changed_docs, ids=changed_ids, **pipeline_kwargs)
+        if delete_missing:
+            summary.removed = sorted(list_parent_ids(self.vectorstore, id_key=self.id_key) - seen)
+            if summary.removed:
+                delete_children(self.vectorstore, summary.removed, id_key=self.id_key)
+                self.docstore.mdelete(summary.removed)
+                bump_collection_version(self.vectorstore.collection_name)
+
+        logging.info(f"Incremental sync finished: {summary}")
+        return summary
+
+
+# Interpretation signatures, e.g. 0114-KDIP4-3.4012.123.2021.2.AM or IPPP1/443-123/11-2/AS
+SIGNATURE_PATTERN = re.compile(r"[A-Za-z0-9]+(?:[./-][A-Za-z0-9]+){2,}")
+
+# Lexical searches of sync hybrid queries run here, next to the vector search in the calling thread
+_lexical_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="lexical-search")
+
+
+def looks_like_signature(query: str) -> bool:
+    query = query.strip()
+    return (SIGNATURE_PATTERN.fullmatch(query) is not None
+            and any(c.isdigit() for c in query) and any(c.isalpha() for c in query))
+
+
+class HybridParentDocumentRetriever(CustomParentDocumentRetriever):
+    """Parent retriever fusing full-text and vector search of child chunks.
+
+    The lexical search runs over the chunk text and the parser metadata (title, keywords, signature)
+    concurrently with the vector search; parent rankings of both are fused with reciprocal rank
+    fusion and the fused score is written to `metadata[score_key]`. The score threshold applies to
+    the vector search only. Queries that look like an interpretation signature are first matched
+    against child signatures without embedding the query.
+    Needs the indexes from `vector_indexes.create_lexical_indexes` to be fast.
+    """
+
+    text_search_config: str = "simple"
+    """Postgres text search configuration, the same the lexical index was built with."""
+    candidates: int = 20
+    """Children fetched by each of the lexical and vector searches before fusion."""
+    rrf_k: int = 60
+    """Reciprocal rank fusion constant: score = sum(1 / (rrf_k + rank))."""
+    signature_fast_path: bool = True
+    """Answer signature-like queries by an exact signature match, falling back to hybrid search."""
+
+    def _fuse(self, *child_hits: List[Tuple[Document, float]],
+              k: Optional[int] = None) -> List[Tuple[str, Dict[str, float]]]:
+        scores: Dict[str, float] = {}
+        for hits in child_hits:
+            for rank, _id in enumerate(self._parent_ids(d for d, _ in hits), start=1):
+                scores[_id] = scores.get(_id, 0.0) + 1.0 / (self.rrf_k + rank)
+        k = k if k is not None else self.search_kwargs.get("k", 4)
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(_id, {self.score_key: score}) for _id, score in fused]
+
+    def _lexical_children(self, query: str,
+                          params: Optional[VectorSearchParams]) -> List[Tuple[Document, float]]:
+        with stage("lexical_query"):
+            return lexical_children(self.vectorstore, query, self.candidates, self.text_search_config, params)
+
+    def _search(self, query: str, params: Optional[VectorSearchParams],
+                embedding: Optional[List[float]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        if self.signature_fast_path and looks_like_signature(query):
+            with stage("lexical_query"):
+                ids = signature_parents(self.vectorstore, query, self.id_key, self.search_kwargs.get("k", 4), params)
+            if ids:
+                return [(_id, {}) for _id in ids]
+
+        # The copied context lets the lexical stage report its timing from the executor thread
+        lexical = _lexical_executor.submit(contextvars.copy_context().run, self._lexical_children, query, params)
+        if embedding is None:
+            with stage("embed"):
+                embedding = self.vectorstore.embeddings.embed_query(query)
+        with stage("vector_query"):
+            vector_hits = similar_children(self.vectorstore, embedding, k=self.candidates, params=params)
+        return self._fuse(vector_hits, lexical.result())
+
+    def _batch_ranked(self, queries: List[str], embeddings: List[List[float]], k: int,
+                      params: Optional[VectorSearchParams],
+                      score: Optional[float]) -> List[List[Tuple[str, Dict[str, float]]]]:
+        """Hybrid `_batch_ranked`: lexical searches run in the executor while the vector halves of
+        all queries are searched with one statement."""
+        signature_ids: Dict[int, List[str]] = {}
+        if self.signature_fast_path:
+            with stage("lexical_query"):
+                for i, query in enumerate(queries):
+                    if looks_like_signature(query):
+                        signature_ids[i] = signature_parents(self.vectorstore, query, self.id_key, k, params)
+        fused = [i for i in range(len(queries)) if not signature_ids.get(i)]
+        lexical = {i: _lexical_executor.submit(contextvars.copy_context().run, self._lexical_children, queries[i],
+                                               params) for i in fused}
+        with stage("vector_query"):
+            vector_hits = similar_children_batch(
+                self.vectorstore, [embeddings[i] for i in fused], self.candidates, params
+            )
+        ranked_per_query = [[(_id, {}) for _id in signature_ids.get(i, ())] for i in range(len(queries))]
+        for i, hits in zip(fused, vector_hits):
+            ranked_per_query[i] = self._fuse(hits, lexical[i].result(), k=k)
+        return ranked_per_query
+
+    async def _avector_children(self, query: str, params: Optional[VectorSearchParams],
+                                embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+        embedding, connection = await asyncio.gather(
+            self._aembed(query, embedding),
+            self.async_engine.connect(),
+            return_exceptions=True,
+        )
+        if isinstance(connection, BaseException):
+            raise connection
+        try:
+            if isinstance(embedding, BaseException):
+                raise embedding
+            with stage("vector_query"):
+                return await asimilar_children(
+                    connection, self.vectorstore, embedding, k=self.candidates, params=params
+                )
+        finally:
+            await connection.close()
+
+    async def _alexical_children(self, query: str,
+                                 params: Optional[VectorSearchParams]) -> List[Tuple[Document, float]]:
+        async with self.async_engine.connect() as connection:
+            with stage("lexical_query"):
+                return await alexical_children(
+                    connection, self.vectorstore, query, self.candidates, self.text_search_config, params
+                )
+
+    async def _asearch(self, query: str, params: Optional[VectorSearchParams],
+                       embedding: Optional[List[float]] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """Async `_search`, both searches run on their own asyncpg connections."""
+        if self.signature_fast_path and looks_like_signature(query):
+            async with self.async_engine.connect() as connection:
+                with stage("lexical_query"):
+                    ids = await asignature_parents(
+                        connection, self.vectorstore, query, self.id_key, self.search_kwargs.get("k", 4), params
+                    )
+            if ids:
+                return [(_id, {}) for _id in ids]
+
+        vector_hits, lexical_hits = await asyncio.gather(
+            self._avector_children(query, params, embedding),
+            self._alexical_children(query, params),
+        )
+        return self._fuse(vector_hits, lexical_hits)
+
+
+def build_parent_retriever(collection_name: str, k: int = 6, score: float | int = 0.8, *,
+                           vectorstore: Optional[PGVector] = None,
+                           redis_client: Optional[redis.Redis] = None,
+                           async_engine: Optional[AsyncEngine] = None,
+                           async_redis: Optional[redis.asyncio.Redis] = None,
+                           search_params: Optional[VectorSearchParams] = None,
+                           hybrid: bool = False,
+                           collapse_parents: bool = False,
+                           result_cache: Optional[ResultCache] = None,
+                           docstore_serializer: Optional[CompactDocumentSerializer] = None,
+                           ) -> CustomParentDocumentRetriever:
+    """Build a retriever over a collection. Shared connections can be passed in,
+    otherwise new ones are created from settings. The async search path is used
+    only when both `async_engine` and `async_redis` are passed. With `hybrid`
+    a HybridParentDocumentRetriever is built, otherwise `collapse_parents` collapses child hits
+    into distinct parents inside Postgres. `result_cache` is shared between retrievers,
+    its scopes keep their results apart. With `docstore_serializer` parents are written in the
+    compact format (see app/services/docstore.py), JSON entries are still read."""
     child_splitter = CustomSplitterV2(
         chunk_size=400,
         chunk_overlap=0,
-        length_function=tokens_from_string
+        length_function=tokens_from_string,
+        # Offsets of children in their parent, returned by `highlights`
+        add_start_index=True,
     )
-    docstore = create_kv_docstore(RedisStore(redis_url="redis://redis:6379"))
+    if redis_client is None:
+        redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    if docstore_serializer is not None:
+        docstore = create_compact_docstore(RedisStore(client=redis_client), docstore_serializer)
+    else:
+        docstore = create_kv_docstore(RedisStore(client=redis_client))
 
-    vectorstore = PGVector(
-        collection_name=collection_name,
-        connection_string=settings.PG_VECTOR_URI,
-        embedding_function=model_selector(ModelName.embed)
-    )
+    if vectorstore is None:
+        vectorstore = PGVector(
+            collection_name=collection_name,
+            connection_string=settings.PG_VECTOR_URI,
+            embedding_function=model_selector(ModelName.embed)
+        )
 
-    return CustomParentDocumentRetriever(
+    retriever_options = {}
+    retriever_class = CustomParentDocumentRetriever
+    if hybrid:
+        retriever_class = HybridParentDocumentRetriever
+        retriever_options["text_search_config"] = settings.TEXT_SEARCH_CONFIG
+    elif collapse_parents:
+        retriever_options["collapse_parents"] = True
+
+    return retriever_class(
+        **retriever_options,
         child_splitter=child_splitter,
         docstore=docstore,
         vectorstore=vectorstore,
+        async_engine=async_engine,
+        async_redis=async_redis,
+        search_params=search_params,
+        result_cache=result_cache,
         search_kwargs={
             "k": k,
             "score_threshold": score,
         }
     )
 
+
+class RetrieverRegistry:
+    """Process-wide registry of retrievers keyed by (collection_name, k, score, hybrid, collapse_parents).
+
+    All retrievers share one SQLAlchemy engine, one Redis connection pool and one embeddings
+    client (plus their asyncpg / async Redis counterparts for the async search path);
+    vectorstores are created once per collection. The number of kept retrievers is
+    bounded, least recently used ones are dropped first. Retrievers and vectorstores are built
+    outside the registry lock (building reads the database and may run DDL), so a cold collection
+    does not hold up requests to the others; concurrent requests for the same retriever wait for
+    one build. `embeddings` replaces the configured
+    embedding model, e.g. with a fake one in tests; the configured one is wrapped in the embedding
+    cache from settings (EMBEDDING_CACHE_*). All retrievers share `result_cache`
+    (None disables result caching).
+    """
+
+    def __init__(self, maxsize: int = 32, embeddings=None, result_cache: Optional[ResultCache] = None):
+        self.maxsize = maxsize
+        self.result_cache = result_cache
+        self._retrievers: "OrderedDict[Tuple[str, int, float, bool, bool], CustomParentDocumentRetriever]" = \
+            OrderedDict()
+        self._building: Dict[Tuple[str, int, float, bool, bool], Future] = {}
+        # Bumped by `invalidate`, a build started before it is returned but not kept
+        self._generations: Dict[str, int] = {}
+        self._vectorstores: Dict[str, PGVector] = {}
+        self._engine: Optional[Engine] = None
+        self._redis_pool: Optional[redis.ConnectionPool] = None
+        self._async_engine: Optional[AsyncEngine] = None
+        self._async_redis_pool: Optional[redis.asyncio.ConnectionPool] = None
+        self._embeddings = embeddings
+        self._lock = threading.RLock()
+        self.pool_stats = {"sync": PoolCheckoutStats(), "async": PoolCheckoutStats()}
+
+    @property
+    def engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(
+                    settings.PG_VECTOR_URI,
+                    poolclass=timed_pool_class(QueuePool, self.pool_stats["sync"]),
+                    pool_size=settings.PG_VECTOR_POOL_SIZE,
+                    max_overflow=settings.PG_VECTOR_MAX_OVERFLOW,
+                    pool_pre_ping=True,
+                )
+            return self._engine
+
+    @property
+    def redis_client(self) -> redis.Redis:
+        with self._lock:
+            if self._redis_pool is None:
+                self._redis_pool = redis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                )
+            return redis.Redis(connection_pool=self._redis_pool)
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        with self._lock:
+            if self._async_engine is None:
+                self._async_engine = create_async_engine(
+                    make_url(settings.PG_VECTOR_URI).set(drivername="postgresql+asyncpg"),
+                    poolclass=timed_pool_class(AsyncAdaptedQueuePool, self.pool_stats["async"]),
+                    pool_size=settings.PG_VECTOR_POOL_SIZE,
+                    max_overflow=settings.PG_VECTOR_MAX_OVERFLOW,
+                    pool_pre_ping=True,
+                )
+            return self._async_engine
+
+    @property
+    def async_redis_client(self) -> redis.asyncio.Redis:
+        with self._lock:
+            if self._async_redis_pool is None:
+                self._async_redis_pool = redis.asyncio.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                )
+            return redis.asyncio.Redis(connection_pool=self._async_redis_pool)
+
+    @property
+    def embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = model_selector(ModelName.embed, cache=self.embedding_cache_backends())
+            return self._embeddings
+
+    def embedding_cache_backends(self) -> List[EmbeddingCacheBackend]:
+        """Embedding cache tiers configured in settings, fastest first. Empty disables the cache."""
+        backends: List[EmbeddingCacheBackend] = []
+        if settings.EMBEDDING_CACHE_SIZE:
+            backends.append(LRUEmbeddingCache(maxsize=settings.EMBEDDING_CACHE_SIZE))
+        if settings.EMBEDDING_CACHE_REDIS:
+            backends.append(RedisEmbeddingCache(client=self.redis_client, ttl=settings.EMBEDDING_CACHE_TTL))
+        return backends
+
+    def embedding_cache_metrics(self) -> Optional[Dict[str, float]]:
+        """Hit rate of the embedding cache, None when the embeddings are not cached."""
+        embeddings = self._embeddings
+        return embeddings.metrics() if isinstance(embeddings, CachedEmbeddings) else None
+
+    def vectorstore(self, collection_name: str) -> PGVector:
+        with self._lock:
+            vectorstore = self._vectorstores.get(collection_name)
+        if vectorstore is not None:
+            return vectorstore
+        # PGVector creates the extension and the collection on init, that runs without the lock;
+        # a concurrent duplicate is dropped
+        vectorstore = PGVector(
+            collection_name=collection_name,
+            connection_string=settings.PG_VECTOR_URI,
+            embedding_function=self.embeddings,
+            connection=self.engine,
+        )
+        with self._lock:
+            return self._vectorstores.setdefault(collection_name, vectorstore)
+
+    def search_params(self, collection_name: str) -> VectorSearchParams:
+        """Collection id (so per-collection partial indexes apply) and the ANN index parameters
+        persisted for the collection in CollectionsList."""
+        params = VectorSearchParams(collection_id=str(collection_uuid(self.vectorstore(collection_name))))
+        try:
+            with SessionLocal() as session:
+                collection = CollectionsListDaL.get_collection(session, collection_name)
+        except CollectionNotFoundException:
+            return params
+        if not collection.vector_index:
+            return params
+        config = VectorIndexConfig(**collection.vector_index)
+        return replace(params, dimensions=config.dimensions, ef_search=config.ef_search, probes=config.probes,
+                       iterative_scan=config.iterative_scan)
+
+    def docstore_serializer(self, collection_name: str) -> Optional[CompactDocumentSerializer]:
+        """Compact serializer with the current dictionary of the collection, None with the JSON docstore."""
+        if settings.DOCSTORE_FORMAT != "compact":
+            return None
+        return DocstoreDictionaries(self.redis_client).serializer(
+            collection_name, level=settings.DOCSTORE_COMPRESSION_LEVEL
+        )
+
+    def train_docstore_dictionary(self, collection_name: str, samples: int = 500,
+                                  size: int = 112_640) -> int:
+        """Train a compression dictionary on up to `samples` parents of the collection and write
+        new entries with it. Returns the dictionary id."""
+        retriever = self.get(collection_name)
+        parent_ids = sorted(list_parent_ids(retriever.vectorstore, id_key=retriever.id_key))[:samples]
+        parents = [doc for doc in retriever.docstore.mget(parent_ids) if doc is not None]
+        if not parents:
+            raise ValueError(f"Collection '{collection_name}' has no parents to train a dictionary on")
+        dict_id = DocstoreDictionaries(self.redis_client).save(collection_name, train_dictionary(parents, size))
+        self.invalidate(collection_name)
+        return dict_id
+
+    def get(self, collection_name: str, k: int = 6, score: float | int = 0.8,
+            hybrid: bool = False, collapse_parents: bool = False) -> CustomParentDocumentRetriever:
+        key = (collection_name, k, float(score), hybrid, collapse_parents and not hybrid)
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is not None:
+                self._retrievers.move_to_end(key)
+                return retriever
+            building = self._building.get(key)
+            if building is None:
+                building = self._building[key] = Future()
+                generation = self._generations.get(collection_name, 0)
+            else:
+                generation = None
+        if generation is None:
+            # Another thread is building this retriever
+            return building.result()
+
+        try:
+            retriever = build_parent_retriever(
+                collection_name, k, score,
+                vectorstore=self.vectorstore(collection_name),
+                redis_client=self.redis_client,
+                async_engine=self.async_engine,
+                async_redis=self.async_redis_client,
+                search_params=self.search_params(collection_name),
+                hybrid=hybrid,
+                collapse_parents=collapse_parents,
+                result_cache=self.result_cache,
+                docstore_serializer=self.docstore_serializer(collection_name),
+            )
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            building.set_exception(e)
+            raise
+        with self._lock:
+            del self._building[key]
+            if self._generations.get(collection_name, 0) == generation:
+                self._retrievers[key] = retriever
+                while len(self._retrievers) > self.maxsize:
+                    self._retrievers.popitem(last=False)
+        building.set_result(retriever)
+        return retriever
+
+    def pool_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Checkout wait times of the vectorstore engines."""
+        return {name: stats.metrics() for name, stats in self.pool_stats.items()}
+
+    def invalidate(self, collection_name: str):
+        """Drop cached retrievers of a collection, e.g. after its index was changed."""
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            for key in [key for key in self._retrievers if key[0] == collection_name]:
+                del self._retrievers[key]
+
+    def close(self):
+        """Drop cached retrievers and close the shared connection pools."""
+        with self._lock:
+            for collection_name, *_ in self._building:
+                self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            self._retrievers.clear()
+            self._vectorstores.clear()
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+            if self._redis_pool is not None:
+                self._redis_pool.disconnect()
+                self._redis_pool = None
+
+    async def aclose(self):
+        """Close the async pools, then everything `close` does."""
+        with self._lock:
+            async_engine, self._async_engine = self._async_engine, None
+            async_redis_pool, self._async_redis_pool = self._async_redis_pool, None
+        if async_engine is not None:
+            await async_engine.dispose()
+        if async_redis_pool is not None:
+            await async_redis_pool.disconnect()
+        self.close()
+
+
+retriever_registry = RetrieverRegistry(
+    maxsize=settings.RETRIEVER_REGISTRY_SIZE,
+    result_cache=ResultCache(
+        maxsize=settings.RESULT_CACHE_SIZE,
+        ttl=settings.RESULT_CACHE_TTL,
+        semantic_threshold=settings.RESULT_CACHE_SEMANTIC_THRESHOLD,
+        semantic_candidates=settings.RESULT_CACHE_SEMANTIC_CANDIDATES,
+    ) if settings.RESULT_CACHE_SIZE else None,
+)
+
+
+def get_parent_retriever(collection_name: str, k: int = 6, score: float | int = 0.8, hybrid: bool = False,
+                         collapse_parents: bool = False):
+    return retriever_registry.get(collection_name, k=k, score=score, hybrid=hybrid,
+                                  collapse_parents=collapse_parents)
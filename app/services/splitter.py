@@ -1,39 +1,235 @@
+import bisect
 import copy
-from typing import Dict, Optional, List, Any, Tuple, Type, Union
+import itertools
+import logging
+import operator
+import re
+from datetime import datetime
+from typing import Dict, Optional, List, Any, Tuple, Type, Union, Callable
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
-from global_utils import tokens_from_string
+from global_utils import DEFAULT_ENCODING, get_encoding, tokens_from_string
+
+
+_token_layouts: Dict[str, Tuple[List[int], List[bool]]] = {}
+
+
+def filter_metadata(metadata: Dict) -> Dict:
+    """Parser fields search can be filtered on (see `MetadataFilter`), copied to every chunk.
+    The release date is stored as an ISO date: JSON serializable and ordered as text."""
+    fields = {}
+    if metadata.get("author") is not None:
+        fields["author"] = metadata["author"]
+    release_date = metadata.get("release_date")
+    if release_date is not None:
+        fields["release_date"] = release_date.date().isoformat() if isinstance(release_date, datetime) \
+            else str(release_date)
+    return fields
+
+
+def _token_layout(encoding_name: str) -> Tuple[List[int], List[bool]]:
+    """Per-encoding lookup tables: characters started by every token id and whether
+    the token begins in the middle of a multibyte character."""
+    layout = _token_layouts.get(encoding_name)
+    if layout is None:
+        encoding = get_encoding(encoding_name)
+        chars, continuations = [0] * encoding.n_vocab, [False] * encoding.n_vocab
+        for token in range(encoding.n_vocab):
+            try:
+                token_bytes = encoding.decode_single_token_bytes(token)
+            except KeyError:
+                continue
+            chars[token] = sum(1 for byte in token_bytes if not 0x80 <= byte < 0xC0)
+            continuations[token] = bool(token_bytes) and 0x80 <= token_bytes[0] < 0xC0
+        layout = _token_layouts[encoding_name] = (chars, continuations)
+    return layout
+
+
+class TokenOffsets:
+    """Token layout of a whole document, tokenized once.
+
+    Lets the splitter measure any span of the document from prefix sums over token starts
+    instead of re-tokenizing it. A span is counted from the document tokens only when both
+    of its ends fall on clean token boundaries, otherwise the span is encoded on its own.
+    """
+
+    def __init__(self, text: str, encoding_name: str = DEFAULT_ENCODING):
+        self.text = text
+        self.encoding = get_encoding(encoding_name)
+        chars, continuations = _token_layout(encoding_name)
+
+        tokens = self.encoding.encode(text)
+        flags = list(map(continuations.__getitem__, tokens))
+        prefix = list(itertools.accumulate(map(chars.__getitem__, tokens), initial=0))
+        # Offset of the first character that holds bytes of each token
+        self.starts: List[int] = list(map(operator.sub, prefix, flags))
+        self.boundaries = set(itertools.compress(prefix, map(operator.not_, flags)))
+        self.boundaries.add(len(text))
+
+    def length(self, start: int, end: int) -> int:
+        if start >= end:
+            return 0
+        if start in self.boundaries and end in self.boundaries:
+            return bisect.bisect_left(self.starts, end) - bisect.bisect_left(self.starts, start)
+        return len(self.encoding.encode(self.text[start:end]))
 
 
 class CustomSplitterV2(RecursiveCharacterTextSplitter):
 
+    def __init__(self, *args, token_offsets: bool = False, encoding_name: str = DEFAULT_ENCODING, **kwargs):
+        """
+        Args:
+            token_offsets: Tokenize every document exactly once and measure candidate
+                chunks by prefix sums over its token offsets. In this mode lengths are
+                counted with the `encoding_name` tokenizer and `length_function` is not used.
+            encoding_name: tiktoken encoding used in `token_offsets` mode.
+        """
+        super().__init__(*args, **kwargs)
+        self._token_offsets = token_offsets
+        self._encoding_name = encoding_name
+
+    @property
+    def _supports_spans(self) -> bool:
+        return self._keep_separator in (True, "start") and not self._is_separator_regex
+
+    def split_text(self, text: str) -> List[str]:
+        if not self._token_offsets or not self._supports_spans:
+            return super().split_text(text)
+        return [text[start:end] for start, end in self.split_text_to_spans(text)]
+
+    def split_text_to_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Same chunks as `split_text`, returned as (start, end) offsets into `text`."""
+        if self._token_offsets:
+            length = TokenOffsets(text, self._encoding_name).length
+        else:
+            def length(start: int, end: int) -> int:
+                return self._length_function(text[start:end])
+        separator_len = 0 if self._token_offsets else self._length_function("")
+        return self._split_spans(text, 0, len(text), self._separators, length, separator_len)
+
+    def _split_spans(self, text: str, start: int, end: int, separators: List[str],
+                     length: Callable[[int, int], int], separator_len: int) -> List[Tuple[int, int]]:
+        """Span-based port of `RecursiveCharacterTextSplitter._split_text` with `keep_separator="start"`."""
+        final_chunks = []
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            if _s == "":
+                separator = _s
+                break
+            if text.find(_s, start, end) != -1:
+                separator = _s
+                new_separators = separators[i + 1:]
+                break
+
+        if separator:
+            cuts = [match.start() for match in re.finditer(re.escape(separator), text[start:end])]
+            bounds = [start] + [start + cut for cut in cuts] + [end]
+            splits = [(a, b) for a, b in zip(bounds, bounds[1:]) if a != b]
+        else:
+            splits = [(i, i + 1) for i in range(start, end)]
+
+        good_splits, good_lengths = [], []
+        for split in splits:
+            split_len = length(*split)
+            if split_len < self._chunk_size:
+                good_splits.append(split)
+                good_lengths.append(split_len)
+            else:
+                if good_splits:
+                    final_chunks.extend(self._merge_spans(text, good_splits, good_lengths, separator_len))
+                    good_splits, good_lengths = [], []
+                if not new_separators:
+                    final_chunks.append(split)
+                else:
+                    final_chunks.extend(self._split_spans(text, *split, new_separators, length, separator_len))
+        if good_splits:
+            final_chunks.extend(self._merge_spans(text, good_splits, good_lengths, separator_len))
+        return final_chunks
+
+    def _join_span(self, text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        if self._strip_whitespace:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        if start == end:
+            return None
+        return start, end
+
+    def _merge_spans(self, text: str, splits: List[Tuple[int, int]], lengths: List[int],
+                     separator_len: int) -> List[Tuple[int, int]]:
+        """Span-based port of `TextSplitter._merge_splits`; splits are contiguous so a chunk is one span."""
+        docs = []
+        first, count = 0, 0
+        total = 0
+        for index, _len in enumerate(lengths):
+            if total + _len + (separator_len if count > 0 else 0) > self._chunk_size:
+                if total > self._chunk_size:
+                    logging.warning(
+                        f"Created a chunk of size {total}, "
+                        f"which is longer than the specified {self._chunk_size}"
+                    )
+                if count > 0:
+                    doc = self._join_span(text, splits[first][0], splits[first + count - 1][1])
+                    if doc is not None:
+                        docs.append(doc)
+                    while total > self._chunk_overlap or (
+                            total + _len + (separator_len if count > 0 else 0) > self._chunk_size
+                            and total > 0
+                    ):
+                        total -= lengths[first] + (separator_len if count > 1 else 0)
+                        first += 1
+                        count -= 1
+            count += 1
+            total += _len + (separator_len if count > 1 else 0)
+        if count > 0:
+            doc = self._join_span(text, splits[first][0], splits[first + count - 1][1])
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
     def create_documents(
             self, texts: List[str], metadatas: Optional[List[dict]] = None
     ) -> List[Document]:
-        """Create documents from a list of texts."""
+        """Create documents from a list of texts.
+
+        Source metadata is deep-copied once per text; its chunks get shallow copies of that
+        copy, so nested values (keywords, approved, ...) are shared between chunks of one text
+        and must be treated as read-only.
+        """
         _metadatas = metadatas or [{}] * len(texts)
         documents = []
         for i, text in enumerate(texts):
-            index = -1
-            for chunk in self.split_text(text):
-                metadata = copy.deepcopy(_metadatas[i])
-                if self._add_start_index:
-                    index = text.find(chunk, index + 1)
-                    metadata["start_index"] = index
+            base_metadata = copy.deepcopy(_metadatas[i])
+            for start, chunk in self._chunks_with_offsets(text):
                 if len(chunk) > 30:
+                    metadata = dict(base_metadata)
+                    if self._add_start_index:
+                        metadata["start_index"] = start
                     new_doc = Document(page_content=chunk, metadata=metadata)
                     documents.append(new_doc)
 
         return documents
 
+    def _chunks_with_offsets(self, text: str) -> List[Tuple[int, str]]:
+        if self._supports_spans:
+            return [(start, text[start:end]) for start, end in self.split_text_to_spans(text)]
+        chunks, index = [], -1
+        for chunk in self.split_text(text):
+            index = text.find(chunk, index + 1)
+            chunks.append((index, chunk))
+        return chunks
+
     def create_documents_with_metadata(self, metadata):
         new_metadata = {}
         new_text = metadata["content"]
         new_metadata["id"] = metadata["id"]
         new_metadata["signature"] = metadata["signature"]
         new_metadata["keywords"] = metadata["keywords"]
+        new_metadata.update(filter_metadata(metadata))
         return self.create_documents(
             [new_text], metadatas=[new_metadata]
         )
@@ -46,6 +242,7 @@ class CustomSplitterV2(RecursiveCharacterTextSplitter):
         new_metadata["signature"] = metadata["signature"]
         new_metadata["keywords"] = metadata["keywords"]
         new_metadata["title"] = metadata["title"]
+        new_metadata.update(filter_metadata(metadata))
         return [Document(
             page_content=new_text, metadata=new_metadata
         )]
@@ -55,7 +252,8 @@ class CustomSplitterV2(RecursiveCharacterTextSplitter):
         return [Document(
             page_content=metadata["title"],
             metadata={
-                "id": metadata["id"]
+                "id": metadata["id"],
+                **filter_metadata(metadata),
             }
         )]
 
@@ -0,0 +1,250 @@
+"""ANN index management (HNSW / IVFFlat) for PGVector collections.
+
+Every collection gets its own partial index on langchain_pg_embedding (`WHERE collection_id = ...`).
+The shared embedding column has no fixed size, so indexes are built over `embedding::vector(dimensions)`;
+searches reach them through `VectorSearchParams.dimensions`. Index parameters are persisted in
+`CollectionsList.vector_index` and picked up by `RetrieverRegistry`.
+
+Lexical indexes for the hybrid retriever follow the same scheme: a partial GIN index over the chunk
+tsvector and a btree index over the upper-cased signature. So do metadata filter indexes: GIN over
+`cmetadata::jsonb` and btree over the release date.
+"""
+import uuid
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from langchain.vectorstores import PGVector
+from langchain.vectorstores.pgvector import DistanceStrategy
+
+from app.core.config import settings
+from app.database import SessionLocal
+from app.data_access_layer.collections_list_DAL import CollectionsListDaL
+from app.schemas.collection_list import VectorIndexConfig
+from app.services.retrievers import retriever_registry
+from app.services.vector_queries import RELEASE_DATE_SQL, SIGNATURE_SQL, collection_uuid, lexical_document_sql
+
+
+_OPERATOR_CLASSES = {
+    DistanceStrategy.EUCLIDEAN: "vector_l2_ops",
+    DistanceStrategy.COSINE: "vector_cosine_ops",
+    DistanceStrategy.MAX_INNER_PRODUCT: "vector_ip_ops",
+}
+
+
+# Search-time defaults, changing them does not need a new index
+_SEARCH_FIELDS = {"ef_search", "probes", "iterative_scan"}
+
+
+def index_name(collection_id) -> str:
+    return f"ix_lpe_{uuid.UUID(str(collection_id)).hex}"
+
+
+def _autocommit(vectorstore: PGVector) -> Connection:
+    # CREATE / DROP / REINDEX ... CONCURRENTLY cannot run inside a transaction block
+    bind = vectorstore._bind
+    engine = bind if isinstance(bind, Engine) else bind.engine
+    return engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def _is_valid(connection: Connection, name: str) -> Optional[bool]:
+    """None if the index does not exist, False if a concurrent build of it failed."""
+    return connection.execute(
+        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+        {"name": name},
+    ).scalar()
+
+
+def lexical_index_names(collection_id) -> Tuple[str, str]:
+    """Names of the full-text and signature indexes of a collection."""
+    collection_hex = uuid.UUID(str(collection_id)).hex
+    return f"ix_lpe_fts_{collection_hex}", f"ix_lpe_sig_{collection_hex}"
+
+
+def metadata_index_names(collection_id) -> Tuple[str, str, str]:
+    """Names of the metadata (GIN), release date and signature indexes of a collection."""
+    collection_hex = uuid.UUID(str(collection_id)).hex
+    return f"ix_lpe_meta_{collection_hex}", f"ix_lpe_date_{collection_hex}", f"ix_lpe_sig_{collection_hex}"
+
+
+def _create_concurrently(connection: Connection, vectorstore: PGVector, collection_id: uuid.UUID, name: str,
+                         definition: str):
+    if _is_valid(connection, name) is False:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    # Every value here is either validated by the caller or comes from the database
+    statement = (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {vectorstore.EmbeddingStore.__tablename__} "
+        f"{definition} WHERE collection_id = '{collection_id}'"
+    )
+    try:
+        connection.execute(text(statement))
+    except Exception:
+        # A failed concurrent build leaves an INVALID index behind
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        raise
+
+
+def _build(connection: Connection, vectorstore: PGVector, collection_id: uuid.UUID, name: str,
+           config: VectorIndexConfig):
+    if config.method == "hnsw":
+        options = f"m = {config.m}, ef_construction = {config.ef_construction}"
+    else:
+        options = f"lists = {config.lists}"
+    _create_concurrently(
+        connection, vectorstore, collection_id, name,
+        f"USING {config.method} ((embedding::vector({config.dimensions})) "
+        f"{_OPERATOR_CLASSES[vectorstore._distance_strategy]}) WITH ({options})",
+    )
+
+
+def create_index(vectorstore: PGVector, config: VectorIndexConfig) -> str:
+    """Build the collection index if it does not exist yet. Returns the index name."""
+    collection_id = collection_uuid(vectorstore)
+    name = index_name(collection_id)
+    with _autocommit(vectorstore) as connection:
+        _build(connection, vectorstore, collection_id, name, config)
+    return name
+
+
+def rebuild_index(vectorstore: PGVector, config: Optional[VectorIndexConfig] = None) -> str:
+    """Rebuild the collection index without blocking searches.
+
+    Without `config` the index is rebuilt as is (e.g. IVFFlat lists after a large load).
+    With `config` a new index is built next to the old one and replaces it.
+    """
+    collection_id = collection_uuid(vectorstore)
+    name = index_name(collection_id)
+    with _autocommit(vectorstore) as connection:
+        if config is None:
+            connection.execute(text(f"REINDEX INDEX CONCURRENTLY {name}"))
+            return name
+        new_name = f"{name}_new"
+        _build(connection, vectorstore, collection_id, new_name, config)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        connection.execute(text(f"ALTER INDEX {new_name} RENAME TO {name}"))
+    return name
+
+
+def drop_index(vectorstore: PGVector):
+    """Drop the collection index, searches fall back to exact scans."""
+    name = index_name(collection_uuid(vectorstore))
+    with _autocommit(vectorstore) as connection:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def create_lexical_indexes(vectorstore: PGVector, config: str = "simple") -> Tuple[str, str]:
+    """Build the full-text and signature indexes of the collection if they do not exist yet.
+
+    `config` is the text search configuration, it has to match the one the hybrid retriever queries with.
+    Switching it needs `drop_lexical_indexes` first.
+    """
+    collection_id = collection_uuid(vectorstore)
+    fts_name, signature_name = lexical_index_names(collection_id)
+    with _autocommit(vectorstore) as connection:
+        _create_concurrently(connection, vectorstore, collection_id, fts_name,
+                             f"USING gin (({lexical_document_sql(config)}))")
+        _create_concurrently(connection, vectorstore, collection_id, signature_name, f"(({SIGNATURE_SQL}))")
+    return fts_name, signature_name
+
+
+def _drop_shared(connection: Connection, own: Tuple[str, ...], other: str, signature_name: str):
+    """Drop `own` indexes, and the shared signature index once `other` (the remaining set) is gone."""
+    for name in own:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    if _is_valid(connection, other) is None:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {signature_name}"))
+
+
+def drop_lexical_indexes(vectorstore: PGVector):
+    """Drop the full-text index of the collection. The signature index is shared with the metadata
+    indexes and is dropped only if they do not exist."""
+    collection_id = collection_uuid(vectorstore)
+    fts_name, signature_name = lexical_index_names(collection_id)
+    with _autocommit(vectorstore) as connection:
+        _drop_shared(connection, (fts_name,), metadata_index_names(collection_id)[0], signature_name)
+
+
+def create_metadata_indexes(vectorstore: PGVector) -> Tuple[str, str, str]:
+    """Build the indexes used by metadata filters (see `vector_queries.metadata_conditions`)."""
+    collection_id = collection_uuid(vectorstore)
+    metadata_name, date_name, signature_name = metadata_index_names(collection_id)
+    with _autocommit(vectorstore) as connection:
+        _create_concurrently(connection, vectorstore, collection_id, metadata_name,
+                             "USING gin ((cmetadata::jsonb) jsonb_path_ops)")
+        _create_concurrently(connection, vectorstore, collection_id, date_name, f"(({RELEASE_DATE_SQL}))")
+        _create_concurrently(connection, vectorstore, collection_id, signature_name, f"(({SIGNATURE_SQL}))")
+    return metadata_name, date_name, signature_name
+
+
+def drop_metadata_indexes(vectorstore: PGVector):
+    """Drop the metadata filter indexes of the collection. The signature index is shared with
+    the lexical indexes and is dropped only if they do not exist."""
+    collection_id = collection_uuid(vectorstore)
+    metadata_name, date_name, signature_name = metadata_index_names(collection_id)
+    with _autocommit(vectorstore) as connection:
+        _drop_shared(connection, (metadata_name, date_name), lexical_index_names(collection_id)[0], signature_name)
+
+
+def create_collection_index(collection_name: str, config: Optional[VectorIndexConfig] = None) -> VectorIndexConfig:
+    """Create (or replace, if the parameters differ) the index of a collection and persist its parameters."""
+    config = config or VectorIndexConfig()
+    with SessionLocal() as session:
+        collection = CollectionsListDaL.get_collection(session, collection_name)
+    vectorstore = retriever_registry.vectorstore(collection_name)
+    if collection.vector_index and (VectorIndexConfig(**collection.vector_index).model_dump(exclude=_SEARCH_FIELDS)
+                                    != config.model_dump(exclude=_SEARCH_FIELDS)):
+        rebuild_index(vectorstore, config)
+    else:
+        create_index(vectorstore, config)
+    with SessionLocal() as session:
+        CollectionsListDaL.set_vector_index(session, collection_name, config.model_dump())
+    retriever_registry.invalidate(collection_name)
+    return config
+
+
+def rebuild_collection_index(collection_name: str) -> VectorIndexConfig:
+    """Rebuild the index of a collection with its persisted parameters."""
+    with SessionLocal() as session:
+        collection = CollectionsListDaL.get_collection(session, collection_name)
+    if not collection.vector_index:
+        raise ValueError(f"Collection '{collection_name}' has no vector index")
+    config = VectorIndexConfig(**collection.vector_index)
+    rebuild_index(retriever_registry.vectorstore(collection_name), config)
+    return config
+
+
+def drop_collection_index(collection_name: str):
+    """Drop the index of a collection and forget its parameters."""
+    with SessionLocal() as session:
+        CollectionsListDaL.get_collection(session, collection_name)
+    drop_index(retriever_registry.vectorstore(collection_name))
+    with SessionLocal() as session:
+        CollectionsListDaL.set_vector_index(session, collection_name, None)
+    retriever_registry.invalidate(collection_name)
+
+
+def create_collection_lexical_indexes(collection_name: str) -> Tuple[str, str]:
+    """Create the hybrid search indexes of a collection with the configured text search configuration."""
+    with SessionLocal() as session:
+        CollectionsListDaL.get_collection(session, collection_name)
+    return create_lexical_indexes(retriever_registry.vectorstore(collection_name), settings.TEXT_SEARCH_CONFIG)
+
+
+def drop_collection_lexical_indexes(collection_name: str):
+    with SessionLocal() as session:
+        CollectionsListDaL.get_collection(session, collection_name)
+    drop_lexical_indexes(retriever_registry.vectorstore(collection_name))
+
+
+def create_collection_metadata_indexes(collection_name: str) -> Tuple[str, str, str]:
+    """Create the metadata filter indexes of a collection."""
+    with SessionLocal() as session:
+        CollectionsListDaL.get_collection(session, collection_name)
+    return create_metadata_indexes(retriever_registry.vectorstore(collection_name))
+
+
+def drop_collection_metadata_indexes(collection_name: str):
+    with SessionLocal() as session:
+        CollectionsListDaL.get_collection(session, collection_name)
+    drop_metadata_indexes(retriever_registry.vectorstore(collection_name))
@@ -0,0 +1,395 @@
+"""SQL helpers working directly on the PGVector tables (langchain_pg_collection / langchain_pg_embedding)."""
+import math
+import re
+import uuid
+from dataclasses import dataclass, replace
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import (
+    Integer, Select, and_, cast, column, delete, func, literal, literal_column, or_, select, true, values,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.orm import Session
+
+from langchain.schema import Document
+from langchain.vectorstores import PGVector
+from langchain.vectorstores.pgvector import DistanceStrategy
+
+from app.schemas.search import MetadataFilter
+
+
+# Parser metadata (CustomInterpretationParser) searched together with the chunk text
+TEXT_SEARCH_FIELDS = ("title", "keywords", "signature")
+SIGNATURE_SQL = "upper(cmetadata ->> 'signature')"
+# ISO dates, so text order is date order
+RELEASE_DATE_SQL = "(cmetadata ->> 'release_date')"
+
+_DISTANCE_METHODS = {
+    DistanceStrategy.EUCLIDEAN: "l2_distance",
+    DistanceStrategy.COSINE: "cosine_distance",
+    DistanceStrategy.MAX_INNER_PRODUCT: "max_inner_product",
+}
+
+
+@dataclass(frozen=True)
+class VectorSearchParams:
+    """How a search reaches the ANN index of a collection.
+
+    `dimensions` must match the index: the embedding column has no fixed size, so indexes are
+    built over `embedding::vector(dimensions)` and only queries over the same expression use them.
+    Indexes are partial on the collection, so the planner has to see the collection id as a
+    constant: `collection_id` is inlined into the query instead of being looked up by name.
+    `ef_search` (HNSW), `probes` (IVFFlat) and `iterative_scan` (HNSW, pgvector >= 0.8) are applied
+    to the search transaction only. `metadata_filter` restricts the searched children and
+    `max_distance` drops children farther than it (a score threshold, see `max_distance`).
+    """
+    dimensions: Optional[int] = None
+    collection_id: Optional[str] = None
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    iterative_scan: Optional[str] = None
+    metadata_filter: Optional[MetadataFilter] = None
+    max_distance: Optional[float] = None
+
+    def override(self, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                 metadata_filter: Optional[MetadataFilter] = None) -> "VectorSearchParams":
+        return replace(
+            self,
+            ef_search=self.ef_search if ef_search is None else ef_search,
+            probes=self.probes if probes is None else probes,
+            metadata_filter=self.metadata_filter if metadata_filter is None else metadata_filter,
+        )
+
+
+def embedding_expression(vectorstore: PGVector, dimensions: Optional[int] = None):
+    """Embedding column as seen by the ANN index of the collection."""
+    store = vectorstore.EmbeddingStore
+    if dimensions is None:
+        return store.embedding
+    return cast(store.embedding, Vector(dimensions))
+
+
+def _distance(vectorstore: PGVector, query, params: Optional[VectorSearchParams]):
+    embedding = embedding_expression(vectorstore, params.dimensions if params else None)
+    return getattr(embedding, _DISTANCE_METHODS[vectorstore._distance_strategy])(query).label("distance")
+
+
+def max_distance(vectorstore: PGVector, score: float) -> Optional[float]:
+    """Largest child distance with a relevance score of at least `score`, so score thresholds
+    are applied in SQL. None if the relevance function of the vectorstore has no such bound
+    (a custom `relevance_score_fn`, inner product with a threshold <= 0).
+
+    Inner product relevance is taken as the inner product itself, langchain's relevance
+    function differs from it only for negative inner products.
+    """
+    if vectorstore.override_relevance_score_fn is not None:
+        return None
+    strategy = vectorstore._distance_strategy
+    if strategy == DistanceStrategy.COSINE:
+        return 1.0 - score
+    if strategy == DistanceStrategy.EUCLIDEAN:
+        return (1.0 - score) * math.sqrt(2)
+    if strategy == DistanceStrategy.MAX_INNER_PRODUCT and score > 0:
+        # pgvector's <#> is the negative inner product
+        return -score
+    return None
+
+
+def _search_settings(params: Optional[VectorSearchParams]) -> List[Select]:
+    if params is None:
+        return []
+    # set_config(..., true) is the bindable form of SET LOCAL: it ends with the transaction
+    statements = []
+    if params.ef_search is not None:
+        statements.append(select(func.set_config("hnsw.ef_search", str(params.ef_search), True)))
+    if params.probes is not None:
+        statements.append(select(func.set_config("ivfflat.probes", str(params.probes), True)))
+    if params.iterative_scan is not None and params.metadata_filter is not None:
+        # Keeps scanning the index until enough rows pass the filter instead of returning fewer than k
+        statements.append(select(func.set_config("hnsw.iterative_scan", params.iterative_scan, True)))
+    return statements
+
+
+def _execute(session: Session, statement: Select, params: Optional[VectorSearchParams]):
+    for setting in _search_settings(params):
+        session.execute(setting)
+    return session.execute(statement)
+
+
+async def _aexecute(connection: AsyncConnection, statement: Select, params: Optional[VectorSearchParams]):
+    for setting in _search_settings(params):
+        await connection.execute(setting)
+    return await connection.execute(statement)
+
+
+def _collection_uuid(vectorstore: PGVector, session: Session):
+    collection = vectorstore.get_collection(session)
+    if not collection:
+        raise ValueError(f"Collection not found: {vectorstore.collection_name}")
+    return collection.uuid
+
+
+def collection_uuid(vectorstore: PGVector) -> uuid.UUID:
+    """Id of the vectorstore collection in langchain_pg_collection."""
+    with Session(vectorstore._bind) as session:
+        return _collection_uuid(vectorstore, session)
+
+
+def metadata_conditions(vectorstore: PGVector, metadata_filter: MetadataFilter) -> list:
+    """SQL predicates of a metadata filter, written to match the per-collection metadata indexes:
+    `@>` containment for the GIN index over `cmetadata::jsonb`, plain comparisons for the
+    release date and signature expression indexes."""
+    metadata = cast(vectorstore.EmbeddingStore.cmetadata, JSONB)
+    conditions = []
+    if metadata_filter.release_date_from is not None:
+        conditions.append(literal_column(RELEASE_DATE_SQL) >= literal(metadata_filter.release_date_from.isoformat()))
+    if metadata_filter.release_date_to is not None:
+        conditions.append(literal_column(RELEASE_DATE_SQL) <= literal(metadata_filter.release_date_to.isoformat()))
+    if metadata_filter.author is not None:
+        conditions.append(metadata.contains({"author": metadata_filter.author}))
+    for keyword in metadata_filter.keywords:
+        # The parser stores a single keyword as a string, several as a list
+        conditions.append(or_(metadata.contains({"keywords": [keyword]}), metadata.contains({"keywords": keyword})))
+    if metadata_filter.signature is not None:
+        conditions.append(literal_column(SIGNATURE_SQL) == literal(metadata_filter.signature.strip().upper()))
+    return conditions
+
+
+def _near_enough(distance, params: Optional[VectorSearchParams]) -> list:
+    if params is None or params.max_distance is None:
+        return []
+    return [distance <= literal(params.max_distance)]
+
+
+def _in_collection(vectorstore: PGVector, params: Optional[VectorSearchParams]):
+    """Rows a search may return: children of the collection that pass the metadata filter."""
+    store = vectorstore.EmbeddingStore
+    if params is not None and params.collection_id is not None:
+        # Validated by uuid.UUID, safe to inline
+        in_collection = store.collection_id == literal_column(f"'{uuid.UUID(str(params.collection_id))}'::uuid")
+    else:
+        in_collection = store.collection_id == select(vectorstore.CollectionStore.uuid).where(
+            vectorstore.CollectionStore.name == vectorstore.collection_name
+        ).scalar_subquery()
+    if params is None or params.metadata_filter is None:
+        return in_collection
+    return and_(in_collection, *metadata_conditions(vectorstore, params.metadata_filter))
+
+
+def list_parent_ids(vectorstore: PGVector, id_key: str = "doc_id") -> Set[str]:
+    """Ids of all parents that have at least one child in the collection."""
+    store = vectorstore.EmbeddingStore
+    with Session(vectorstore._bind) as session:
+        collection_id = _collection_uuid(vectorstore, session)
+        statement = select(store.cmetadata[id_key].astext).where(
+            store.collection_id == collection_id
+        ).distinct()
+        return {row[0] for row in session.execute(statement) if row[0] is not None}
+
+
+def delete_children(vectorstore: PGVector, parent_ids: Iterable[str], id_key: str = "doc_id",
+                    batch_size: int = 1000) -> int:
+    """Delete child chunks of the given parents from the collection. Returns number of deleted rows."""
+    store = vectorstore.EmbeddingStore
+    parent_ids: List[str] = list(parent_ids)
+    deleted = 0
+    with Session(vectorstore._bind) as session:
+        collection_id = _collection_uuid(vectorstore, session)
+        for i in range(0, len(parent_ids), batch_size):
+            statement = delete(store).where(
+                store.collection_id == collection_id,
+                store.cmetadata[id_key].astext.in_(parent_ids[i:i + batch_size]),
+            ).execution_options(synchronize_session=False)
+            deleted += session.execute(statement).rowcount
+        session.commit()
+    return deleted
+
+
+def similar_children_statement(vectorstore: PGVector, embedding: List[float], k: int = 4,
+                               params: Optional[VectorSearchParams] = None) -> Select:
+    """Nearest children of a query vector, same ordering as `PGVector._query_collection`.
+
+    The collection is resolved in a subquery so the search is a single round trip.
+    """
+    store = vectorstore.EmbeddingStore
+    distance = _distance(vectorstore, embedding, params)
+    return select(store.document, store.cmetadata, distance).where(
+        _in_collection(vectorstore, params), *_near_enough(distance, params)
+    ).order_by(distance).limit(k)
+
+
+def _children(rows) -> List[Tuple[Document, float]]:
+    return [
+        (Document(page_content=document, metadata=metadata or {}), distance)
+        for document, metadata, distance in rows
+    ]
+
+
+def similar_children(vectorstore: PGVector, embedding: List[float], k: int = 4,
+                     params: Optional[VectorSearchParams] = None) -> List[Tuple[Document, float]]:
+    """Nearest children with distances, nearest first."""
+    with Session(vectorstore._bind) as session:
+        return _children(_execute(session, similar_children_statement(vectorstore, embedding, k, params), params))
+
+
+async def asimilar_children(connection: AsyncConnection, vectorstore: PGVector, embedding: List[float],
+                            k: int = 4, params: Optional[VectorSearchParams] = None) -> List[Tuple[Document, float]]:
+    """Async counterpart of `similar_children` over an asyncpg connection.
+
+    The query vector is bound in pgvector text format, so no asyncpg codec for `vector` is required.
+    """
+    statement = similar_children_statement(vectorstore, embedding, k, params)
+    return _children(await _aexecute(connection, statement, params))
+
+
+def similar_children_batch_statement(vectorstore: PGVector, embeddings: Sequence[List[float]], k: int = 4,
+                                     params: Optional[VectorSearchParams] = None) -> Select:
+    """Nearest children of several query vectors in one statement.
+
+    Query vectors are passed as a VALUES list and every one is searched in a LATERAL subquery,
+    so each query still gets its own top-k and can use the vector index. Rows are ordered by
+    query index, then by distance.
+    """
+    store = vectorstore.EmbeddingStore
+    queries = values(
+        column("idx", Integer), column("embedding", store.embedding.type), name="queries"
+    ).data(list(enumerate(embeddings)))
+    # VALUES literals arrive as text, the cast lets the distance operator use the vector type
+    distance = _distance(vectorstore, cast(queries.c.embedding, store.embedding.type), params)
+    children = select(store.document, store.cmetadata, distance).where(
+        _in_collection(vectorstore, params), *_near_enough(distance, params)
+    ).order_by(distance).limit(k).lateral("children")
+    return select(
+        queries.c.idx, children.c.document, children.c.cmetadata, children.c.distance
+    ).select_from(queries).join(children, true()).order_by(queries.c.idx, children.c.distance)
+
+
+def similar_children_batch(vectorstore: PGVector, embeddings: Sequence[List[float]], k: int = 4,
+                           params: Optional[VectorSearchParams] = None) -> List[List[Tuple[Document, float]]]:
+    """Children with distances for every query vector, in the order of `embeddings`."""
+    results: List[List[Tuple[Document, float]]] = [[] for _ in embeddings]
+    if not embeddings:
+        return results
+    with Session(vectorstore._bind) as session:
+        statement = similar_children_batch_statement(vectorstore, embeddings, k, params)
+        for idx, document, metadata, distance in _execute(session, statement, params):
+            results[idx].append((Document(page_content=document, metadata=metadata or {}), distance))
+    return results
+
+
+def best_parents_statement(vectorstore: PGVector, embedding: List[float], k: int = 4, id_key: str = "doc_id",
+                           candidates: Optional[int] = None,
+                           params: Optional[VectorSearchParams] = None) -> Select:
+    """Top-k distinct parents of a query vector with the distance of their best child and
+    the mean distance of their collapsed children.
+
+    Children are grouped by the parent id in their metadata. With `candidates` only that
+    many nearest children are collapsed, which lets Postgres use the vector index but may
+    return fewer than k parents. Without it the collapse is exact over the whole collection.
+    """
+    store = vectorstore.EmbeddingStore
+    parent_id = store.cmetadata[id_key].astext
+    distance = _distance(vectorstore, embedding, params)
+    children = select(parent_id.label("parent_id"), distance).where(
+        _in_collection(vectorstore, params),
+        parent_id.is_not(None),
+        *_near_enough(distance, params),
+    )
+    if candidates is not None:
+        children = children.order_by(distance).limit(candidates)
+    children = children.subquery("children")
+    best_distance = func.min(children.c.distance).label("distance")
+    return select(
+        children.c.parent_id, best_distance, func.avg(children.c.distance).label("mean_distance")
+    ).group_by(children.c.parent_id).order_by(best_distance).limit(k)
+
+
+def best_parents(vectorstore: PGVector, embedding: List[float], k: int = 4, id_key: str = "doc_id",
+                 candidates: Optional[int] = None,
+                 params: Optional[VectorSearchParams] = None) -> List[Tuple[str, float, float]]:
+    """(parent id, best child distance, mean child distance), nearest first. See `best_parents_statement`."""
+    statement = best_parents_statement(vectorstore, embedding, k, id_key, candidates, params)
+    with Session(vectorstore._bind) as session:
+        return [(parent_id, distance, float(mean)) for parent_id, distance, mean in _execute(session, statement, params)]
+
+
+async def abest_parents(connection: AsyncConnection, vectorstore: PGVector, embedding: List[float], k: int = 4,
+                        id_key: str = "doc_id", candidates: Optional[int] = None,
+                        params: Optional[VectorSearchParams] = None) -> List[Tuple[str, float, float]]:
+    """Async counterpart of `best_parents` over an asyncpg connection."""
+    statement = best_parents_statement(vectorstore, embedding, k, id_key, candidates, params)
+    return [(parent_id, distance, float(mean))
+            for parent_id, distance, mean in await _aexecute(connection, statement, params)]
+
+
+def _text_search_config(config: str) -> str:
+    if not re.fullmatch(r"[a-z_][a-z0-9_]*", config):
+        raise ValueError(f"Invalid text search configuration name: {config}")
+    return f"'{config}'::regconfig"
+
+
+def lexical_document_sql(config: str = "simple") -> str:
+    """tsvector of a child chunk: its text and parser metadata.
+
+    Shared by the GIN index and the queries: Postgres uses an expression index only for the same expression.
+    """
+    parts = " || ' ' || ".join(
+        ["coalesce(document, '')"] + [f"coalesce(cmetadata ->> '{field}', '')" for field in TEXT_SEARCH_FIELDS]
+    )
+    return f"to_tsvector({_text_search_config(config)}, {parts})"
+
+
+def lexical_children_statement(vectorstore: PGVector, query: str, k: int = 4, config: str = "simple",
+                               params: Optional[VectorSearchParams] = None) -> Select:
+    """Children matching a web-search style query (`websearch_to_tsquery`), best `ts_rank_cd` first."""
+    store = vectorstore.EmbeddingStore
+    document = literal_column(lexical_document_sql(config))
+    tsquery = func.websearch_to_tsquery(literal_column(_text_search_config(config)), query)
+    rank = func.ts_rank_cd(document, tsquery).label("rank")
+    return select(store.document, store.cmetadata, rank).where(
+        _in_collection(vectorstore, params),
+        document.op("@@")(tsquery),
+    ).order_by(rank.desc()).limit(k)
+
+
+def lexical_children(vectorstore: PGVector, query: str, k: int = 4, config: str = "simple",
+                     params: Optional[VectorSearchParams] = None) -> List[Tuple[Document, float]]:
+    """Lexically matching children with their rank, best first."""
+    with Session(vectorstore._bind) as session:
+        return _children(session.execute(lexical_children_statement(vectorstore, query, k, config, params)))
+
+
+async def alexical_children(connection: AsyncConnection, vectorstore: PGVector, query: str, k: int = 4,
+                            config: str = "simple",
+                            params: Optional[VectorSearchParams] = None) -> List[Tuple[Document, float]]:
+    """Async counterpart of `lexical_children` over an asyncpg connection."""
+    return _children(await connection.execute(lexical_children_statement(vectorstore, query, k, config, params)))
+
+
+def signature_parents_statement(vectorstore: PGVector, signature: str, id_key: str = "doc_id", limit: int = 4,
+                                params: Optional[VectorSearchParams] = None) -> Select:
+    """Parents whose interpretation signature equals `signature`, case-insensitive."""
+    store = vectorstore.EmbeddingStore
+    parent_id = store.cmetadata[id_key].astext
+    return select(parent_id).where(
+        _in_collection(vectorstore, params),
+        literal_column(SIGNATURE_SQL) == literal(signature.strip().upper()),
+        parent_id.is_not(None),
+    ).distinct().limit(limit)
+
+
+def signature_parents(vectorstore: PGVector, signature: str, id_key: str = "doc_id", limit: int = 4,
+                      params: Optional[VectorSearchParams] = None) -> List[str]:
+    with Session(vectorstore._bind) as session:
+        return list(session.execute(
+            signature_parents_statement(vectorstore, signature, id_key, limit, params)
+        ).scalars())
+
+
+async def asignature_parents(connection: AsyncConnection, vectorstore: PGVector, signature: str,
+                             id_key: str = "doc_id", limit: int = 4,
+                             params: Optional[VectorSearchParams] = None) -> List[str]:
+    result = await connection.execute(signature_parents_statement(vectorstore, signature, id_key, limit, params))
+    return list(result.scalars())
@@ -0,0 +1,121 @@
+"""Latency and throughput of the sync and async retriever search paths under concurrent load.
+
+Runs against the local stand-ins from docker-compose (postgres_vectors and redis), taken from
+PG_VECTOR_URI / REDIS_URL. Query embedding is replaced by HashEmbeddings with a fixed latency.
+
+Usage:
+    python -m benchmarks.bench_async_search --parents 2000 --requests 500 --concurrency 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from langchain.schema import Document
+from langchain.vectorstores import PGVector
+
+from benchmarks.fakes import HashEmbeddings
+from app.services.retrievers import RetrieverRegistry, build_parent_retriever
+from app.core.config import settings
+
+COLLECTION = "bench_async_search"
+WORDS = ("podatek vat faktura odliczenie najem sprzedaż nieruchomość spółka usługa "
+         "eksport zwolnienie korekta import dostawa leasing").split()
+
+
+def make_parents(count: int) -> List[Document]:
+    parents = []
+    for i in range(count):
+        words = [WORDS[(i * 7 + j * 3) % len(WORDS)] for j in range(600)]
+        parents.append(Document(page_content=" ".join(words), metadata={"id": str(i)}))
+    return parents
+
+
+def summary(label: str, latencies: List[float], elapsed: float):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<28} p50 {statistics.median(latencies) * 1000:8.1f}ms  "
+          f"p99 {p99 * 1000:8.1f}ms  {len(latencies) / elapsed:8.1f} req/s")
+
+
+def run_sync(search: Callable[[str], List[Document]], queries: List[str], concurrency: int):
+    """Sync path the way FastAPI runs it: in a thread pool."""
+    def timed(query: str) -> float:
+        started = time.perf_counter()
+        search(query)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    return latencies, time.perf_counter() - started
+
+
+async def run_async(search, queries: List[str], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(query: str) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            await search(query)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(query) for query in queries))
+    return list(latencies), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parents", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--embed-latency", type=float, default=0.05,
+                        help="Simulated embedding provider latency, seconds")
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    registry = RetrieverRegistry()
+    embeddings = HashEmbeddings(latency=args.embed_latency)
+    vectorstore = PGVector(
+        collection_name=COLLECTION,
+        connection_string=settings.PG_VECTOR_URI,
+        embedding_function=embeddings,
+        connection=registry.engine,
+        pre_delete_collection=not args.skip_seed,
+    )
+    retriever = build_parent_retriever(
+        COLLECTION, k=args.k,
+        vectorstore=vectorstore,
+        redis_client=registry.redis_client,
+        async_engine=registry.async_engine,
+        async_redis=registry.async_redis_client,
+    )
+    # HashEmbeddings vectors are random (cosine ~ 0), any score threshold would leave queries (nearly) empty
+    retriever = retriever.copy(update={"enforce_score_threshold": False})
+    fallback = retriever.copy(update={"async_engine": None, "async_redis": None})
+
+    if not args.skip_seed:
+        embeddings.latency = 0.0
+        report = retriever.add_documents_streaming(make_parents(args.parents), split_workers=0)
+        print(report)
+        embeddings.latency = args.embed_latency
+
+    queries = [f"{WORDS[i % len(WORDS)]} {WORDS[(i * 5) % len(WORDS)]} {i}" for i in range(args.requests)]
+    print(f"{args.requests} queries, concurrency {args.concurrency}, k={args.k}")
+
+    summary("sync (thread pool)", *run_sync(retriever.invoke, queries, args.concurrency))
+
+    async def run_all():
+        summary("async, executor fallback", *await run_async(fallback.ainvoke, queries, args.concurrency))
+        summary("async, asyncpg + redis", *await run_async(retriever.ainvoke, queries, args.concurrency))
+        await registry.aclose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
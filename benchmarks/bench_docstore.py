@@ -0,0 +1,104 @@
+"""Bytes stored and encode / decode latency per parent for the JSON and compact docstore formats.
+
+Parents are interpretations from a local corpus or, without one, synthetic texts with shared
+boilerplate. Runs in memory, no Redis needed: the numbers are what the docstore stores and what
+every `mget` moves and decodes.
+
+Usage:
+    python -m benchmarks.bench_docstore /path/to/interpretations --limit 2000
+    python -m benchmarks.bench_docstore --synthetic 2000
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from langchain.schema import Document
+from langchain.storage import InMemoryByteStore, create_kv_docstore
+
+from benchmarks.corpus import load_texts
+from app.services.interpretation_parser import CustomInterpretationParser
+from app.services.docstore import CompactDocumentSerializer, train_dictionary
+from app.services.splitter import CustomSplitterV2
+
+WORDS = ("podatek vat faktura odliczenie najem sprzedaż nieruchomość spółka usługa "
+         "eksport zwolnienie korekta import dostawa leasing").split()
+BOILERPLATE = ("Dyrektor Krajowej Informacji Skarbowej stwierdza, że stanowisko przedstawione we wniosku "
+               "o wydanie interpretacji przepisów prawa podatkowego jest prawidłowe. ")
+
+
+def synthetic_parents(count: int, rng: random.Random) -> List[Document]:
+    parents = []
+    for i in range(count):
+        body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(800, 3000)))
+        parents.append(Document(
+            page_content=BOILERPLATE + body + " " + BOILERPLATE,
+            metadata={"id": str(i), "author": "Dyrektor Krajowej Informacji Skarbowej",
+                      "release_date": f"2021-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                      "keywords": rng.sample(WORDS, 3), "content_hash": f"{rng.getrandbits(128):032x}"},
+        ))
+    return parents
+
+
+def corpus_parents(path: str, limit: int) -> List[Document]:
+    """Parents the way `sync_documents` stores them."""
+    parser = CustomInterpretationParser()
+    return [CustomSplitterV2.create_single_document_with_metadata(parser.withdraw_postgres_metadata(text))[0]
+            for text in load_texts(path, limit)]
+
+
+def measure(label: str, dumps: Callable[[Document], bytes], loads: Callable[[bytes], Document],
+            parents: List[Document], raw_bytes: int):
+    started = time.perf_counter()
+    blobs = [dumps(doc) for doc in parents]
+    encode = (time.perf_counter() - started) / len(parents)
+
+    latencies = []
+    for blob in blobs:
+        started = time.perf_counter()
+        loads(blob)
+        latencies.append(time.perf_counter() - started)
+
+    stored = sum(len(blob) for blob in blobs)
+    print(f"{label:<26} {stored / len(blobs) / 1024:9.1f} KiB/parent  ratio {raw_bytes / stored:5.2f}  "
+          f"encode {encode * 1e6:8.1f}us  decode p50 {statistics.median(latencies) * 1e6:8.1f}us  "
+          f"mean {statistics.mean(latencies) * 1e6:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default=None)
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--synthetic", type=int, default=2000, help="Synthetic parents when no corpus is given")
+    parser.add_argument("--train", type=int, default=500, help="Parents to train the dictionary on")
+    parser.add_argument("--dict-size", type=int, default=112_640)
+    parser.add_argument("--level", type=int, nargs="+", default=[3])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    parents = corpus_parents(args.corpus, args.limit) if args.corpus else synthetic_parents(args.synthetic, rng)
+    rng.shuffle(parents)
+    # The dictionary is trained on one part of the parents and measured on the rest
+    training, parents = parents[:args.train], parents[args.train:] or parents
+    print(f"{len(parents)} parents, dictionary trained on {len(training)}")
+
+    json_store = create_kv_docstore(InMemoryByteStore())
+    raw_bytes = sum(len(json_store.value_serializer(doc)) for doc in parents)
+    measure("json (create_kv_docstore)", json_store.value_serializer, json_store.value_deserializer,
+            parents, raw_bytes)
+
+    started = time.perf_counter()
+    dictionary = train_dictionary(training, args.dict_size)
+    print(f"Trained a {len(dictionary.as_bytes()) / 1024:.0f} KiB dictionary in {time.perf_counter() - started:.1f}s")
+
+    for level in args.level:
+        plain = CompactDocumentSerializer(level=level)
+        measure(f"msgpack+zstd-{level}", plain.dumps, plain.loads, parents, raw_bytes)
+        trained = CompactDocumentSerializer(level=level, dictionary=dictionary)
+        measure(f"msgpack+zstd-{level}+dict", trained.dumps, trained.loads, parents, raw_bytes)
+
+
+if __name__ == "__main__":
+    main()
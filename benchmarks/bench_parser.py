@@ -0,0 +1,43 @@
+"""Parse throughput of CustomInterpretationParser and a golden check against the previous extractor
+(kept in tests/test_interpretation_parser.py, which checks it on the committed samples).
+
+Usage:
+    python -m benchmarks.bench_parser /path/to/interpretations --limit 1000
+"""
+import argparse
+import time
+
+from benchmarks.corpus import load_texts
+from app.services.interpretation_parser import CustomInterpretationParser
+from tests.test_interpretation_parser import legacy_create_metadata
+
+
+def measure(label, fn, texts):
+    started = time.perf_counter()
+    results = [fn(text) for text in texts]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.3f}s  {len(texts) / elapsed:10.1f} docs/s")
+    return results
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("corpus")
+    argparser.add_argument("--limit", type=int, default=None)
+    args = argparser.parse_args()
+
+    parser = CustomInterpretationParser()
+    texts = load_texts(args.corpus, args.limit)
+    print(f"{len(texts)} documents")
+
+    expected = measure("per-header re.search", lambda text: legacy_create_metadata(parser, text), texts)
+    actual = measure("single-pass finditer", parser.create_metadata_v2, texts)
+
+    mismatched = [i for i, (a, b) in enumerate(zip(expected, actual)) if list(a.items()) != list(b.items())]
+    print(f"mismatched documents: {len(mismatched)}")
+    for i in mismatched[:10]:
+        print(f"  document #{i} differs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Check the token-offset splitter against the current splitter and compare their speed.
+
+Usage:
+    python -m benchmarks.bench_splitter /path/to/interpretations --limit 200 --chunk-size 1200
+"""
+import argparse
+import time
+
+from benchmarks.corpus import load_texts
+from global_utils import tokens_from_string
+from app.services.splitter import CustomSplitterV2
+
+
+def split_all(splitter, texts):
+    started = time.perf_counter()
+    chunks = [splitter.split_text(text) for text in texts]
+    return chunks, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[1200, 400])
+    args = parser.parse_args()
+
+    texts = load_texts(args.corpus, args.limit)
+    print(f"{len(texts)} documents, {sum(map(len, texts))} characters")
+
+    for chunk_size in args.chunk_size:
+        current = CustomSplitterV2(chunk_size=chunk_size, chunk_overlap=0, length_function=tokens_from_string)
+        offsets = CustomSplitterV2(chunk_size=chunk_size, chunk_overlap=0, length_function=tokens_from_string,
+                                   token_offsets=True)
+        expected, current_time = split_all(current, texts)
+        actual, offsets_time = split_all(offsets, texts)
+
+        mismatched = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+        print(f"chunk_size={chunk_size}: current {current_time:.3f}s, token offsets {offsets_time:.3f}s "
+              f"(x{current_time / offsets_time:.1f}), mismatched documents: {len(mismatched)}")
+        for i in mismatched[:10]:
+            print(f"  document #{i} differs")
+
+
+if __name__ == "__main__":
+    main()
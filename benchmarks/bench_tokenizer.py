@@ -0,0 +1,56 @@
+"""Compare the old and the cached token counting paths on a real interpretation corpus.
+
+Usage:
+    python -m benchmarks.bench_tokenizer /path/to/interpretations --limit 200
+"""
+import argparse
+import time
+
+import tiktoken
+
+from benchmarks.corpus import load_texts
+from global_utils import tokens_from_string, tokens_from_strings
+from app.services.splitter import CustomSplitterV2
+
+
+def old_tokens_from_string(string: str) -> int:
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(string))
+
+
+def timed(label: str, fn, items):
+    started = time.perf_counter()
+    result = fn(items)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:8.3f}s  {len(items) / elapsed:12.0f} strings/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    texts = load_texts(args.corpus, args.limit)
+    # Fragments of the shape the recursive splitter feeds to its length function
+    fragments = []
+    for text in texts:
+        fragments.extend(text.split("\n"))
+        fragments.extend(text.split(" "))
+    print(f"{len(texts)} documents, {len(fragments)} fragments")
+
+    old = timed("old: get_encoding per call", lambda items: [old_tokens_from_string(s) for s in items], fragments)
+    new = timed("new: registry + LRU memo", lambda items: [tokens_from_string(s) for s in items], fragments)
+    batch = timed("new: tokens_from_strings", tokens_from_strings, fragments)
+    assert old == new == batch, "token counts differ between paths"
+
+    splitter_old = CustomSplitterV2(chunk_size=400, chunk_overlap=0, length_function=old_tokens_from_string)
+    splitter_new = CustomSplitterV2(chunk_size=400, chunk_overlap=0, length_function=tokens_from_string)
+    chunks_old = timed("split_text, old length function", lambda items: [splitter_old.split_text(t) for t in items], texts)
+    chunks_new = timed("split_text, new length function", lambda items: [splitter_new.split_text(t) for t in items], texts)
+    assert chunks_old == chunks_new, "splitter output differs between paths"
+
+
+if __name__ == "__main__":
+    main()
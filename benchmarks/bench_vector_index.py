@@ -0,0 +1,122 @@
+"""Recall against exact search and latency of HNSW / IVFFlat collection indexes on a synthetic corpus.
+
+Runs against the local postgres_vectors from docker-compose (PG_VECTOR_URI). Vectors are drawn around
+random cluster centres, so neighbourhoods are not trivially uniform.
+
+Usage:
+    python -m benchmarks.bench_vector_index --vectors 100000 --dim 256 --method hnsw --sweep 10 20 40 80 160
+    python -m benchmarks.bench_vector_index --skip-seed --method ivfflat --lists 300 --sweep 1 5 10 20 40
+"""
+import argparse
+import statistics
+import time
+from typing import List
+
+import numpy as np
+from langchain.vectorstores import PGVector
+
+from benchmarks.fakes import HashEmbeddings
+from app.core.config import settings
+from app.schemas.collection_list import VectorIndexConfig
+from app.services.retrievers import RetrieverRegistry
+from app.services.vector_indexes import create_index, drop_index
+from app.services.vector_queries import VectorSearchParams, collection_uuid, similar_children
+
+COLLECTION = "bench_vector_index"
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(0, clusters, size=count)] + rng.normal(scale=0.6, size=(count, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def search(vectorstore: PGVector, queries: np.ndarray, k: int, params=None):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = similar_children(vectorstore, query.tolist(), k=k, params=params)
+        latencies.append(time.perf_counter() - started)
+        results.append([doc.page_content for doc, _ in hits])
+    return results, latencies
+
+
+def recall(exact: List[List[str]], approximate: List[List[str]], k: int) -> float:
+    return statistics.mean(len(set(e) & set(a)) / k for e, a in zip(exact, approximate))
+
+
+def row(label: str, latencies: List[float], value: float):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<20} recall@k {value:6.3f}  p50 {statistics.median(latencies) * 1000:8.2f}ms  "
+          f"p99 {p99 * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--sweep", type=int, nargs="+", default=None,
+                        help="ef_search values for HNSW, probes values for IVFFlat")
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    registry = RetrieverRegistry()
+    vectorstore = PGVector(
+        collection_name=COLLECTION,
+        connection_string=settings.PG_VECTOR_URI,
+        embedding_function=HashEmbeddings(size=args.dim),
+        connection=registry.engine,
+        pre_delete_collection=not args.skip_seed,
+    )
+
+    vectors = clustered_vectors(args.vectors, args.dim, args.clusters, rng)
+    if not args.skip_seed:
+        started = time.perf_counter()
+        for i in range(0, args.vectors, 2000):
+            batch = vectors[i:i + 2000]
+            vectorstore.add_embeddings(
+                texts=[str(j) for j in range(i, i + len(batch))],
+                embeddings=batch.tolist(),
+                metadatas=[{"doc_id": str(j)} for j in range(i, i + len(batch))],
+            )
+        print(f"Seeded {args.vectors} vectors of {args.dim} dims in {time.perf_counter() - started:.1f}s")
+
+    # Queries near stored vectors, like real queries near real chunks
+    queries = vectors[rng.integers(0, args.vectors, size=args.queries)] + rng.normal(
+        scale=0.1, size=(args.queries, args.dim)
+    )
+
+    exact, latencies = search(vectorstore, queries, args.k)
+    row("exact (seq scan)", latencies, 1.0)
+
+    config = VectorIndexConfig(method=args.method, dimensions=args.dim, m=args.m,
+                               ef_construction=args.ef_construction, lists=args.lists)
+    drop_index(vectorstore)
+    started = time.perf_counter()
+    create_index(vectorstore, config)
+    print(f"Built {args.method} index in {time.perf_counter() - started:.1f}s ({config})")
+
+    collection_id = str(collection_uuid(vectorstore))
+    sweep = args.sweep or ([10, 20, 40, 80, 160] if args.method == "hnsw" else [1, 5, 10, 20, 40])
+    knob = "ef_search" if args.method == "hnsw" else "probes"
+    for value in sweep:
+        params = VectorSearchParams(dimensions=args.dim, collection_id=collection_id, **{knob: value})
+        label = f"{knob}={value}"
+        approximate, latencies = search(vectorstore, queries, args.k, params)
+        row(label, latencies, recall(exact, approximate, args.k))
+
+    registry.close()
+
+
+if __name__ == "__main__":
+    main()
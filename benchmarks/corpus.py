@@ -0,0 +1,21 @@
+"""Helpers for loading a local interpretation corpus in benchmarks."""
+import glob
+import os
+from typing import List, Optional
+
+from app.services.interpretation_parser import CustomInterpretationParser
+
+
+def corpus_files(path: str, limit: Optional[int] = None) -> List[str]:
+    """Return RTF files from a directory (recursively) or a glob pattern."""
+    if os.path.isdir(path):
+        pattern = os.path.join(path, "**", "*.rtf")
+    else:
+        pattern = path
+    files = sorted(glob.glob(pattern, recursive=True))
+    return files[:limit] if limit else files
+
+
+def load_texts(path: str, limit: Optional[int] = None) -> List[str]:
+    """Read interpretation files into plain text the same way ingestion does."""
+    return [CustomInterpretationParser.read_from_rtf(file) for file in corpus_files(path, limit)]
@@ -0,0 +1,36 @@
+"""Stand-ins for paid services in benchmarks."""
+import asyncio
+import hashlib
+import random
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings derived from a text hash, with a simulated provider latency."""
+
+    def __init__(self, size: int = 1536, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.sha256(text.encode()).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
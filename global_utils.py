@@ -1,10 +1,50 @@
+import functools
+import threading
+from typing import Dict, List, Sequence
+
 import tiktoken
 
 
-def tokens_from_string(string: str) -> int:
+DEFAULT_ENCODING = "cl100k_base"
+# Strings up to this length (separators, words, short lines) are memoized
+SHORT_STRING_LIMIT = 64
+
+_encodings: Dict[str, tiktoken.Encoding] = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+
+    """Returns a process-wide tiktoken encoding, loading it only once"""
+
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        with _encodings_lock:
+            encoding = _encodings.get(encoding_name)
+            if encoding is None:
+                encoding = tiktoken.get_encoding(encoding_name)
+                _encodings[encoding_name] = encoding
+    return encoding
+
+
+@functools.lru_cache(maxsize=65536)
+def _tokens_from_short_string(string: str, encoding_name: str) -> int:
+    return len(get_encoding(encoding_name).encode(string))
+
+
+def tokens_from_string(string: str, encoding_name: str = DEFAULT_ENCODING) -> int:
 
     """Method counts tokens per string"""
 
-    encoding = tiktoken.get_encoding("cl100k_base")
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
\ No newline at end of file
+    if len(string) <= SHORT_STRING_LIMIT:
+        return _tokens_from_short_string(string, encoding_name)
+    return len(get_encoding(encoding_name).encode(string))
+
+
+def tokens_from_strings(strings: Sequence[str], encoding_name: str = DEFAULT_ENCODING,
+                        num_threads: int = 8) -> List[int]:
+
+    """Method counts tokens for a batch of strings using tiktoken's threaded encode_batch"""
+
+    encoding = get_encoding(encoding_name)
+    return [len(tokens) for tokens in encoding.encode_batch(list(strings), num_threads=num_threads)]
@@ -28,6 +28,7 @@ sys.path.append(BASE_DIR)
 
 from sqlmodel import SQLModel
 from app.models.user import User
+from app.models.database_models import CollectionsList, CollectionMember
 
 target_metadata = SQLModel.metadata
 
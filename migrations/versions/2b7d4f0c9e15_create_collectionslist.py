@@ -0,0 +1,33 @@
+"""create collectionslist
+
+Revision ID: 2b7d4f0c9e15
+Revises: bedc0592b10c
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7d4f0c9e15'
+down_revision = 'bedc0592b10c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deployments older than this revision have the table created outside of migrations
+    if sa.inspect(op.get_bind()).has_table('collectionslist'):
+        return
+    op.create_table('collectionslist',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('contains_ids', postgresql.JSON(astext_type=sa.Text()), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('collectionslist')
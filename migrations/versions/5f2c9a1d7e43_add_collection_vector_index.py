@@ -0,0 +1,25 @@
+"""add collection vector index
+
+Revision ID: 5f2c9a1d7e43
+Revises: 2b7d4f0c9e15
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c9a1d7e43'
+down_revision = '2b7d4f0c9e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('collectionslist', sa.Column('vector_index', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column('collectionslist', 'vector_index')
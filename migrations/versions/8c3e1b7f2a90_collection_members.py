@@ -0,0 +1,45 @@
+"""move collection contains_ids to collection_members
+
+Revision ID: 8c3e1b7f2a90
+Revises: 5f2c9a1d7e43
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3e1b7f2a90'
+down_revision = '5f2c9a1d7e43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('collection_members',
+    sa.Column('collection_name', sa.String(), nullable=False),
+    sa.Column('document_id', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['collection_name'], ['collectionslist.name'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('collection_name', 'document_id')
+    )
+    op.execute(
+        "INSERT INTO collection_members (collection_name, document_id) "
+        "SELECT c.name, ids.value::bigint FROM collectionslist c, json_array_elements_text(c.contains_ids) AS ids(value) "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.drop_column('collectionslist', 'contains_ids')
+
+
+def downgrade():
+    op.add_column('collectionslist', sa.Column('contains_ids', postgresql.JSON(astext_type=sa.Text()),
+                                               nullable=False, server_default=sa.text("'[]'::json")))
+    op.execute(
+        "UPDATE collectionslist c SET contains_ids = m.ids FROM ("
+        "SELECT collection_name, json_agg(document_id ORDER BY document_id) AS ids "
+        "FROM collection_members GROUP BY collection_name) m "
+        "WHERE m.collection_name = c.name"
+    )
+    op.alter_column('collectionslist', 'contains_ids', server_default=None)
+    op.drop_table('collection_members')
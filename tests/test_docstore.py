@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+import pytest
+from langchain.schema import Document
+from langchain.storage import InMemoryByteStore
+from langchain_core.load import dumps
+
+from app.services import docstore
+from app.services.docstore import CompactDocumentSerializer, create_compact_docstore, train_dictionary
+
+
+def _parents(count: int, topic: str):
+    return [Document(page_content=f"Interpretacja indywidualna nr {i}. {topic} Wnioskodawca pyta o {i % 7} "
+                                  f"nieruchomości i stawkę podatku w roku {2000 + i % 23}.",
+                     metadata={"id": str(i), "signature": f"0114-KDIP4-3.4012.{i}.2021.2.AM"})
+            for i in range(count)]
+
+
+@pytest.fixture(scope="module")
+def dictionaries():
+    first = train_dictionary(_parents(300, "Zwolnienie z VAT dostawy budynków."), size=4096)
+    second = train_dictionary(_parents(300, "Ulga na złe długi w podatku dochodowym."), size=4096)
+    assert first.dict_id() != second.dict_id()
+    return first, second
+
+
+def _dict_id(entry: bytes) -> int:
+    return docstore._HEADER.unpack_from(entry)[2]
+
+
+def test_round_trip_without_dictionary():
+    serializer = CompactDocumentSerializer()
+    doc = Document(page_content="Treść interpretacji", metadata={"id": "1", "keywords": ["VAT", "akcyza"]})
+
+    entry = serializer.dumps(doc)
+
+    assert entry[:1] == b"\x00" and _dict_id(entry) == 0
+    assert serializer.loads(entry) == doc
+
+
+def test_round_trip_with_trained_dictionary(dictionaries):
+    dictionary, _ = dictionaries
+    doc = _parents(1, "Zwolnienie z VAT dostawy budynków.")[0]
+
+    entry = CompactDocumentSerializer(dictionary=dictionary).dumps(doc)
+
+    assert _dict_id(entry) == dictionary.dict_id()
+    assert len(entry) < len(CompactDocumentSerializer().dumps(doc))
+    assert CompactDocumentSerializer(dictionary=dictionary).loads(entry) == doc
+
+
+def test_older_dictionary_is_loaded_by_id(dictionaries):
+    old, current = dictionaries
+    doc = _parents(1, "Zwolnienie z VAT dostawy budynków.")[0]
+    entry = CompactDocumentSerializer(dictionary=old).dumps(doc)
+    loaded = []
+
+    def load_dictionary(dict_id):
+        loaded.append(dict_id)
+        return old if dict_id == old.dict_id() else None
+
+    serializer = CompactDocumentSerializer(dictionary=current, load_dictionary=load_dictionary)
+
+    assert serializer.loads(entry) == doc
+    assert serializer.loads(entry) == doc
+    assert loaded == [old.dict_id()]
+
+
+def test_unknown_dictionary_is_not_looked_up_again_within_missing_ttl(dictionaries, monkeypatch):
+    entry = CompactDocumentSerializer(dictionary=dictionaries[0]).dumps(Document(page_content="x"))
+    now = [100.0]
+    monkeypatch.setattr(docstore.time, "monotonic", lambda: now[0])
+    loaded = []
+    serializer = CompactDocumentSerializer(load_dictionary=lambda dict_id: loaded.append(dict_id),
+                                           missing_ttl=60.0)
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match="unknown compression dictionary"):
+            serializer.loads(entry)
+    assert len(loaded) == 1
+
+    now[0] += 61.0
+    with pytest.raises(ValueError):
+        serializer.loads(entry)
+    assert len(loaded) == 2
+
+
+def test_reads_json_entries_of_kv_docstore():
+    doc = Document(page_content="Stary wpis", metadata={"id": "7", "title": "Ulga"})
+
+    assert CompactDocumentSerializer().loads(dumps(doc).encode("utf-8")) == doc
+
+
+def test_dates_survive_the_round_trip():
+    doc = Document(page_content="Daty", metadata={"release_date": datetime(2021, 6, 10, 12, 30, 15, 250),
+                                                   "publication_date": date(2021, 6, 14)})
+
+    loaded = CompactDocumentSerializer().loads(CompactDocumentSerializer().dumps(doc))
+
+    assert loaded.metadata == doc.metadata
+    assert type(loaded.metadata["release_date"]) is datetime
+    assert type(loaded.metadata["publication_date"]) is date
+
+
+def test_compact_docstore_round_trip(dictionaries):
+    store = create_compact_docstore(InMemoryByteStore(), CompactDocumentSerializer(dictionary=dictionaries[0]))
+    docs = _parents(3, "Zwolnienie z VAT dostawy budynków.")
+
+    store.mset([(doc.metadata["id"], doc) for doc in docs])
+
+    assert store.mget(["0", "missing", "2"]) == [docs[0], None, docs[2]]
@@ -0,0 +1,113 @@
+import asyncio
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.services.embeddings import CachedEmbeddings, EmbeddingCacheBackend, LRUEmbeddingCache, \
+    SQLiteEmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake provider: a text maps to [len(text), number of spaces], every provider call is recorded."""
+
+    model = "fake"
+
+    def __init__(self):
+        self.calls: List[List[str]] = []
+        self.async_calls: List[List[str]] = []
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        return [float(len(text)), float(text.count(" "))]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.async_calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        EmbeddingCacheBackend()
+
+
+def test_only_unique_misses_reach_the_provider():
+    provider = CountingEmbeddings()
+    embeddings = CachedEmbeddings(provider, LRUEmbeddingCache())
+
+    first = embeddings.embed_documents(["a b", "c", "a b"])
+    second = embeddings.embed_documents(["c", "d e f"])
+
+    assert first == [[3.0, 1.0], [1.0, 0.0], [3.0, 1.0]]
+    assert second == [[1.0, 0.0], [5.0, 2.0]]
+    assert provider.calls == [["a b", "c"], ["d e f"]]
+    assert (embeddings.hits, embeddings.misses) == (1, 4)
+    assert embeddings.embed_query("a b") == [3.0, 1.0]
+    assert len(provider.calls) == 2
+
+
+def test_async_path_uses_the_cache():
+    provider = CountingEmbeddings()
+    embeddings = CachedEmbeddings(provider, LRUEmbeddingCache())
+    embeddings.embed_documents(["cached query"])
+
+    async def run():
+        return await embeddings.aembed_query("cached query"), await embeddings.aembed_documents(["new", "new"])
+
+    cached, new = asyncio.run(run())
+
+    assert cached == [12.0, 1.0]
+    assert new == [[3.0, 0.0], [3.0, 0.0]]
+    assert provider.async_calls == [["new"]]
+    assert len(provider.calls) == 1
+
+
+def test_hits_of_slower_backends_are_promoted(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), SQLiteEmbeddingCache(path)).embed_documents(["persisted"])
+
+    provider = CountingEmbeddings()
+    lru = LRUEmbeddingCache()
+    embeddings = CachedEmbeddings(provider, [lru, SQLiteEmbeddingCache(path)])
+
+    assert embeddings.embed_query("persisted") == [9.0, 0.0]
+    assert provider.calls == []
+    assert lru.mget([embeddings._key("persisted")]) == [[9.0, 0.0]]
+
+
+def test_async_promotion_through_the_executor(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), SQLiteEmbeddingCache(path)).embed_documents(["persisted"])
+    provider = CountingEmbeddings()
+    lru = LRUEmbeddingCache()
+    embeddings = CachedEmbeddings(provider, [lru, SQLiteEmbeddingCache(path)])
+
+    assert asyncio.run(embeddings.aembed_query("persisted")) == [9.0, 0.0]
+    assert provider.async_calls == []
+    assert lru.mget([embeddings._key("persisted")]) == [[9.0, 0.0]]
+
+
+def test_lru_drops_least_recently_used():
+    cache = LRUEmbeddingCache(maxsize=2)
+    cache.mset([("a", [1.0]), ("b", [2.0])])
+    cache.mget(["a"])
+    cache.mset([("c", [3.0])])
+
+    assert cache.mget(["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_namespace_separates_models():
+    lru = LRUEmbeddingCache()
+    first, second = CountingEmbeddings(), CountingEmbeddings()
+    CachedEmbeddings(first, lru, namespace="small").embed_query("text")
+    CachedEmbeddings(second, lru, namespace="large").embed_query("text")
+
+    assert first.calls == [["text"]]
+    assert second.calls == [["text"]]
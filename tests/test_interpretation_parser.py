@@ -0,0 +1,88 @@
+"""Golden checks of the single-pass `create_metadata_v2` against the per-header extractor it replaced."""
+import os
+import re
+
+import pytest
+
+from app.services.interpretation_parser import CustomInterpretationParser
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "interpretations")
+SAMPLES = sorted(os.listdir(DATA))
+
+
+def legacy_create_metadata(parser: CustomInterpretationParser, text: str):
+    """Field extraction as it was before the single-pass extractor: one re.search per header."""
+    matches = []
+    for separator_pol, separator_eng in parser._separator_keys.items():
+        match = re.search(separator_pol, text)
+        if match:
+            matches.append((separator_eng, match.start(), match.end()))
+
+    starts = {match[1]: match for match in matches}
+    finishes = {match[2]: match for match in matches}
+    sorted_starts, sorted_finishes = sorted(starts), sorted(finishes)
+    metadata = {}
+    for index, start_1 in enumerate(sorted_starts):
+        try:
+            start_2 = sorted_starts[index + 1]
+        except IndexError:
+            start_2 = len(text) + 1
+        finish_1 = next(finish for finish in sorted_finishes if start_1 < finish < start_2)
+        if starts[start_1] is finishes[finish_1]:
+            metadata[starts[start_1][0]] = text[finish_1:start_2]
+    return parser._split_metadata(metadata)
+
+
+def _sample(name: str) -> str:
+    with open(os.path.join(DATA, name), encoding="utf-8") as file:
+        return file.read()
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return CustomInterpretationParser()
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_matches_legacy_extractor(parser, name):
+    text = _sample(name)
+
+    expected = legacy_create_metadata(parser, text)
+    actual = parser.create_metadata_v2(text)
+
+    # Same keys in the same order and equal values
+    assert list(actual.items()) == list(expected.items())
+
+
+def test_duplicated_content_header_keeps_the_first(parser):
+    text = _sample("full.txt")
+    assert text.count("Treść:") == 2
+
+    metadata = parser.create_metadata_v2(text)
+
+    assert "Treść: tego przepisu" in metadata["content"]
+    assert list(metadata.items()) == list(legacy_create_metadata(parser, text).items())
+
+
+def test_missing_headers_are_left_out(parser):
+    text = _sample("minimal.txt")
+
+    metadata = parser.create_metadata_v2(text)
+
+    assert set(metadata) == {"id", "title", "signature", "content", "approved"}
+    assert metadata["signature"] == "0111-KDIB1-2.4010.77.2020.1.BG"
+    assert list(metadata.items()) == list(legacy_create_metadata(parser, text).items())
+
+
+def test_header_followed_by_another_has_no_value(parser):
+    text = re.sub(r"Sygnatura:\n.*\n", "Sygnatura:", _sample("minimal.txt"))
+    assert "Sygnatura:Treść:" in text
+
+    with pytest.raises(StopIteration):
+        legacy_create_metadata(parser, text)
+    metadata = parser.create_metadata_v2(text)
+
+    assert "signature" not in metadata
+    without_signature = legacy_create_metadata(parser, text.replace("Sygnatura:", ""))
+    assert list(metadata.items()) == list(without_signature.items())
@@ -0,0 +1,177 @@
+"""/search endpoints over the real retriever with fake embeddings, an in-memory docstore and
+an in-memory nearest-children search in place of Postgres."""
+import json
+import math
+from typing import List, Optional, Sequence
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain.schema import Document
+from langchain.storage import InMemoryStore
+from langchain.text_splitter import CharacterTextSplitter
+from langchain_community.vectorstores.pgvector import DistanceStrategy, PGVector
+
+from app.api import deps
+from app.core.config import settings
+from app.data_access_layer.collections_list_DAL import CollectionsListDaL
+from app.data_access_layer.exceptions import CollectionNotFoundException
+from app.main import app
+from app.services import retrievers
+from app.services.retrievers import CustomParentDocumentRetriever
+from app.services.vector_queries import VectorSearchParams
+from benchmarks.fakes import HashEmbeddings
+
+
+URL = f"{settings.API_V1_STR}/search"
+
+PARENTS = {
+    "p1": "Podatek VAT od sprzedaży nieruchomości. Zwolnienie dotyczy budynków po pierwszym zasiedleniu.",
+    "p2": "Ulga na złe długi w podatku dochodowym. Korekta przychodu po upływie terminu płatności.",
+    "p3": "Stawka akcyzy na wyroby energetyczne. Zwolnienie dla odbiorców końcowych.",
+    "p4": "Opodatkowanie usług transportu międzynarodowego. Miejsce świadczenia usług na rzecz podatnika.",
+    "p5": "Podatek od czynności cywilnoprawnych przy umowie pożyczki. Obowiązek powstaje z chwilą zawarcia.",
+}
+
+
+def _cosine_distance(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    return 1.0 - dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+
+class FakeChildren:
+    """Children of PARENTS (one per sentence) with their HashEmbeddings vectors."""
+
+    def __init__(self, embeddings: HashEmbeddings):
+        self.children = []
+        for parent_id, text in PARENTS.items():
+            for sentence in text.split(". "):
+                metadata = {"doc_id": parent_id, "start_index": text.index(sentence)}
+                self.children.append((Document(page_content=sentence, metadata=metadata),
+                                      embeddings.embed_query(sentence)))
+
+    def similar_children(self, vectorstore, embedding: List[float], k: int = 4,
+                         params: Optional[VectorSearchParams] = None):
+        hits = [(child, _cosine_distance(embedding, vector)) for child, vector in self.children]
+        if params is not None and params.max_distance is not None:
+            hits = [(child, distance) for child, distance in hits if distance <= params.max_distance]
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+    def similar_children_batch(self, vectorstore, embeddings, k: int = 4, params=None):
+        return [self.similar_children(vectorstore, embedding, k, params) for embedding in embeddings]
+
+
+class FakeRegistry:
+    def __init__(self, embeddings: HashEmbeddings):
+        self.vectorstore = PGVector.__new__(PGVector)
+        self.vectorstore._bind = None
+        self.vectorstore.embedding_function = embeddings
+        self.vectorstore.collection_name = "interpretations"
+        self.vectorstore._distance_strategy = DistanceStrategy.COSINE
+        self.vectorstore.override_relevance_score_fn = None
+        self.docstore = InMemoryStore()
+        self.docstore.mset([(_id, Document(page_content=text, metadata={"title": _id}))
+                            for _id, text in PARENTS.items()])
+
+    def get(self, collection_name: str, k: int = 6, score: float = 0.8, hybrid: bool = False,
+            collapse_parents: bool = False) -> CustomParentDocumentRetriever:
+        return CustomParentDocumentRetriever(
+            vectorstore=self.vectorstore, docstore=self.docstore, child_splitter=CharacterTextSplitter(),
+            search_kwargs={"k": k, "score_threshold": score},
+        )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    embeddings = HashEmbeddings(size=64)
+    children = FakeChildren(embeddings)
+    monkeypatch.setattr(retrievers, "similar_children", children.similar_children)
+    monkeypatch.setattr(retrievers, "similar_children_batch", children.similar_children_batch)
+
+    async def aget_collection(db, collection_name):
+        if collection_name != "interpretations":
+            raise CollectionNotFoundException(collection_name)
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(CollectionsListDaL, "aget_collection", staticmethod(aget_collection))
+    app.dependency_overrides[deps.get_retriever_registry] = lambda: FakeRegistry(embeddings)
+    app.dependency_overrides[deps.get_db_async] = no_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _stages(response) -> List[str]:
+    return [item.split(";")[0].strip() for item in response.headers["server-timing"].split(",")]
+
+
+def test_search_returns_the_matching_parent_with_timings(client):
+    response = client.post(URL + "/", json={"collection_name": "interpretations",
+                                            "query": "Korekta przychodu po upływie terminu płatności.",
+                                            "k": 2, "score": 0.5})
+
+    assert response.status_code == 200
+    hits = response.json()["hits"]
+    assert [hit["page_content"] for hit in hits] == [PARENTS["p2"]]
+    assert hits[0]["metadata"]["score"] == pytest.approx(1.0)
+    assert {"embed", "vector_query", "docstore", "serialize"} <= set(_stages(response))
+
+
+def test_batch_results_follow_the_order_of_queries(client):
+    queries = ["Stawka akcyzy na wyroby energetyczne", "Podatek VAT od sprzedaży nieruchomości",
+               "Ulga na złe długi w podatku dochodowym"]
+
+    response = client.post(URL + "/batch", json={"collection_name": "interpretations", "queries": queries,
+                                                 "k": 2, "score": 0.5})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [[hit["page_content"] for hit in hits] for hits in results] == [[PARENTS["p3"]], [PARENTS["p1"]],
+                                                                           [PARENTS["p2"]]]
+    assert {"embed", "vector_query", "docstore", "serialize"} <= set(_stages(response))
+
+
+def test_stream_sends_one_line_per_parent(client):
+    request = {"collection_name": "interpretations", "query": "Zwolnienie dla odbiorców końcowych.",
+               "k": 3, "score": 0}
+    expected = [hit["page_content"] for hit in client.post(URL + "/", json=request).json()["hits"]]
+
+    with client.stream("POST", URL + "/stream", json=request) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert {"embed", "vector_query", "docstore"} <= set(_stages(response))
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    *parents, done = lines
+    assert len(expected) > 1
+    assert [parent["page_content"] for parent in parents] == expected
+    assert parents[0]["page_content"] == PARENTS["p3"]
+    assert done["done"] is True and done["count"] == len(parents)
+    assert {"embed", "vector_query", "docstore", "serialize"} <= set(done["timing"])
+
+
+def test_highlights_return_matched_spans(client):
+    query = "Miejsce świadczenia usług na rzecz podatnika."
+
+    response = client.post(URL + "/highlights", json={"collection_name": "interpretations", "query": query,
+                                                      "k": 1, "score": 0.5})
+
+    assert response.status_code == 200
+    (hit,) = response.json()["hits"]
+    assert hit["page_content"] is None
+    span = hit["highlights"][0]
+    assert PARENTS["p4"][span["start"]:span["end"]].startswith(query)
+    assert {"embed", "vector_query", "serialize"} <= set(_stages(response))
+
+
+def test_highlights_reject_options_they_do_not_support(client):
+    response = client.post(URL + "/highlights", json={"collection_name": "interpretations", "query": "VAT",
+                                                      "hybrid": True})
+
+    assert response.status_code == 422
+
+
+def test_unknown_collection_is_not_found(client):
+    response = client.post(URL + "/", json={"collection_name": "missing", "query": "VAT"})
+
+    assert response.status_code == 404
@@ -0,0 +1,95 @@
+"""Golden checks of the span-based CustomSplitterV2 against langchain's RecursiveCharacterTextSplitter.
+
+`split_text_to_spans` is a port of `_split_text` / `_merge_splits` and every default split goes
+through it, so its chunks must stay exactly the ones the original splitter produces.
+"""
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.services.splitter import CustomSplitterV2
+
+
+TEXTS = [
+    "Interpretacja indywidualna\n\nStan faktyczny: Spółka prowadzi działalność gospodarczą. "
+    "Wnioskodawca jest czynnym podatnikiem VAT.\nPytanie: czy sprzedaż nieruchomości jest zwolniona?\n\n"
+    "Uzasadnienie  \n  Zgodnie z art. 43 ust. 1 pkt 10 ustawy zwolniona jest dostawa budynków. "
+    "Sygnatura0114-KDIP4-3.4012.123.2021.2.AMbezspacjiktóramusibyćpodzielonanaznaki.\n\n\n  Końcowy akapit. ",
+    "   \n\n  ",
+    "Krótki tekst",
+    "Akapit pierwszy.\n\nAkapit drugi, dłuższy od pierwszego.\n\nAkapit trzeci.\nLinia druga akapitu trzeciego.\n"
+    * 5,
+    "€ ąę — znaki wielobajtowe\n\n" + "ż" * 130 + "\n\nkoniec",
+]
+
+SIZES = [(60, 0), (60, 20), (25, 0), (40, 10), (400, 0)]
+
+GOLDEN_CHUNKS = [
+    "Interpretacja indywidualna",
+    "Stan faktyczny: Spółka prowadzi działalność gospodarczą.",
+    "Wnioskodawca jest czynnym podatnikiem VAT.",
+    "Pytanie: czy sprzedaż nieruchomości jest zwolniona?",
+    "Uzasadnienie",
+    "Zgodnie z art. 43 ust. 1 pkt 10 ustawy zwolniona jest",
+    "dostawa budynków.",
+    "Sygnatura0114-KDIP4-3.4012.123.2021.2.AMbezspacjiktóramusib",
+    "yćpodzielonanaznaki.",
+    "Końcowy akapit.",
+]
+
+GOLDEN_SPANS = [(0, 26), (28, 84), (85, 127), (128, 179), (181, 193), (198, 251), (252, 269), (270, 329),
+                (329, 349), (354, 369)]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", SIZES)
+@pytest.mark.parametrize("text", TEXTS)
+def test_spans_match_recursive_splitter(text, chunk_size, chunk_overlap):
+    expected = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+    ).split_text(text)
+    splitter = CustomSplitterV2(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len)
+
+    spans = splitter.split_text_to_spans(text)
+
+    assert [text[start:end] for start, end in spans] == expected
+    assert splitter.split_text(text) == expected
+
+
+def test_golden_chunks():
+    splitter = CustomSplitterV2(chunk_size=60, chunk_overlap=0, length_function=len)
+
+    assert splitter.split_text(TEXTS[0]) == GOLDEN_CHUNKS
+    assert splitter.split_text_to_spans(TEXTS[0]) == GOLDEN_SPANS
+
+
+# create_documents drops chunks of up to 30 characters
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [size for size in SIZES if size[0] > 30])
+def test_start_index_points_at_chunk(chunk_size, chunk_overlap):
+    splitter = CustomSplitterV2(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len,
+                                add_start_index=True)
+    text = TEXTS[3]
+
+    docs = splitter.create_documents([text], metadatas=[{"id": "1"}])
+
+    assert docs
+    for doc in docs:
+        start = doc.metadata["start_index"]
+        assert text[start:start + len(doc.page_content)] == doc.page_content
+        assert doc.metadata["id"] == "1"
+
+
+def test_token_offsets_match_token_counting():
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        pytest.skip(f"cl100k_base encoding is not available: {e}")
+    from global_utils import tokens_from_string
+
+    for text in TEXTS:
+        for chunk_size, chunk_overlap in SIZES:
+            expected = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=tokens_from_string
+            ).split_text(text)
+            splitter = CustomSplitterV2(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                        length_function=tokens_from_string, token_offsets=True)
+            assert splitter.split_text(text) == expected